@@ -0,0 +1,60 @@
+import os
+
+from sincronizacao import TABELA_SINCRONIZACAO
+
+# Configuração do agendamento da lista de trabalho (variáveis de ambiente)
+# PNCP_AGENDAMENTO: "tamanho" (padrão) ou "desligado" (ordem em que o banco devolver)
+AGENDAMENTO = os.getenv("PNCP_AGENDAMENTO", "tamanho")
+# Compras destes últimos anos vêm antes das demais (dados novos chegam primeiro)
+AGENDA_ANOS_RECENTES = int(os.getenv("PNCP_AGENDA_ANOS_RECENTES", "1"))
+# Estimativa de itens de uma compra sem histórico nenhum (nem do órgão, nem geral)
+AGENDA_ESTIMATIVA_PADRAO = int(os.getenv("PNCP_AGENDA_ESTIMATIVA_PADRAO", "10"))
+
+# A estimativa de itens vem da última coleta da compra (tabela de sincronização);
+# sem ela, da média das compras do mesmo órgão na lista; sem essa, da média geral.
+# Ordem: recentes primeiro; dentro de cada grupo, rodadas entre órgãos (a rodada k
+# traz a k-ésima maior compra de cada órgão) e, na rodada, as maiores primeiro.
+SQL_ORDENAR = f"""
+    SELECT numero_controle_pncp, orgao_cnpj, sequencial_compra, ano_compra
+    FROM (
+        SELECT e.*,
+               row_number() OVER (
+                   PARTITION BY e.recente, e.orgao_cnpj
+                   ORDER BY e.estimativa DESC, e.numero_controle_pncp
+               ) AS rodada
+        FROM (
+            SELECT w.numero_controle_pncp, w.orgao_cnpj, w.sequencial_compra, w.ano_compra,
+                   coalesce(
+                       w.ano_compra::int
+                           >= extract(year FROM now())::int - %(anos_recentes)s,
+                       false
+                   ) AS recente,
+                   coalesce(
+                       s.quantidade_itens,
+                       avg(s.quantidade_itens) OVER (PARTITION BY w.orgao_cnpj),
+                       avg(s.quantidade_itens) OVER (),
+                       %(estimativa_padrao)s
+                   ) AS estimativa
+            FROM ({{query}}) w
+            LEFT JOIN {TABELA_SINCRONIZACAO} s
+                   ON s.numero_controle_pncp = w.numero_controle_pncp
+        ) e
+    ) o
+    ORDER BY recente DESC, rodada, estimativa DESC, numero_controle_pncp
+"""
+
+
+# 🔹 Ordena a lista de trabalho para encurtar a cauda da execução: compras grandes
+# começam cedo (não sobram para o fim) e compras seguidas são de órgãos diferentes.
+# Aplicar por último, sobre a query já filtrada (shard, retomada).
+def ordenar_compras(query, parametros):
+    if AGENDAMENTO == "desligado":
+        return query, parametros
+    parametros = dict(parametros or {})
+    parametros.update(
+        {
+            "anos_recentes": AGENDA_ANOS_RECENTES,
+            "estimativa_padrao": AGENDA_ESTIMATIVA_PADRAO,
+        }
+    )
+    return SQL_ORDENAR.format(query=query), parametros
@@ -1,271 +1,299 @@
 import streamlit as st
-import requests
-import pandas as pd
-import psycopg2
 import os
-from dotenv import load_dotenv
+import itertools
+import threading
+import time
+from collections import deque
 from datetime import datetime
 
-# Inicializa variáveis de ambiente
-load_dotenv()
-
-# API URL e Headers
-BASE_URL_CONTRATACAO_ITENS = "https://pncp.gov.br/api/pncp/v1/orgaos"
-HEADERS = {"accept": "application/json"}
-
-
-# 🔹 Função para conectar ao banco de dados PostgreSQL
-def conectar_banco():
-    try:
-        conexao = psycopg2.connect(
-            host=os.getenv("DB_HOST"),
-            port=os.getenv("DB_PORT"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            database=os.getenv("DB_NAME"),
-            options=f"-c search_path={os.getenv('DB_SCHEMA', 'public')}",
-        )
-        return conexao
-    except Exception as e:
-        st.error(f"Erro ao conectar ao banco de dados: {e}")
-        return None
+# O app lê o banco do ambiente (DB_*, também de um .env), mesmo onde o Airflow
+# estiver instalado (ver config.py)
+os.environ.setdefault("PNCP_CONFIG", "ambiente")
 
+from checkpoint import (  # noqa: E402
+    filtrar_retomada,
+    garantir_tabela_checkpoint,
+    liberar_compras,
+    nova_execucao,
+    reservar_compras,
+)
+from importador_itens import (  # noqa: E402
+    buscar_cnpjs_banco,
+    buscar_ultima_execucao,
+    carregar_indice_chaves,
+    coletor,
+    gravar_lote,
+    pool,
+)
+from metricas import finalizar_execucao, iniciar_execucao  # noqa: E402
+from pipeline import PipelineColeta  # noqa: E402
+from sink_parquet import obter_sink_parquet  # noqa: E402
+from sincronizacao import (  # noqa: E402
+    ITERSIZE_COMPRAS,
+    garantir_tabela,
+    query_compras,
+)
+from zona_pouso import obter_zona_pouso  # noqa: E402
 
-# 🔹 Função auxiliar para acessar objetos aninhados de forma segura
-def get_value_safe(obj, *keys):
-    for key in keys:
-        if obj is None or not isinstance(obj, dict):
-            return None
-        obj = obj.get(key)
-    return obj
 
+# Linhas mantidas no log da página e intervalo de atualização da página durante a coleta
+LINHAS_LOG = int(os.getenv("PNCP_APP_LINHAS_LOG", "200"))
+INTERVALO_ATUALIZACAO = float(os.getenv("PNCP_APP_INTERVALO", "1.0"))  # segundos
 
-# 🔹 Função para buscar CNPJs do banco de dados
-def buscar_cnpjs_banco():
-    try:
-        conn = conectar_banco()
-        if not conn:
-            return []
 
+# 🔹 Quantas compras a coleta vai percorrer (total da barra de progresso)
+# No modo incremental o total sai da mesma lista filtrada pelo índice de chaves; sem o
+# índice, contar repetiria as subconsultas por compra da lista de trabalho, então a
+# barra fica sem total (None).
+# Com fotografada (threading.Event), avisa quando o snapshot da contagem foi tirado:
+# a partir daí a coleta pode reservar compras sem que elas saiam do total.
+def contar_compras(completo=False, execucao=None, indice=None, fotografada=None):
+    if not completo and indice is None:
+        return None
+    query, parametros = query_compras(True)
+    if execucao:
+        query, parametros = filtrar_retomada(query, parametros, execucao)
+    with pool.conexao() as conn:
         cursor = conn.cursor()
-        query = """
-            SELECT DISTINCT numero_controle_pncp, orgao_cnpj, sequencial_compra, ano_compra
-            FROM pncp.contratacoes_publicas
-            WHERE orgao_esfera_id <> 'F';
-        """
-        cursor.execute(query)
-        resultados = cursor.fetchall()
-
+        garantir_tabela(cursor)
+        garantir_tabela_checkpoint(cursor)
+        conn.commit()
+        # Um snapshot só para a transação inteira, tirado já no SELECT 1
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        cursor.execute("SELECT 1")
         cursor.close()
-        conn.close()
-
-        return resultados  # Retorna 4 valores agora
-
-    except Exception as e:
-        st.error(f"Erro ao buscar CNPJs do banco: {e}")
-        return []
-
-
-# 🔹 Buscar Itens de Contratação na API
-def buscar_itens_por_cnpj_ano_sequencial(cnpj, ano, sequencial):
-    itens_coletados = []
-    numero_item = 1
-
-    while True:
-        url = f"{BASE_URL_CONTRATACAO_ITENS}/{cnpj}/compras/{ano}/{sequencial}/itens/{numero_item}"
-        response = requests.get(url, headers=HEADERS)
-
-        if response.status_code == 200:
-            item = response.json()
-            itens_coletados.append(item)
-            st.write(
-                f"Item {numero_item} coletado para CNPJ {cnpj} - Sequencial {sequencial}"
-            )
-        elif response.status_code == 404:
-            st.warning(
-                f"Item {numero_item} não encontrado. Fim dos itens para este sequencial."
-            )
-            break
+        if fotografada is not None:
+            fotografada.set()
+        if completo:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT count(*) FROM ({query}) lista", parametros)
+            total = cursor.fetchone()[0]
         else:
-            st.error(f"Erro na requisição {numero_item}: {response.status_code}")
-            break
-
-        numero_item += 1
+            cursor = conn.cursor(name="contagem_compras")
+            cursor.itersize = ITERSIZE_COMPRAS
+            cursor.execute(query, parametros)
+            total = sum(1 for _ in indice.filtrar_incremental(cursor))
+        cursor.close()
+        conn.commit()
+    return total
 
-    return itens_coletados
 
+# 🔹 Conta as compras numa thread à parte: a coleta não espera a passada pela lista
+# inteira e a barra mostra "N compras" até o total chegar.
+# Só espera o snapshot da contagem, para as compras reservadas depois dele contarem.
+def contar_em_segundo_plano(trabalho, execucao, indice):
+    fotografada = threading.Event()
 
-# 🔹 Função para inserir registros no banco de dados
-def inserir_dados_banco(dados):
-    conexao = conectar_banco()
-    if not conexao:
-        return
+    def contar():
+        try:
+            trabalho.total_compras = contar_compras(
+                trabalho.completo, execucao, indice, fotografada
+            )
+        except Exception as e:
+            trabalho.registrar("aviso", f"Não foi possível contar as compras: {e}")
+        finally:
+            fotografada.set()
 
-    cursor = conexao.cursor()
-    registros_para_inserir = []
+    threading.Thread(target=contar, name="contagem_compras", daemon=True).start()
+    fotografada.wait()
 
-    # Validar e preparar registros
-    for registro in dados:
-        numero_controle_pncp = str(get_value_safe(registro, "numero_controle_pncp"))
-        numero_item = str(get_value_safe(registro, "numeroItem"))
 
-        if not numero_controle_pncp or not numero_item:
-            st.warning(
-                "❗ Registro inválido: 'numero_controle_pncp' ou 'numeroItem' ausente."
+# Função que processa todos os CNPJs + Sequenciais + Anos
+# Roda na thread do trabalho: mensagens vão para o log dele (trabalho.registrar).
+# Pool, coletor e gravação são os do importador_itens, compartilhados pelo processo.
+def processar_todos_cnpjs(trabalho):
+    registrar = trabalho.registrar
+    if trabalho.execucao is None:
+        trabalho.execucao = nova_execucao()
+    execucao = trabalho.execucao
+    iniciar_execucao()
+    coletor.registrar = registrar
+    registrar("info", f"🔖 Execução: {execucao}")
+
+    # Índice das chaves já gravadas (PNCP_INDICE_CHAVES), carregado uma vez por execução
+    indice = carregar_indice_chaves(registrar=registrar)
+
+    contar_em_segundo_plano(trabalho, execucao, indice)
+
+    reservadas = reservar_compras(
+        pool,
+        buscar_cnpjs_banco(
+            trabalho.completo, execucao, indice=indice, registrar=registrar
+        ),
+        execucao,
+    )
+    try:
+        # A coleta começa assim que a primeira compra chega do banco
+        primeira = next(reservadas, None)
+        if primeira is None:
+            registrar("aviso", "Nenhum CNPJ, sequencial ou ano encontrado no banco.")
+            return
+        # Pausa e cancelamento agem quando o coletor pede a próxima compra
+        resultados = trabalho.controlar(itertools.chain([primeira], reservadas))
+
+        def gravar(lote, compras_lote, falhas_lote):
+            gravar_lote(
+                lote,
+                compras_lote,
+                falhas_lote,
+                execucao,
+                sink,
+                indice=indice,
+                registrar=registrar,
             )
-            continue
+            trabalho.contar_lote(lote, compras_lote, falhas_lote)
 
-        registros_para_inserir.append((numero_controle_pncp, numero_item, registro))
+        # Coleta e gravação em paralelo: itens de várias compras por transação
+        sink = obter_sink_parquet()
+        pipeline = PipelineColeta(
+            coletor, gravar, registrar=registrar, zona_pouso=obter_zona_pouso()
+        )
+        try:
+            total_cnpjs = pipeline.executar(resultados)
+        finally:
+            if sink is not None:
+                sink.fechar()
+    finally:
+        reservadas.close()
+
+    if trabalho.cancelar.is_set():
+        liberadas = liberar_compras(pool, execucao)
+        registrar(
+            "aviso",
+            f"⏹ Coleta cancelada: {liberadas} compras reservadas voltaram para a fila "
+            "(marque 'Retomar' para continuar de onde parou).",
+        )
+    registrar("info", f"🔢 Total de {total_cnpjs} CNPJs processados.")
+    trabalho.resumo = finalizar_execucao()
+
+
+def _formatar_duracao(segundos):
+    minutos, segundos = divmod(int(segundos), 60)
+    horas, minutos = divmod(minutos, 60)
+    return f"{horas}h{minutos:02d}m" if horas else f"{minutos}m{segundos:02d}s"
+
+
+# 🔹 Coleta em segundo plano: roda numa thread, fora do script do Streamlit,
+# que só lê o estado (progresso, log) a cada atualização da página.
+# status: iniciando, executando, pausado, concluido, cancelado, erro
+class TrabalhoColeta:
+    def __init__(self, completo=False, execucao=None):
+        self.completo = completo
+        self.execucao = execucao
+        self.status = "iniciando"
+        self.total_compras = None
+        self.compras = 0
+        self.itens = 0
+        self.resumo = []
+        self.log = deque(maxlen=LINHAS_LOG)  # só as últimas linhas ficam na página
+        self.cancelar = threading.Event()
+        self.continuar = threading.Event()  # limpo = pausado
+        self.continuar.set()
+        self._inicio = None
+        self._fim = None
+        self._pausado_desde = None
+        self._tempo_pausado = 0.0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._executar, name="pncp-coleta-streamlit", daemon=True
+        )
 
-    if not registros_para_inserir:
-        st.warning("⚠ Nenhum registro válido para inserir.")
-        cursor.close()
-        conexao.close()
-        return
+    @property
+    def ativo(self):
+        return self._thread.is_alive()
 
-    # Agora vamos verificar registros já existentes no banco!
-    # Coleta dos numero_controle_pncp únicos
-    controles_unicos = tuple(set([r[0] for r in registros_para_inserir]))
+    def iniciar(self):
+        self._inicio = time.monotonic()
+        self._thread.start()
 
-    registros_existentes = set()
+    def registrar(self, nivel, mensagem):
+        self.log.append(f"{datetime.now():%H:%M:%S} {mensagem}")
 
-    try:
-        # Montando a query dinâmica para o IN
-        if len(controles_unicos) == 1:
-            controles_unicos = (
-                controles_unicos[0],
-                controles_unicos[0],
-            )  # Evita erro no psycopg2 com um único valor
-
-        placeholders = ",".join(["%s"] * len(controles_unicos))
-
-        query = f"""
-            SELECT numero_controle_pncp, numeroItem
-            FROM pncp.contratacao_itens_pncp
-            WHERE numero_controle_pncp IN ({placeholders})
-        """
-
-        cursor.execute(query, controles_unicos)
-
-        resultados_existentes = cursor.fetchall()
-        registros_existentes = {
-            (str(res[0]), str(res[1])) for res in resultados_existentes
-        }
-
-        st.write(f"✔ {len(registros_existentes)} registros já existem no banco.")
-
-    except Exception as e:
-        st.error(f"❗ Erro ao verificar registros existentes: {e}")
-
-    # Inserção dos registros que não existem
-    for numero_controle_pncp, numero_item, registro in registros_para_inserir:
-        if (numero_controle_pncp, numero_item) in registros_existentes:
-            st.warning(
-                f"⚠ Item {numero_item} do controle {numero_controle_pncp} já existe. Pulando."
-            )
-            continue
+    def _executar(self):
+        self.status = "executando"
         try:
-            cursor.execute(
-                """
-                INSERT INTO pncp.contratacao_itens_pncp (
-                 numero_controle_pncp, orgao_cnpj, sequencial_compra, numeroItem,descricao, materialOuServico, materialOuServicoNome,valorUnitarioEstimado, valorTotal, quantidade, unidadeMedida, orcamentoSigiloso,
-                  itemCategoriaId, itemCategoriaNome, patrimonio, codigoRegistroImobiliario, criterioJulgamentoId, criterioJulgamentoNome, situacaoCompraItem,
-                  situacaoCompraItemNome, tipoBeneficio, tipoBeneficioNome, incentivoProdutivoBasico, dataInclusao, dataAtualizacao, temResultado, imagem, 
-                  aplicabilidadeMargemPreferenciaNormal,aplicabilidadeMargemPreferenciaAdicional,percentualMargemPreferenciaNormal,percentualMargemPreferenciaAdicional,
-                  ncmNbsCodigo,ncmNbsDescricao,catalogo,categoriaItemCatalogo,catalogoCodigoItem,informacaoComplementar
-                )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                        %s,%s,%s,%s,%s,%s,%s
-                        )
-                        ON CONFLICT (numero_controle_pncp, numeroitem) DO NOTHING;
-                """,
-                (
-                    get_value_safe(registro, "numero_controle_pncp"),
-                    get_value_safe(registro, "orgao_cnpj"),
-                    get_value_safe(registro, "sequencial_compra"),
-                    get_value_safe(registro, "numeroItem"),
-                    get_value_safe(registro, "descricao"),
-                    get_value_safe(registro, "materialOuServico"),
-                    get_value_safe(registro, "materialOuServicoNome"),
-                    get_value_safe(registro, "valorUnitarioEstimado"),
-                    get_value_safe(registro, "valorTotal"),
-                    get_value_safe(registro, "quantidade"),
-                    get_value_safe(registro, "unidadeMedida"),
-                    get_value_safe(registro, "orcamentoSigiloso"),
-                    get_value_safe(registro, "itemCategoriaId"),
-                    get_value_safe(registro, "itemCategoriaNome"),
-                    get_value_safe(registro, "patrimonio"),
-                    get_value_safe(registro, "codigoRegistroImobiliario"),
-                    get_value_safe(registro, "criterioJulgamentoId"),
-                    get_value_safe(registro, "criterioJulgamentoNome"),
-                    get_value_safe(registro, "situacaoCompraItem"),
-                    get_value_safe(registro, "situacaoCompraItemNome"),
-                    get_value_safe(registro, "tipoBeneficio"),
-                    get_value_safe(registro, "tipoBeneficioNome"),
-                    get_value_safe(registro, "incentivoProdutivoBasico"),
-                    get_value_safe(registro, "dataInclusao"),
-                    get_value_safe(registro, "dataAtualizacao"),
-                    get_value_safe(registro, "temResultado"),
-                    get_value_safe(registro, "imagem"),
-                    get_value_safe(registro, "aplicabilidadeMargemPreferenciaNormal"),
-                    get_value_safe(
-                        registro, "aplicabilidadeMargemPreferenciaAdicional"
-                    ),
-                    get_value_safe(registro, "percentualMargemPreferenciaNormal"),
-                    get_value_safe(registro, "percentualMargemPreferenciaAdicional"),
-                    get_value_safe(registro, "ncmNbsCodigo"),
-                    get_value_safe(registro, "ncmNbsDescricao"),
-                    get_value_safe(registro, "catalogo"),
-                    get_value_safe(registro, "categoriaItemCatalogo"),
-                    get_value_safe(registro, "catalogoCodigoItem"),
-                    get_value_safe(registro, "informacaoComplementar"),
-                ),
-            )
+            processar_todos_cnpjs(self)
+            self.status = "cancelado" if self.cancelar.is_set() else "concluido"
         except Exception as e:
-            conexao.rollback()
-            st.error(f"Erro ao inserir registro {numero_item}: {e}")
-
-    conexao.commit()
-    cursor.close()
-    conexao.close()
-
-
-# Função que processa todos os CNPJs + Sequenciais + Anos
-def processar_todos_cnpjs():
-    resultados = buscar_cnpjs_banco()
-
-    if not resultados:
-        st.warning("Nenhum CNPJ, sequencial ou ano encontrado no banco.")
-        return
-    total_cnpjs = len(resultados)
-    st.info(f"🔢 Total de {total_cnpjs} CNPJs encontrados para processar.")
-
-    for numero_controle_pncp, cnpj, sequencial, ano in resultados:
-        st.info(
-            f"🔄 Buscando itens para CNPJ: {cnpj}, Ano: {ano}, Sequencial: {sequencial}"
-        )
-        itens = buscar_itens_por_cnpj_ano_sequencial(cnpj, ano, sequencial)
+            self.status = "erro"
+            self.registrar("erro", f"Erro na coleta: {e}")
+        finally:
+            self._fim = time.monotonic()
+
+    # Repassa as compras ao pipeline, parando enquanto pausado e encerrando no cancelamento
+    # Roda no event loop do coletor (coletar_compras pede a próxima compra com next):
+    # enquanto pausado, o loop para junto, e as compras em andamento ficam suspensas.
+    def controlar(self, compras):
+        for compra in compras:
+            self.continuar.wait()
+            if self.cancelar.is_set():
+                return
+            yield compra
+
+    def contar_lote(self, lote, compras_lote, falhas_lote):
+        with self._lock:
+            self.compras += len(compras_lote or {}) + len(falhas_lote or {})
+            self.itens += len(lote)
+
+    def pausar(self):
+        with self._lock:
+            if self.status == "executando":
+                self.continuar.clear()
+                self._pausado_desde = time.monotonic()
+                self.status = "pausado"
+                self.registrar(
+                    "info",
+                    "⏸ Coleta pausada: nenhuma compra nova começa e as que estão em "
+                    "andamento ficam suspensas até continuar.",
+                )
 
-        if itens:
-            st.success(
-                f"✅ {len(itens)} itens coletados para CNPJ {cnpj} - Sequencial {sequencial}"
-            )
+    def retomar(self):
+        with self._lock:
+            if self.status == "pausado":
+                self._tempo_pausado += time.monotonic() - self._pausado_desde
+                self._pausado_desde = None
+                self.status = "executando"
+                self.registrar("info", "▶ Coleta retomada.")
+            self.continuar.set()
+
+    def interromper(self):
+        self.cancelar.set()
+        self.retomar()
+        self.registrar("aviso", "⏹ Cancelando: aguardando as compras em andamento...")
+
+    # Segundos de coleta efetiva (sem as pausas)
+    def tempo_ativo(self):
+        fim = self._fim or self._pausado_desde or time.monotonic()
+        return max(0.0, fim - self._inicio - self._tempo_pausado) if self._inicio else 0.0
+
+    # (fração de 0 a 1, texto) para a barra de progresso
+    def progresso(self):
+        with self._lock:
+            compras, itens = self.compras, self.itens
+        total = self.total_compras
+        decorrido = self.tempo_ativo()
+        vazao = itens / decorrido if decorrido else 0.0
+
+        partes = [
+            f"{compras}/{total} compras" if total else f"{compras} compras",
+            f"{itens} itens",
+            f"{vazao:.1f} itens/s",
+        ]
+        if total and compras and self.ativo:
+            restante = decorrido / compras * (total - compras)
+            partes.append(f"ETA {_formatar_duracao(restante)}")
+        else:
+            partes.append(f"tempo {_formatar_duracao(decorrido)}")
+        fracao = min(1.0, compras / total) if total else 0.0
+        if self.status == "concluido":
+            fracao = 1.0
+        return fracao, " · ".join(partes)
 
-            # Adiciona numero_controle_pncp e orgao_cnpj a cada item
-            itens_completos = []
-            for item in itens:
-                item["numero_controle_pncp"] = numero_controle_pncp
-                item["orgao_cnpj"] = cnpj
-                item["sequencial_compra"] = str(sequencial)
-                itens_completos.append(item)
 
-            inserir_dados_banco(itens_completos)
-        else:
-            st.warning(
-                f"⚠️ Nenhum item encontrado para CNPJ {cnpj} - Sequencial {sequencial}"
-            )
+# 🔹 Trabalho atual, compartilhado entre sessões: recarregar a página não perde a coleta
+@st.cache_resource
+def painel_trabalho():
+    return {"atual": None}
 
 
 # ==============================
@@ -277,8 +305,54 @@ st.write(
     "Este aplicativo coleta itens de contratação no PNCP e insere no banco de dados PostgreSQL."
 )
 
-# Botão para iniciar processamento
-if st.button("Iniciar Coleta e Inserção de Todos os CNPJs"):
-    st.info("🔄 Iniciando o processamento completo...")
-    processar_todos_cnpjs()
-    st.success("✅ Processamento concluído!")
+painel = painel_trabalho()
+trabalho = painel["atual"]
+
+if trabalho is None or not trabalho.ativo:
+    completo = st.checkbox(
+        "Recarga completa (reprocessar todas as compras, não só as novas/alteradas)"
+    )
+
+    retomar = st.checkbox("Retomar a última execução interrompida")
+
+    # Botão para iniciar processamento (a coleta roda em segundo plano)
+    if st.button("Iniciar Coleta e Inserção de Todos os CNPJs"):
+        execucao = buscar_ultima_execucao() if retomar else None
+        trabalho = TrabalhoColeta(completo, execucao)
+        trabalho.registrar("info", "🔄 Iniciando o processamento completo...")
+        painel["atual"] = trabalho
+        trabalho.iniciar()
+        st.rerun()
+
+if trabalho is not None:
+    fracao, texto = trabalho.progresso()
+    st.progress(fracao, text=texto)
+
+    if trabalho.ativo:
+        coluna_pausa, coluna_cancelar = st.columns(2)
+        if trabalho.status == "pausado":
+            if coluna_pausa.button("▶ Continuar"):
+                trabalho.retomar()
+                st.rerun()
+        elif coluna_pausa.button("⏸ Pausar", disabled=trabalho.cancelar.is_set()):
+            trabalho.pausar()
+            st.rerun()
+        if coluna_cancelar.button("⏹ Cancelar", disabled=trabalho.cancelar.is_set()):
+            trabalho.interromper()
+            st.rerun()
+
+    # Log agregado num único elemento (as últimas PNCP_APP_LINHAS_LOG linhas)
+    st.code("\n".join(trabalho.log) or "...", language=None)
+
+    if trabalho.ativo:
+        time.sleep(INTERVALO_ATUALIZACAO)
+        st.rerun()
+    else:
+        if trabalho.status == "concluido":
+            st.success("✅ Processamento concluído!")
+        elif trabalho.status == "cancelado":
+            st.warning("⏹ Coleta cancelada.")
+        elif trabalho.status == "erro":
+            st.error("❗ A coleta terminou com erro (ver log).")
+        for linha in trabalho.resumo:
+            st.write(linha)
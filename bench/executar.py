@@ -0,0 +1,374 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from urllib.request import urlopen
+
+# 🔹 Benchmark de ponta a ponta do importador
+# Sobe o servidor falso da API (bench/servidor_pncp.py, em outro processo) e um Postgres
+# descartável, cria N compras sintéticas e roda importador_itens.processar_todos_cnpjs.
+# Relata itens/s, requisições HTTP por item, idas ao banco e pico de memória (RSS).
+#
+#   python -m bench.executar --compras 2000 --itens 1-40 --latencia 80 --taxa-erro 0.01
+#
+# Postgres: com --dsn (ou PNCP_BENCH_DSN), cria e apaga um banco temporário nesse
+# servidor; sem ele, sobe um cluster temporário com initdb/pg_ctl (do PATH ou de
+# PNCP_BENCH_PG_BIN). As demais PNCP_* do ambiente valem como numa execução normal;
+# cache HTTP, zona de pouso e limite de requisições por segundo vêm desligados
+# (podem ser religados pelo ambiente).
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.servidor_pncp import argumentos_servidor  # noqa: E402
+
+PADROES_AMBIENTE = {
+    "PNCP_CONFIG": "ambiente",
+    "PNCP_CACHE": "desligado",
+    "PNCP_ZONA_POUSO": "desligado",
+    "PNCP_TAXA_REQUISICOES": "0",
+}
+
+TIPOS_SQL = {
+    "texto": "text",
+    "inteiro": "integer",
+    "decimal": "numeric",
+    "booleano": "boolean",
+    "data": "timestamp",
+}
+
+
+# 🔹 Servidor falso num processo separado (não disputa o GIL com o importador)
+@contextlib.contextmanager
+def servidor_falso(args):
+    comando = [sys.executable, "-m", "bench.servidor_pncp", "--porta", "0"]
+    for opcao in ("itens", "latencia", "jitter", "taxa_erro", "taxa_429",
+                  "capacidade", "retry_after", "semente"):
+        valor = getattr(args, opcao)
+        if opcao == "itens":
+            valor = f"{valor[0]}-{valor[1]}"
+        comando += ["--" + opcao.replace("_", "-"), str(valor)]
+
+    processo = subprocess.Popen(
+        comando,
+        stdout=subprocess.PIPE,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    try:
+        url_base = processo.stdout.readline().strip()
+        if not url_base:
+            raise RuntimeError("o servidor falso não iniciou")
+        yield url_base
+    finally:
+        processo.terminate()
+        processo.wait(timeout=10)
+
+
+def estatisticas_servidor(url_base, zerar=False):
+    raiz = url_base.split("/api/")[0]
+    with urlopen(f"{raiz}/_estatisticas{'?zerar=1' if zerar else ''}") as resposta:
+        return json.load(resposta)
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _binario(nome):
+    pasta = os.getenv("PNCP_BENCH_PG_BIN")
+    caminho = os.path.join(pasta, nome) if pasta else shutil.which(nome)
+    if not caminho or not os.path.exists(caminho):
+        raise RuntimeError(
+            f"{nome} não encontrado: informe --dsn ou PNCP_BENCH_PG_BIN"
+        )
+    return caminho
+
+
+# 🔹 Postgres descartável; gera os parâmetros de conexão (DB_*)
+@contextlib.contextmanager
+def banco_temporario(dsn=None):
+    import psycopg2
+
+    if dsn:
+        nome = f"pncp_bench_{uuid.uuid4().hex[:8]}"
+        administrativa = psycopg2.connect(dsn)
+        administrativa.autocommit = True
+        administrativa.cursor().execute(f"CREATE DATABASE {nome}")
+        try:
+            parametros = administrativa.get_dsn_parameters()
+            yield {
+                "DB_HOST": parametros.get("host", ""),
+                "DB_PORT": parametros.get("port", ""),
+                "DB_USER": parametros.get("user", ""),
+                "DB_PASSWORD": administrativa.info.password or "",
+                "DB_NAME": nome,
+            }
+        finally:
+            administrativa.cursor().execute(f"DROP DATABASE IF EXISTS {nome} WITH (FORCE)")
+            administrativa.close()
+        return
+
+    pasta = tempfile.mkdtemp(prefix="pncp_bench_pg_")
+    dados = os.path.join(pasta, "dados")
+    porta = _porta_livre()
+    saida = subprocess.DEVNULL
+    for comando in (
+        [_binario("initdb"), "-D", dados, "-U", "postgres", "-A", "trust"],
+        [
+            _binario("pg_ctl"), "-D", dados, "-w", "-l", os.path.join(pasta, "log"),
+            "-o", f"-p {porta} -k {pasta} -c listen_addresses='' -c fsync=off",
+            "start",
+        ],
+    ):
+        execucao = subprocess.run(comando, stdout=saida, stderr=subprocess.PIPE, text=True)
+        if execucao.returncode != 0:
+            shutil.rmtree(pasta, ignore_errors=True)
+            raise RuntimeError(
+                f"{os.path.basename(comando[0])} falhou: {execucao.stderr.strip()}"
+            )
+    try:
+        yield {
+            "DB_HOST": pasta,
+            "DB_PORT": str(porta),
+            "DB_USER": "postgres",
+            "DB_PASSWORD": "",
+            "DB_NAME": "postgres",
+        }
+    finally:
+        subprocess.run(
+            [_binario("pg_ctl"), "-D", dados, "-w", "-m", "immediate", "stop"],
+            stdout=saida, stderr=saida,
+        )
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+# 🔹 Esquema mínimo (tabela de itens gerada de colunas.ESPECIFICACAO) e N compras
+def criar_dados(conexao, compras, orgaos, anos):
+    from colunas import ESPECIFICACAO
+
+    colunas = ",\n".join(
+        f"{coluna} {TIPOS_SQL[tipo]}" for _, coluna, tipo in ESPECIFICACAO
+    )
+    cursor = conexao.cursor()
+    cursor.execute(
+        f"""
+        CREATE SCHEMA IF NOT EXISTS pncp;
+        CREATE TABLE pncp.contratacoes_publicas (
+            numero_controle_pncp text PRIMARY KEY,
+            orgao_cnpj text,
+            sequencial_compra integer,
+            ano_compra integer,
+            orgao_esfera_id text
+        );
+        CREATE TABLE pncp.contratacao_itens_pncp (
+            id bigserial PRIMARY KEY,
+            {colunas},
+            UNIQUE (numero_controle_pncp, numeroitem)
+        );
+        INSERT INTO pncp.contratacoes_publicas
+        SELECT cnpj || '-1-' || lpad(seq::text, 6, '0') || '/' || ano,
+               cnpj, seq, ano, CASE WHEN mod(i, 3) = 0 THEN 'E' ELSE 'M' END
+        FROM (
+            SELECT i,
+                   lpad((10000000000000 + mod(i, %(orgaos)s))::text, 14, '0') AS cnpj,
+                   i / %(orgaos)s + 1 AS seq,
+                   extract(year FROM now())::int - mod(i, %(anos)s) AS ano
+            FROM generate_series(0, %(compras)s - 1) i
+        ) compras;
+        """,
+        {"compras": compras, "orgaos": orgaos, "anos": anos},
+    )
+    conexao.commit()
+    cursor.close()
+
+
+# 🔹 Conexão que conta as idas ao banco: comandos, fetch de cursor de servidor,
+# COPY, commit e rollback
+def conexao_medida(contador):
+    import psycopg2
+    import psycopg2.extensions
+
+    class CursorMedido(psycopg2.extensions.cursor):
+        def execute(self, *args, **kwargs):
+            contador.inc()
+            return super().execute(*args, **kwargs)
+
+        def executemany(self, query, parametros):
+            parametros = list(parametros)
+            contador.inc(len(parametros))
+            return super().executemany(query, parametros)
+
+        def copy_expert(self, *args, **kwargs):
+            contador.inc()
+            return super().copy_expert(*args, **kwargs)
+
+        def fetchmany(self, *args, **kwargs):
+            if self.name:
+                contador.inc()
+            return super().fetchmany(*args, **kwargs)
+
+        def fetchall(self):
+            if self.name:
+                contador.inc()
+            return super().fetchall()
+
+    class ConexaoMedida(psycopg2.extensions.connection):
+        def cursor(self, *args, **kwargs):
+            kwargs.setdefault("cursor_factory", CursorMedido)
+            return super().cursor(*args, **kwargs)
+
+        def commit(self):
+            contador.inc()
+            return super().commit()
+
+        def rollback(self):
+            contador.inc()
+            return super().rollback()
+
+    return ConexaoMedida
+
+
+# Pico de RSS do processo, em MB (ru_maxrss é KB no Linux e bytes no macOS)
+def pico_rss_mb():
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+# 🔹 Uma execução medida; devolve o relatório (dict)
+def medir_execucao(completo=True, verboso=False):
+    import psycopg2
+
+    import importador_itens
+    from config import obter_configuracao
+    from metricas import COMPRAS, ITENS_COLETADOS, REGISTRO
+
+    idas_banco = REGISTRO.contador(
+        "pncp_banco_idas", "Idas ao banco (comandos, fetch, COPY, commit), no benchmark"
+    )
+    fabrica = conexao_medida(idas_banco)
+    # Só a fábrica do pool muda: o restante do importador roda como em produção
+    importador_itens.pool.fabrica = lambda: psycopg2.connect(
+        **obter_configuracao().parametros_conexao(), connection_factory=fabrica
+    )
+
+    saida = contextlib.nullcontext() if verboso else contextlib.redirect_stdout(io.StringIO())
+    inicio = time.perf_counter()
+    with saida:
+        importador_itens.processar_todos_cnpjs(completo=completo)
+    duracao = time.perf_counter() - inicio
+
+    return {
+        "duracao_s": round(duracao, 3),
+        "compras": {rotulos[0][1]: valor for _, rotulos, valor in COMPRAS.amostras()},
+        "itens": ITENS_COLETADOS.total(),
+        "idas_banco": idas_banco.total(),
+    }
+
+
+def relatorio(resultado, servidor, linhas_tabela):
+    itens = resultado["itens"]
+    duracao = resultado["duracao_s"]
+    requisicoes = servidor["requisicoes"]
+    return {
+        **resultado,
+        "linhas_tabela": linhas_tabela,
+        "itens_por_s": round(itens / duracao, 1) if duracao else None,
+        "requisicoes_http": requisicoes,
+        "requisicoes_por_item": round(requisicoes / itens, 3) if itens else None,
+        "http_por_status": servidor["por_status"],
+        "pico_em_voo_servidor": servidor["pico_em_voo"],
+        "idas_banco_por_item": (
+            round(resultado["idas_banco"] / itens, 3) if itens else None
+        ),
+        "pico_rss_mb": round(pico_rss_mb(), 1),
+    }
+
+
+def imprimir(nome, dados):
+    print(f"\n📊 {nome}")
+    print(f"   itens/s:              {dados['itens_por_s']}")
+    print(f"   itens coletados:      {dados['itens']} ({dados['linhas_tabela']} na tabela)")
+    print(f"   compras:              {dados['compras']}")
+    print(f"   duração:              {dados['duracao_s']}s")
+    print(f"   requisições HTTP:     {dados['requisicoes_http']}"
+          f" ({dados['requisicoes_por_item']} por item) {dados['http_por_status']}")
+    print(f"   idas ao banco:        {dados['idas_banco']}"
+          f" ({dados['idas_banco_por_item']} por item)")
+    print(f"   pico de RSS:          {dados['pico_rss_mb']} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark do importador contra a API falsa e um Postgres descartável"
+    )
+    parser.add_argument("--compras", type=int, default=500, help="compras na lista (padrão 500)")
+    parser.add_argument("--orgaos", type=int, default=50, help="CNPJs distintos (padrão 50)")
+    parser.add_argument("--anos", type=int, default=3, help="anos distintos (padrão 3)")
+    argumentos_servidor(parser)
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="mede também uma segunda execução incremental, sobre o banco já carregado",
+    )
+    parser.add_argument("--dsn", default=os.getenv("PNCP_BENCH_DSN"),
+                        help="servidor Postgres onde criar o banco temporário")
+    parser.add_argument("--json", metavar="ARQUIVO", help="grava o relatório em JSON")
+    parser.add_argument("--verboso", action="store_true",
+                        help="mostra as mensagens do importador")
+    args = parser.parse_args()
+
+    for chave, valor in PADROES_AMBIENTE.items():
+        os.environ.setdefault(chave, valor)
+
+    with servidor_falso(args) as url_base, banco_temporario(args.dsn) as ambiente_banco:
+        # Antes de importar o importador: a configuração é lida dos módulos no import
+        os.environ["PNCP_BASE_URL"] = url_base
+        os.environ.update(ambiente_banco)
+        import psycopg2
+
+        from config import obter_configuracao
+
+        def conectar():
+            return contextlib.closing(
+                psycopg2.connect(**obter_configuracao().parametros_conexao())
+            )
+
+        with conectar() as conexao:
+            criar_dados(conexao, args.compras, args.orgaos, args.anos)
+
+        def linhas_tabela():
+            with conectar() as conexao:
+                cursor = conexao.cursor()
+                cursor.execute("SELECT count(*) FROM pncp.contratacao_itens_pncp")
+                return cursor.fetchone()[0]
+
+        print(f"🏁 {args.compras} compras, servidor em {url_base}")
+        resultados = {}
+        execucoes = [("completa", True)] + ([("incremental", False)] if args.incremental else [])
+        for nome, completo in execucoes:
+            estatisticas_servidor(url_base, zerar=True)
+            resultado = medir_execucao(completo, args.verboso)
+            resultados[nome] = relatorio(
+                resultado, estatisticas_servidor(url_base), linhas_tabela()
+            )
+            imprimir(nome, resultados[nome])
+
+    if args.json:
+        parametros = {
+            chave: valor for chave, valor in vars(args).items()
+            if chave not in ("json", "dsn", "verboso")
+        }
+        with open(args.json, "w", encoding="utf-8") as arquivo:
+            json.dump({"parametros": parametros, "resultados": resultados},
+                      arquivo, ensure_ascii=False, indent=2)
+        print(f"\n💾 Relatório gravado em {args.json}")
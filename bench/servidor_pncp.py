@@ -0,0 +1,323 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# 🔹 Servidor falso da API do PNCP, para medir o importador sem tocar o pncp.gov.br
+# Atende as rotas usadas pelo coletor (PNCP_BASE_URL=http://127.0.0.1:<porta>/api/pncp/v1):
+#   /api/pncp/v1/orgaos/{cnpj}/compras/{ano}/{sequencial}/itens?pagina=&tamanhoPagina=
+#   /api/pncp/v1/orgaos/{cnpj}/compras/{ano}/{sequencial}/itens/{numero}
+# Os itens são sintéticos e determinísticos: a mesma compra sempre tem os mesmos itens.
+# GET /_estatisticas devolve as contagens (com ?zerar=1, zera depois de ler).
+#
+# Uso avulso: python -m bench.servidor_pncp --porta 8765 --itens 1-40 --latencia 80
+
+ROTA_ITENS = re.compile(
+    r"^/api/pncp/v1/orgaos/(\d+)/compras/(\d+)/(\d+)/itens(?:/(\d+))?/?$"
+)
+
+UNIDADES = ["UNIDADE", "CAIXA", "PACOTE", "LITRO", "QUILOGRAMA", "SERVIÇO", "MÊS"]
+CATEGORIAS = [(1, "Bens imóveis"), (2, "Bens móveis"), (3, "Não se aplica")]
+JULGAMENTOS = [(1, "Menor preço"), (5, "Maior desconto"), (7, "Técnica e preço")]
+SITUACOES = [(1, "Em andamento"), (2, "Homologado"), (3, "Anulado/Revogado/Cancelado")]
+
+
+# Faixa "min-max" ou número fixo
+def faixa(texto):
+    minimo, _, maximo = str(texto).partition("-")
+    minimo = int(minimo)
+    return minimo, int(maximo or minimo)
+
+
+# 🔹 Compras e itens sintéticos
+class DadosSinteticos:
+    def __init__(self, itens=(1, 40), semente=0):
+        self.itens_min, self.itens_max = itens
+        self.semente = semente
+
+    def _aleatorio(self, *chave):
+        return random.Random("/".join(str(parte) for parte in (self.semente, *chave)))
+
+    def quantidade_itens(self, cnpj, ano, sequencial):
+        return self._aleatorio(cnpj, ano, sequencial).randint(
+            self.itens_min, self.itens_max
+        )
+
+    def item(self, cnpj, ano, sequencial, numero):
+        aleatorio = self._aleatorio(cnpj, ano, sequencial, numero)
+        quantidade = aleatorio.randint(1, 500)
+        unitario = round(aleatorio.uniform(0.5, 5000), 2)
+        material = aleatorio.random() < 0.7
+        categoria = aleatorio.choice(CATEGORIAS)
+        julgamento = aleatorio.choice(JULGAMENTOS)
+        situacao = aleatorio.choice(SITUACOES)
+        return {
+            "numeroItem": numero,
+            "descricao": f"Item {numero} da compra {sequencial}/{ano} "
+            + "x" * aleatorio.randint(10, 200),
+            "materialOuServico": "M" if material else "S",
+            "materialOuServicoNome": "Material" if material else "Serviço",
+            "valorUnitarioEstimado": unitario,
+            "valorTotal": round(unitario * quantidade, 2),
+            "quantidade": quantidade,
+            "unidadeMedida": aleatorio.choice(UNIDADES),
+            "orcamentoSigiloso": aleatorio.random() < 0.05,
+            "itemCategoriaId": categoria[0],
+            "itemCategoriaNome": categoria[1],
+            "patrimonio": None,
+            "codigoRegistroImobiliario": None,
+            "criterioJulgamentoId": julgamento[0],
+            "criterioJulgamentoNome": julgamento[1],
+            "situacaoCompraItem": situacao[0],
+            "situacaoCompraItemNome": situacao[1],
+            "tipoBeneficio": 4,
+            "tipoBeneficioNome": "Sem benefício",
+            "incentivoProdutivoBasico": False,
+            "dataInclusao": f"{ano}-03-{aleatorio.randint(10, 28)}T10:00:00",
+            "dataAtualizacao": f"{ano}-04-{aleatorio.randint(10, 28)}T15:30:00",
+            "temResultado": situacao[0] == 2,
+            "imagem": 0,
+            "aplicabilidadeMargemPreferenciaNormal": False,
+            "aplicabilidadeMargemPreferenciaAdicional": False,
+            "percentualMargemPreferenciaNormal": None,
+            "percentualMargemPreferenciaAdicional": None,
+            "ncmNbsCodigo": str(aleatorio.randint(10000000, 99999999)),
+            "ncmNbsDescricao": None,
+            "catalogo": "Compras.gov.br" if material else None,
+            "categoriaItemCatalogo": None,
+            "catalogoCodigoItem": str(aleatorio.randint(100000, 999999)),
+            "informacaoComplementar": None,
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, como o servidor real
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        servidor = self.server.pncp
+        url = urlsplit(self.path)
+        if url.path == "/_estatisticas":
+            zerar = parse_qs(url.query).get("zerar") == ["1"]
+            self._responder(200, servidor.estatisticas(zerar=zerar))
+            return
+
+        if not servidor.entrar():
+            servidor.contar(429)
+            self._responder(429, cabecalhos={"Retry-After": str(servidor.retry_after)})
+            return
+        try:
+            status, corpo = servidor.atender(url)
+        finally:
+            servidor.sair()
+        servidor.contar(status, len(corpo) if isinstance(corpo, list) else int(bool(corpo)))
+        cabecalhos = {"Retry-After": str(servidor.retry_after)} if status == 429 else None
+        self._responder(status, corpo, cabecalhos)
+
+    def _responder(self, status, corpo=None, cabecalhos=None):
+        dados = json.dumps(corpo, ensure_ascii=False).encode("utf-8") if corpo else b""
+        self.send_response(status)
+        for nome, valor in (cabecalhos or {}).items():
+            self.send_header(nome, valor)
+        if dados:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+
+# 🔹 Servidor com latência, erros e capacidade configuráveis
+# latencia/jitter em segundos; taxa_erro: fração de respostas 500/503;
+# taxa_429: fração de respostas 429; capacidade: requisições simultâneas atendidas
+# (as que passam disso recebem 429, como um servidor sobrecarregado); 0 = sem limite
+class ServidorPNCP:
+    def __init__(
+        self,
+        porta=0,
+        itens=(1, 40),
+        latencia=0.05,
+        jitter=0.02,
+        taxa_erro=0.0,
+        taxa_429=0.0,
+        capacidade=0,
+        retry_after=0,
+        semente=0,
+    ):
+        self.dados = DadosSinteticos(itens, semente)
+        self.latencia = latencia
+        self.jitter = jitter
+        self.taxa_erro = taxa_erro
+        self.taxa_429 = taxa_429
+        self.capacidade = capacidade
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._zerar()
+        self._http = ThreadingHTTPServer(("127.0.0.1", porta), _Handler)
+        self._http.daemon_threads = True
+        self._http.pncp = self
+        self.porta = self._http.server_address[1]
+        self._thread = None
+
+    @property
+    def url_base(self):
+        return f"http://127.0.0.1:{self.porta}/api/pncp/v1"
+
+    def _zerar(self):
+        self._requisicoes = 0
+        self._por_status = {}
+        self._itens_servidos = 0
+        self._em_voo = 0
+        self._pico_em_voo = 0
+
+    # Atende na thread atual até parar()
+    def servir(self):
+        self._http.serve_forever()
+
+    # Atende numa thread em segundo plano
+    def iniciar(self):
+        self._thread = threading.Thread(
+            target=self.servir, name="servidor-pncp", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._http.shutdown()
+        self._http.server_close()
+
+    def entrar(self):
+        with self._lock:
+            if self.capacidade and self._em_voo >= self.capacidade:
+                return False
+            self._em_voo += 1
+            self._pico_em_voo = max(self._pico_em_voo, self._em_voo)
+            return True
+
+    def sair(self):
+        with self._lock:
+            self._em_voo -= 1
+
+    def contar(self, status, itens=0):
+        with self._lock:
+            self._requisicoes += 1
+            self._por_status[status] = self._por_status.get(status, 0) + 1
+            self._itens_servidos += itens
+
+    def estatisticas(self, zerar=False):
+        with self._lock:
+            estatisticas = {
+                "requisicoes": self._requisicoes,
+                "por_status": {str(s): n for s, n in sorted(self._por_status.items())},
+                "itens_servidos": self._itens_servidos,
+                "pico_em_voo": self._pico_em_voo,
+            }
+            if zerar:
+                em_voo = self._em_voo
+                self._zerar()
+                self._em_voo = em_voo
+        return estatisticas
+
+    # (status, corpo) de uma requisição da API
+    def atender(self, url):
+        espera = self.latencia + random.uniform(-self.jitter, self.jitter)
+        time.sleep(max(0.0, espera))
+
+        sorteio = random.random()
+        if sorteio < self.taxa_429:
+            return 429, None
+        if sorteio < self.taxa_429 + self.taxa_erro:
+            return random.choice((500, 503)), None
+
+        rota = ROTA_ITENS.match(url.path)
+        if not rota:
+            return 404, None
+        cnpj, ano, sequencial, numero = rota.groups()
+        total = self.dados.quantidade_itens(cnpj, ano, sequencial)
+
+        if numero is not None:
+            numero = int(numero)
+            if not 1 <= numero <= total:
+                return 404, None
+            return 200, self.dados.item(cnpj, ano, sequencial, numero)
+
+        parametros = parse_qs(url.query)
+        try:
+            pagina = int(parametros.get("pagina", ["1"])[0])
+            tamanho = int(parametros.get("tamanhoPagina", ["500"])[0])
+        except ValueError:
+            return 400, None
+        inicio = (pagina - 1) * tamanho + 1
+        fim = min(total, pagina * tamanho)
+        if inicio > fim:
+            return 204, None
+        return 200, [
+            self.dados.item(cnpj, ano, sequencial, numero)
+            for numero in range(inicio, fim + 1)
+        ]
+
+
+def argumentos_servidor(parser):
+    parser.add_argument(
+        "--itens", type=faixa, default=(1, 40), metavar="MIN-MAX",
+        help="itens por compra (faixa ou número fixo; padrão 1-40)",
+    )
+    parser.add_argument(
+        "--latencia", type=float, default=50, metavar="MS",
+        help="latência média de cada resposta, em ms (padrão 50)",
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=20, metavar="MS",
+        help="variação da latência, em ms, para mais ou para menos (padrão 20)",
+    )
+    parser.add_argument(
+        "--taxa-erro", type=float, default=0.0, metavar="FRACAO",
+        help="fração de respostas 500/503 (padrão 0)",
+    )
+    parser.add_argument(
+        "--taxa-429", type=float, default=0.0, metavar="FRACAO",
+        help="fração de respostas 429 (padrão 0)",
+    )
+    parser.add_argument(
+        "--capacidade", type=int, default=0, metavar="N",
+        help="requisições simultâneas atendidas; acima disso, 429 (padrão 0 = sem limite)",
+    )
+    parser.add_argument(
+        "--retry-after", type=int, default=0, metavar="S",
+        help="valor do cabeçalho Retry-After nas respostas 429 (padrão 0)",
+    )
+    parser.add_argument("--semente", type=int, default=0, help="semente dos dados")
+
+
+def criar_servidor(args, porta=0):
+    return ServidorPNCP(
+        porta=porta,
+        itens=args.itens,
+        latencia=args.latencia / 1000,
+        jitter=args.jitter / 1000,
+        taxa_erro=args.taxa_erro,
+        taxa_429=args.taxa_429,
+        capacidade=args.capacidade,
+        retry_after=args.retry_after,
+        semente=args.semente,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor falso da API do PNCP")
+    parser.add_argument("--porta", type=int, default=8765, help="0 = porta livre")
+    argumentos_servidor(parser)
+    args = parser.parse_args()
+
+    servidor = criar_servidor(args, args.porta)
+    # A primeira linha é a URL base: o benchmark lê dela a porta escolhida
+    print(servidor.url_base, flush=True)
+    try:
+        servidor.servir()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,208 @@
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Configuração do cache de respostas (variáveis de ambiente)
+# PNCP_CACHE: "ligado", "desligado" ou "somente_cache" (offline: nunca vai à rede)
+MODO_CACHE = os.getenv("PNCP_CACHE", "ligado")
+CAMINHO_CACHE = os.getenv(
+    "PNCP_CACHE_CAMINHO",
+    os.path.join(os.path.expanduser("~"), ".cache", "pncp_itens", "respostas.sqlite"),
+)
+# Curto por padrão para não mascarar a revalidação do modo incremental (PNCP_SYNC_TTL_DIAS);
+# aumente para reprocessamentos (backfill) que devem sair do disco
+TTL_HORAS = float(os.getenv("PNCP_CACHE_TTL_HORAS", "24"))
+MAX_MB = float(os.getenv("PNCP_CACHE_MAX_MB", "2048"))
+
+# Só estes status são guardados (o 404 marca o fim dos itens no modo item a item)
+STATUS_CACHEAVEIS = {200, 204, 404}
+# A limpeza por tamanho/TTL roda a cada tantas gravações
+LIMPAR_A_CADA = 500
+
+
+class _Entrada:
+    def __init__(self, url, status, corpo, etag, last_modified, armazenado_em, ttl):
+        self.url = url
+        self.status = status
+        self.corpo = corpo
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fresca = time.time() - armazenado_em < ttl
+
+    # Cabeçalhos para revalidar a entrada com uma requisição condicional
+    def validadores(self):
+        cabecalhos = {}
+        if self.etag:
+            cabecalhos["If-None-Match"] = self.etag
+        if self.last_modified:
+            cabecalhos["If-Modified-Since"] = self.last_modified
+        return cabecalhos
+
+    # Reconstrói um requests.Response, para quem chama não perceber a diferença
+    def resposta(self):
+        response = requests.Response()
+        response.status_code = self.status
+        response._content = self.corpo
+        response.url = self.url
+        response.encoding = "utf-8"
+        response.headers = CaseInsensitiveDict(
+            {"Content-Type": "application/json", "X-Cache": "HIT"}
+        )
+        return response
+
+
+# 🔹 Cache de respostas HTTP em SQLite, com corpo comprimido (zlib), chaveado pela URL
+class CacheRespostas:
+    def __init__(
+        self,
+        caminho=CAMINHO_CACHE,
+        ttl_horas=TTL_HORAS,
+        max_mb=MAX_MB,
+        somente_cache=False,
+    ):
+        self.ttl = ttl_horas * 3600
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.somente_cache = somente_cache
+        self._gravacoes = 0
+        self._lock = threading.Lock()
+
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("PRAGMA synchronous=NORMAL")
+        self._conexao.execute(
+            """
+            CREATE TABLE IF NOT EXISTS respostas (
+                url TEXT PRIMARY KEY,
+                status INTEGER NOT NULL,
+                corpo BLOB,
+                etag TEXT,
+                last_modified TEXT,
+                armazenado_em REAL NOT NULL,
+                acessado_em REAL NOT NULL,
+                tamanho INTEGER NOT NULL
+            )
+            """
+        )
+        self._conexao.execute(
+            "CREATE INDEX IF NOT EXISTS respostas_acessado_em ON respostas (acessado_em)"
+        )
+        self._conexao.commit()
+
+    @staticmethod
+    def chave(url, params=None):
+        return requests.Request("GET", url, params=params).prepare().url
+
+    def buscar(self, chave):
+        with self._lock:
+            linha = self._conexao.execute(
+                """
+                SELECT status, corpo, etag, last_modified, armazenado_em, acessado_em
+                FROM respostas WHERE url = ?
+                """,
+                (chave,),
+            ).fetchone()
+            if linha is None:
+                return None
+            status, corpo, etag, last_modified, armazenado_em, acessado_em = linha
+            agora = time.time()
+            # Evita uma escrita por leitura: o acesso só é atualizado de hora em hora
+            if agora - acessado_em > 3600:
+                self._conexao.execute(
+                    "UPDATE respostas SET acessado_em = ? WHERE url = ?", (agora, chave)
+                )
+                self._conexao.commit()
+        corpo = zlib.decompress(corpo) if corpo else b""
+        return _Entrada(
+            chave, status, corpo, etag, last_modified, armazenado_em, self.ttl
+        )
+
+    def guardar(self, chave, response):
+        if response.status_code not in STATUS_CACHEAVEIS:
+            return
+        corpo = zlib.compress(response.content or b"")
+        agora = time.time()
+        with self._lock:
+            self._conexao.execute(
+                """
+                INSERT OR REPLACE INTO respostas
+                    (url, status, corpo, etag, last_modified, armazenado_em, acessado_em, tamanho)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    chave,
+                    response.status_code,
+                    corpo,
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    agora,
+                    agora,
+                    len(corpo),
+                ),
+            )
+            self._conexao.commit()
+            self._gravacoes += 1
+            if self._gravacoes % LIMPAR_A_CADA == 0:
+                self._limpar()
+
+    # Resposta 304: a entrada continua válida por mais um TTL
+    def renovar(self, chave):
+        agora = time.time()
+        with self._lock:
+            self._conexao.execute(
+                "UPDATE respostas SET armazenado_em = ?, acessado_em = ? WHERE url = ?",
+                (agora, agora, chave),
+            )
+            self._conexao.commit()
+
+    # Remove entradas vencidas sem validadores e, acima do tamanho máximo, as menos acessadas
+    def _limpar(self):
+        limite = time.time() - self.ttl
+        self._conexao.execute(
+            """
+            DELETE FROM respostas
+            WHERE armazenado_em < ? AND etag IS NULL AND last_modified IS NULL
+            """,
+            (limite,),
+        )
+        total = self._conexao.execute(
+            "SELECT coalesce(sum(tamanho), 0) FROM respostas"
+        ).fetchone()[0]
+        if total > self.max_bytes:
+            excesso = total - int(self.max_bytes * 0.9)
+            self._conexao.execute(
+                """
+                DELETE FROM respostas WHERE url IN (
+                    SELECT url FROM (
+                        SELECT url, tamanho,
+                               sum(tamanho) OVER (ORDER BY acessado_em, url) AS acumulado
+                        FROM respostas
+                    ) WHERE acumulado - tamanho < ?
+                )
+                """,
+                (excesso,),
+            )
+        self._conexao.commit()
+
+
+_cache = None
+_lock_cache = threading.Lock()
+
+
+# 🔹 Cache compartilhado conforme PNCP_CACHE; None quando desligado
+def obter_cache():
+    global _cache
+    if MODO_CACHE == "desligado":
+        return None
+    if _cache is None:
+        with _lock_cache:
+            if _cache is None:
+                _cache = CacheRespostas(somente_cache=MODO_CACHE == "somente_cache")
+    return _cache
@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+
+import psycopg2
+
+from colunas import CHAVES_JSON, ESPECIFICACAO, Extrator
+from coletor_async import registrar_print
+from fila_falhas import garantir_tabela_falhas, registrar_linha_rejeitada
+
+TABELA_DESTINO = "pncp.contratacao_itens_pncp"
+TABELA_STAGING = "stg_contratacao_itens_pncp"
+
+# Quantos itens (de uma ou mais compras) acumular antes de gravar
+TAMANHO_LOTE = int(os.getenv("PNCP_TAMANHO_LOTE", "2000"))
+
+# Chave natural do item e coluna com o hash do conteúdo (detecção de mudanças)
+CHAVE = ["numero_controle_pncp", "numeroitem"]
+COLUNA_HASH = "hash_conteudo"
+
+# Colunas gravadas pela carga: as da especificação (colunas.py) mais o hash
+EXTRATOR_CARGA = Extrator(ESPECIFICACAO + [(COLUNA_HASH, COLUNA_HASH, "texto")])
+COLUNAS_CARGA = EXTRATOR_CARGA.colunas
+LISTA_COLUNAS_CARGA = ", ".join(COLUNAS_CARGA)
+
+# Na atualização, todas as colunas menos a chave são reescritas
+ATUALIZAR_COLUNAS = ",\n        ".join(
+    f"{coluna} = EXCLUDED.{coluna}" for coluna in COLUNAS_CARGA if coluna not in CHAVE
+)
+
+SQL_COLUNA_HASH_EXISTE = """
+    SELECT 1 FROM information_schema.columns
+    WHERE table_schema || '.' || table_name = %s AND column_name = %s
+"""
+
+# A staging copia os tipos das colunas do destino, sem restrições
+SQL_CRIAR_STAGING = f"""
+    CREATE TEMP TABLE IF NOT EXISTS {TABELA_STAGING} ON COMMIT DROP AS
+    SELECT {LISTA_COLUNAS_CARGA} FROM {TABELA_DESTINO} WITH NO DATA
+"""
+
+# Upsert com detecção de mudança: linha nova é inserida, linha com hash diferente é
+# atualizada e linha igual não é tocada (sem escrita nem WAL). DISTINCT ON porque o
+# DO UPDATE não aceita a mesma chave duas vezes no mesmo comando.
+# Devolve a chave das linhas gravadas; (xmax = 0) distingue inserção de atualização.
+SQL_MESCLAR = f"""
+    INSERT INTO {TABELA_DESTINO} ({LISTA_COLUNAS_CARGA})
+    SELECT DISTINCT ON (numero_controle_pncp, numeroitem) {LISTA_COLUNAS_CARGA}
+    FROM {TABELA_STAGING}
+    ORDER BY numero_controle_pncp, numeroitem
+    ON CONFLICT (numero_controle_pncp, numeroitem) DO UPDATE
+    SET {ATUALIZAR_COLUNAS}
+    WHERE {TABELA_DESTINO}.{COLUNA_HASH} IS DISTINCT FROM EXCLUDED.{COLUNA_HASH}
+    RETURNING numero_controle_pncp, numeroitem, (xmax = 0) AS inserido
+"""
+
+SQL_INSERIR_LINHA = f"""
+    INSERT INTO {TABELA_DESTINO} ({LISTA_COLUNAS_CARGA})
+    VALUES ({", ".join(["%s"] * len(COLUNAS_CARGA))})
+    ON CONFLICT (numero_controle_pncp, numeroitem) DO UPDATE
+    SET {ATUALIZAR_COLUNAS}
+    WHERE {TABELA_DESTINO}.{COLUNA_HASH} IS DISTINCT FROM EXCLUDED.{COLUNA_HASH}
+    RETURNING (xmax = 0) AS inserido
+"""
+
+
+# 🔹 Cria a tabela de falhas e a coluna de hash no destino, se faltarem.
+# O ALTER só roda quando a coluna não existe, para não disputar lock com quem grava.
+def garantir_tabelas_carga(cursor):
+    garantir_tabela_falhas(cursor)
+    cursor.execute(SQL_COLUNA_HASH_EXISTE, (TABELA_DESTINO, COLUNA_HASH))
+    if cursor.fetchone() is None:
+        cursor.execute(
+            f"ALTER TABLE {TABELA_DESTINO} ADD COLUMN IF NOT EXISTS {COLUNA_HASH} text"
+        )
+
+
+# 🔹 Hash (md5) das colunas gravadas de um item, com chaves ordenadas e formato estável
+def hash_conteudo(registro):
+    conteudo = {chave: registro.get(chave) for chave in CHAVES_JSON}
+    texto = json.dumps(
+        conteudo, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str
+    )
+    return hashlib.md5(texto.encode("utf-8")).hexdigest()
+
+
+# Chave do item como o banco devolve (numeroitem é inteiro na tabela)
+def _chave(numero_controle_pncp, numero_item):
+    try:
+        numero_item = int(numero_item)
+    except (TypeError, ValueError):
+        pass
+    return numero_controle_pncp, str(numero_item)
+
+
+def _com_hash(registro):
+    if registro.get(COLUNA_HASH) is None:
+        registro[COLUNA_HASH] = hash_conteudo(registro)
+    return registro
+
+
+# 🔹 Objeto "arquivo" que gera as linhas do COPY sob demanda, sem montar o lote inteiro em memória
+class _LeitorLinhas:
+    def __init__(self, registros):
+        self._linhas = map(EXTRATOR_CARGA.linha_copy, registros)
+        self._buffer = ""
+
+    def read(self, tamanho=-1):
+        while tamanho < 0 or len(self._buffer) < tamanho:
+            linha = next(self._linhas, None)
+            if linha is None:
+                break
+            self._buffer += linha
+        if tamanho < 0:
+            tamanho = len(self._buffer)
+        trecho, self._buffer = self._buffer[:tamanho], self._buffer[tamanho:]
+        return trecho
+
+
+# 🔹 Caminho lento: uma linha por vez, cada uma no seu savepoint
+def _carregar_linha_a_linha(cursor, registros, recusados, gravados):
+    inseridos = atualizados = rejeitados = 0
+    for registro in registros:
+        cursor.execute("SAVEPOINT linha")
+        try:
+            cursor.execute(
+                SQL_INSERIR_LINHA,
+                EXTRATOR_CARGA.tupla(registro),
+            )
+            gravado = cursor.fetchone()
+            if gravado is not None:
+                gravados.append(registro)
+                if gravado[0]:
+                    inseridos += 1
+                else:
+                    atualizados += 1
+            cursor.execute("RELEASE SAVEPOINT linha")
+        except psycopg2.Error as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT linha")
+            registrar_linha_rejeitada(cursor, registro, str(e).strip())
+            recusados.append(registro)
+            rejeitados += 1
+    return inseridos, atualizados, rejeitados
+
+
+# 🔹 Carrega um lote (de uma ou várias compras) via COPY na staging + um upsert por hash
+# Não faz commit: a transação é de quem chama. Linhas que o banco recusa vão para a
+# fila de falhas (fila_falhas.py) sem desfazer as demais.
+# Retorna (inseridos, atualizados, inalterados, rejeitados). Com as listas recusados e
+# gravados, acrescenta nelas os registros recusados (quem mantém o índice de chaves não
+# os conta) e os inseridos ou atualizados (o que a saída Parquet recebe no modo ambos).
+def carregar_itens_bulk(
+    conexao, registros, registrar=registrar_print, recusados=None, gravados=None
+):
+    if recusados is None:
+        recusados = []
+    if gravados is None:
+        gravados = []
+    cursor = conexao.cursor()
+    try:
+        # Preparação numa única ida ao banco; a tabela de falhas já foi criada no início
+        # (garantir_tabelas_carga); a staging é temporária e some a cada commit
+        cursor.execute(f"{SQL_CRIAR_STAGING}; TRUNCATE {TABELA_STAGING}")
+
+        validos = []
+        rejeitados = 0
+        for registro in registros:
+            if (
+                registro.get("numero_controle_pncp") is None
+                or registro.get("numeroItem") is None
+            ):
+                registrar_linha_rejeitada(
+                    cursor, registro, "'numero_controle_pncp' ou 'numeroItem' ausente"
+                )
+                recusados.append(registro)
+                rejeitados += 1
+            else:
+                validos.append(_com_hash(registro))
+
+        if not validos:
+            return 0, 0, 0, rejeitados
+
+        rejeitados_linha = 0
+        cursor.execute("SAVEPOINT carga_bulk")
+        try:
+            cursor.copy_expert(
+                f"COPY {TABELA_STAGING} ({LISTA_COLUNAS_CARGA}) FROM STDIN",
+                _LeitorLinhas(validos),
+            )
+            cursor.execute(SQL_MESCLAR)
+            linhas_gravadas = cursor.fetchall()
+            cursor.execute("RELEASE SAVEPOINT carga_bulk")
+            inseridos = sum(1 for *_, inserido in linhas_gravadas if inserido)
+            atualizados = len(linhas_gravadas) - inseridos
+            # Chave repetida no lote: vale o último registro com ela
+            por_chave = {
+                _chave(registro["numero_controle_pncp"], registro["numeroItem"]): registro
+                for registro in validos
+            }
+            for controle, numero_item, _ in linhas_gravadas:
+                registro = por_chave.get(_chave(controle, numero_item))
+                if registro is not None:
+                    gravados.append(registro)
+        except psycopg2.Error as e:
+            # Alguma linha derrubou o COPY/merge: refaz uma a uma para isolar as ruins
+            cursor.execute("ROLLBACK TO SAVEPOINT carga_bulk")
+            registrar(
+                "aviso",
+                f"❗ Carga em lote falhou ({str(e).strip()}). Inserindo linha a linha.",
+            )
+            inseridos, atualizados, rejeitados_linha = _carregar_linha_a_linha(
+                cursor, validos, recusados, gravados
+            )
+            rejeitados += rejeitados_linha
+
+        # Inalteradas: hash igual ao gravado (ou chave repetida no lote)
+        inalterados = len(validos) - inseridos - atualizados - rejeitados_linha
+        return inseridos, atualizados, inalterados, rejeitados
+    finally:
+        cursor.close()
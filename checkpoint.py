@@ -0,0 +1,158 @@
+import os
+from datetime import datetime
+
+from psycopg2.extras import execute_values
+
+TABELA_CHECKPOINT = "pncp.contratacao_itens_checkpoint"
+
+# Compra "em_andamento" há mais que isso é considerada abandonada e volta para a fila
+LEASE_MINUTOS = int(os.getenv("PNCP_CHECKPOINT_LEASE_MINUTOS", "30"))
+# Compras que falharam são tentadas de novo no resume até este limite
+MAX_TENTATIVAS = int(os.getenv("PNCP_CHECKPOINT_MAX_TENTATIVAS", "3"))
+# Quantas compras são reservadas (marcadas em_andamento) por ida ao banco
+TAMANHO_BLOCO = int(os.getenv("PNCP_CHECKPOINT_BLOCO", "200"))
+
+# Status: pendente (sem linha ou reenfileirada), em_andamento, concluida, falhou
+SQL_CRIAR_CHECKPOINT = f"""
+    CREATE TABLE IF NOT EXISTS {TABELA_CHECKPOINT} (
+        execucao text NOT NULL,
+        numero_controle_pncp text NOT NULL,
+        status text NOT NULL DEFAULT 'pendente'
+            CHECK (status IN ('pendente', 'em_andamento', 'concluida', 'falhou')),
+        tentativas integer NOT NULL DEFAULT 0,
+        ultimo_erro text,
+        atualizado_em timestamptz NOT NULL DEFAULT now(),
+        PRIMARY KEY (execucao, numero_controle_pncp)
+    )
+"""
+
+# Filtro aplicado sobre a lista de trabalho (alias w) para pular o que já foi feito
+SQL_FILTRO_RETOMADA = f"""
+    SELECT w.*
+    FROM ({{query}}) w
+    LEFT JOIN {TABELA_CHECKPOINT} c
+           ON c.execucao = %(execucao)s
+          AND c.numero_controle_pncp = w.numero_controle_pncp
+    WHERE c.numero_controle_pncp IS NULL
+       OR c.status = 'pendente'
+       OR (c.status = 'falhou' AND c.tentativas < %(max_tentativas)s)
+       OR (c.status = 'em_andamento'
+           AND c.atualizado_em < now() - make_interval(mins => %(lease_minutos)s))
+"""
+
+
+def garantir_tabela_checkpoint(cursor):
+    cursor.execute(SQL_CRIAR_CHECKPOINT)
+
+
+def nova_execucao():
+    return datetime.now().strftime("manual-%Y%m%dT%H%M%S")
+
+
+# 🔹 Execução mais recente registrada (para --resume sem identificador)
+def ultima_execucao(cursor):
+    cursor.execute(
+        f"""
+        SELECT execucao FROM {TABELA_CHECKPOINT}
+        GROUP BY execucao
+        ORDER BY max(atualizado_em) DESC
+        LIMIT 1
+        """
+    )
+    linha = cursor.fetchone()
+    return linha[0] if linha else None
+
+
+# 🔹 Envolve a query da lista de trabalho para pular compras concluídas ou com lease ativo
+def filtrar_retomada(query, parametros, execucao):
+    parametros = dict(parametros or {})
+    parametros.update(
+        {
+            "execucao": execucao,
+            "max_tentativas": MAX_TENTATIVAS,
+            "lease_minutos": LEASE_MINUTOS,
+        }
+    )
+    return SQL_FILTRO_RETOMADA.format(query=query), parametros
+
+
+# 🔹 Repassa as compras da lista de trabalho, marcando-as em_andamento em blocos
+# (uma transação curta por bloco, para o lease valer entre workers)
+def reservar_compras(pool, compras, execucao, tamanho_bloco=TAMANHO_BLOCO):
+    bloco = []
+    for compra in compras:
+        bloco.append(compra)
+        if len(bloco) >= tamanho_bloco:
+            _marcar_em_andamento(pool, execucao, bloco)
+            yield from bloco
+            bloco = []
+    if bloco:
+        _marcar_em_andamento(pool, execucao, bloco)
+        yield from bloco
+
+
+def _marcar_em_andamento(pool, execucao, compras):
+    with pool.conexao() as conexao:
+        cursor = conexao.cursor()
+        execute_values(
+            cursor,
+            f"""
+            INSERT INTO {TABELA_CHECKPOINT}
+                (execucao, numero_controle_pncp, status, tentativas, atualizado_em)
+            VALUES %s
+            ON CONFLICT (execucao, numero_controle_pncp) DO UPDATE
+               SET status = 'em_andamento',
+                   tentativas = {TABELA_CHECKPOINT}.tentativas + 1,
+                   atualizado_em = now()
+            """,
+            [(execucao, compra[0]) for compra in compras],
+            template="(%s, %s, 'em_andamento', 1, now())",
+        )
+        conexao.commit()
+        cursor.close()
+
+
+# 🔹 Marca o resultado das compras de um lote. Não faz commit: vai na transação dos itens.
+# concluidas: iterável de numero_controle_pncp; falhas: {numero_controle_pncp: erro}
+def registrar_resultado(cursor, execucao, concluidas=(), falhas=None):
+    linhas = [(execucao, controle, "concluida", None) for controle in concluidas]
+    linhas += [
+        (execucao, controle, "falhou", erro) for controle, erro in (falhas or {}).items()
+    ]
+    if not linhas:
+        return
+    execute_values(
+        cursor,
+        f"""
+        INSERT INTO {TABELA_CHECKPOINT}
+            (execucao, numero_controle_pncp, status, ultimo_erro, tentativas)
+        VALUES %s
+        ON CONFLICT (execucao, numero_controle_pncp) DO UPDATE
+           SET status = EXCLUDED.status,
+               ultimo_erro = EXCLUDED.ultimo_erro,
+               atualizado_em = now()
+        """,
+        linhas,
+        template="(%s, %s, %s, %s, 1)",
+    )
+
+
+# 🔹 Devolve à fila as compras reservadas e não processadas (ex.: coleta cancelada),
+# para um resume imediato não ter de esperar o lease. Retorna quantas foram liberadas.
+def liberar_compras(pool, execucao):
+    with pool.conexao() as conexao:
+        cursor = conexao.cursor()
+        cursor.execute(
+            f"""
+            UPDATE {TABELA_CHECKPOINT}
+               SET status = 'pendente',
+                   tentativas = greatest(tentativas - 1, 0),
+                   atualizado_em = now()
+             WHERE execucao = %s AND status = 'em_andamento'
+            """,
+            (execucao,),
+        )
+        liberadas = cursor.rowcount
+        conexao.commit()
+        cursor.close()
+    return liberadas
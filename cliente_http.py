@@ -0,0 +1,175 @@
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache_http import obter_cache
+from metricas import RESPOSTAS_CACHE, observar_http
+
+# Configuração do cliente HTTP (variáveis de ambiente)
+TAMANHO_POOL = int(os.getenv("PNCP_HTTP_POOL", "32"))
+TIMEOUT = float(os.getenv("PNCP_HTTP_TIMEOUT", "30"))
+MAX_TENTATIVAS = int(os.getenv("PNCP_HTTP_TENTATIVAS", "5"))
+BACKOFF_BASE = float(os.getenv("PNCP_HTTP_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("PNCP_HTTP_BACKOFF_MAX", "30"))
+TAXA_REQUISICOES = float(os.getenv("PNCP_TAXA_REQUISICOES", "20"))  # por segundo
+RAJADA = int(os.getenv("PNCP_RAJADA", "40"))
+
+# Status que valem nova tentativa (throttling e falhas temporárias do servidor)
+STATUS_RETENTAVEIS = {429, 500, 502, 503, 504}
+
+
+class ErroRequisicaoPNCP(Exception):
+    pass
+
+
+# 🔹 Limitador token-bucket: `taxa` fichas por segundo, acumulando até `capacidade`
+class BaldeTokens:
+    def __init__(self, taxa, capacidade):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self._fichas = capacidade
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def adquirir(self):
+        if self.taxa <= 0:
+            return
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._fichas = min(
+                    self.capacidade, self._fichas + (agora - self._ultimo) * self.taxa
+                )
+                self._ultimo = agora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                espera = (1 - self._fichas) / self.taxa
+            time.sleep(espera)
+
+
+_sessao = None
+_lock_sessao = threading.Lock()
+limitador = BaldeTokens(TAXA_REQUISICOES, RAJADA)
+_observadores = [observar_http]
+
+
+# 🔹 Registra uma função observador(latencia, status) chamada a cada tentativa HTTP
+# (status None em timeout/erro de conexão). Respostas do cache não são observadas.
+def adicionar_observador(observador):
+    _observadores.append(observador)
+
+
+def remover_observador(observador):
+    if observador in _observadores:
+        _observadores.remove(observador)
+
+
+def _notificar(latencia, status):
+    for observador in list(_observadores):
+        observador(latencia, status)
+
+
+# 🔹 Sessão compartilhada com pool de conexões keep-alive
+def obter_sessao():
+    global _sessao
+    if _sessao is None:
+        with _lock_sessao:
+            if _sessao is None:
+                sessao = requests.Session()
+                adaptador = HTTPAdapter(
+                    pool_connections=TAMANHO_POOL, pool_maxsize=TAMANHO_POOL
+                )
+                sessao.mount("https://", adaptador)
+                sessao.mount("http://", adaptador)
+                _sessao = sessao
+    return _sessao
+
+
+# 🔹 Tempo de espera indicado pelo cabeçalho Retry-After (segundos ou data HTTP)
+def _espera_retry_after(response):
+    valor = response.headers.get("Retry-After")
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        data = parsedate_to_datetime(valor)
+        return max(0.0, (data - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+# 🔹 Backoff exponencial com jitter completo
+def _espera_backoff(tentativa):
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**tentativa))
+
+
+# 🔹 GET com cache local de respostas (ver cache_http): entradas frescas não vão à rede,
+# as vencidas são revalidadas com If-None-Match / If-Modified-Since
+def requisitar(url, params=None, headers=None):
+    cache = obter_cache()
+    if cache is None:
+        return requisitar_rede(url, params, headers)
+
+    chave = cache.chave(url, params)
+    entrada = cache.buscar(chave)
+    if entrada is not None and (entrada.fresca or cache.somente_cache):
+        RESPOSTAS_CACHE.inc(resultado="hit")
+        return entrada.resposta()
+    if cache.somente_cache:
+        RESPOSTAS_CACHE.inc(resultado="ausente")
+        raise ErroRequisicaoPNCP(f"{chave} não está no cache (modo somente_cache)")
+
+    cabecalhos = dict(headers or {})
+    if entrada is not None:
+        cabecalhos.update(entrada.validadores())
+    response = requisitar_rede(url, params, cabecalhos)
+
+    if response.status_code == 304 and entrada is not None:
+        RESPOSTAS_CACHE.inc(resultado="revalidado")
+        cache.renovar(chave)
+        return entrada.resposta()
+    RESPOSTAS_CACHE.inc(resultado="miss")
+    cache.guardar(chave, response)
+    return response
+
+
+# 🔹 GET com limitador de taxa e novas tentativas para falhas temporárias
+def requisitar_rede(url, params=None, headers=None):
+    sessao = obter_sessao()
+    ultimo_erro = None
+
+    for tentativa in range(MAX_TENTATIVAS):
+        limitador.adquirir()
+        inicio = time.monotonic()
+        try:
+            response = sessao.get(url, params=params, headers=headers, timeout=TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            _notificar(time.monotonic() - inicio, None)
+            ultimo_erro = e
+            time.sleep(_espera_backoff(tentativa))
+            continue
+        _notificar(time.monotonic() - inicio, response.status_code)
+
+        if response.status_code not in STATUS_RETENTAVEIS:
+            return response
+
+        ultimo_erro = ErroRequisicaoPNCP(f"HTTP {response.status_code} em {url}")
+        if tentativa + 1 < MAX_TENTATIVAS:
+            espera = _espera_retry_after(response)
+            if espera is None:
+                espera = _espera_backoff(tentativa)
+            time.sleep(min(espera, BACKOFF_MAX))
+
+    raise ErroRequisicaoPNCP(
+        f"Falha após {MAX_TENTATIVAS} tentativas: {ultimo_erro}"
+    ) from ultimo_erro
@@ -0,0 +1,302 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from cliente_http import (
+    ErroRequisicaoPNCP,
+    adicionar_observador,
+    remover_observador,
+    requisitar,
+)
+from concorrencia_adaptativa import (
+    MODO_CONCORRENCIA,
+    ControladorAIMD,
+    SemaforoAdaptativo,
+)
+
+# API URL e Headers
+# PNCP_BASE_URL aponta a coleta para outro servidor (ex.: o falso de bench/servidor_pncp.py)
+BASE_URL_PNCP = os.getenv("PNCP_BASE_URL", "https://pncp.gov.br/api/pncp/v1").rstrip("/")
+BASE_URL_CONTRATACAO_ITENS = f"{BASE_URL_PNCP}/orgaos"
+HEADERS = {"accept": "application/json"}
+
+# Limites de concorrência (configuráveis por variável de ambiente)
+# Com PNCP_CONCORRENCIA=adaptativa, o global é o teto do controle AIMD
+LIMITE_GLOBAL = int(os.getenv("PNCP_LIMITE_GLOBAL", "32"))
+LIMITE_POR_HOST = int(os.getenv("PNCP_LIMITE_POR_HOST", "16"))
+LIMITE_COMPRAS = int(os.getenv("PNCP_LIMITE_COMPRAS", "8"))
+
+# Modo de listagem dos itens: "paginado" (coleção /itens) ou "item" (um número por vez)
+MODO_ITENS = os.getenv("PNCP_MODO_ITENS", "paginado")
+TAMANHO_PAGINA = int(os.getenv("PNCP_TAMANHO_PAGINA", "500"))
+
+
+# 🔹 Saída padrão das mensagens do coletor (nivel: debug, info, sucesso, aviso, erro)
+def registrar_print(nivel, mensagem):
+    print(mensagem)
+
+
+# 🔹 Monta a URL de um item específico da compra
+def url_item(cnpj, ano, sequencial, numero_item):
+    return f"{BASE_URL_CONTRATACAO_ITENS}/{cnpj}/compras/{ano}/{sequencial}/itens/{numero_item}"
+
+
+# 🔹 Monta a URL da coleção de itens da compra (usada com pagina/tamanhoPagina)
+def url_itens(cnpj, ano, sequencial):
+    return f"{BASE_URL_CONTRATACAO_ITENS}/{cnpj}/compras/{ano}/{sequencial}/itens"
+
+
+# 🔹 Requisição bloqueante (sessão compartilhada, com retry), executada numa thread do pool
+def _requisitar(url, params=None):
+    response = requisitar(url, params=params, headers=HEADERS)
+    if response.status_code == 200:
+        return response.status_code, response.json()
+    return response.status_code, None
+
+
+# 🔹 Motor assíncrono de coleta: várias compras e vários itens em voo ao mesmo tempo
+class ColetorAsync:
+    def __init__(
+        self,
+        limite_global=LIMITE_GLOBAL,
+        limite_por_host=LIMITE_POR_HOST,
+        limite_compras=LIMITE_COMPRAS,
+        modo_itens=MODO_ITENS,
+        tamanho_pagina=TAMANHO_PAGINA,
+        registrar=registrar_print,
+        concorrencia=MODO_CONCORRENCIA,
+    ):
+        self.modo_itens = modo_itens
+        self.tamanho_pagina = tamanho_pagina
+        self._maior_pagina = 0  # maior página já devolvida pela API (o limite dela é ≥ isso)
+        self.limite_global = limite_global
+        self.limite_por_host = limite_por_host
+        self.limite_compras = limite_compras
+        self.registrar = registrar
+        self._executor = ThreadPoolExecutor(
+            max_workers=limite_global, thread_name_prefix="pncp-http"
+        )
+        self._loop = None
+        self._semaforo_global = None
+        self._semaforos_host = {}
+
+        # Limite de requisições em voo ajustado pela latência e pelos erros (AIMD).
+        # O teto é o menor dos dois limites: toda requisição também passa pelo semáforo
+        # do host (e a API é um host só), então acima de limite_por_host o controlador
+        # subiria e cortaria um limite que nunca chega a valer.
+        self.controlador = None
+        if concorrencia == "adaptativa":
+            self.controlador = ControladorAIMD(
+                maximo=min(limite_global, limite_por_host),
+                registrar=lambda nivel, mensagem: self.registrar(nivel, mensagem),
+            )
+            adicionar_observador(self.controlador.observar)
+
+    # 🔹 Solta o que o coletor registrou fora dele: o observador do controle AIMD
+    # (senão continua recebendo todo o tráfego HTTP do processo) e as threads HTTP
+    def fechar(self):
+        if self.controlador is not None:
+            remover_observador(self.controlador.observar)
+        self._executor.shutdown(wait=True)
+
+    # Os semáforos pertencem ao event loop em execução; recria se o loop mudou
+    def _preparar_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            if self.controlador is not None:
+                self._semaforo_global = SemaforoAdaptativo(self.controlador)
+            else:
+                self._semaforo_global = asyncio.Semaphore(self.limite_global)
+            self._semaforos_host = {}
+        return loop
+
+    def _semaforo_host(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._semaforos_host:
+            self._semaforos_host[host] = asyncio.Semaphore(self.limite_por_host)
+        return self._semaforos_host[host]
+
+    async def _get(self, url, params=None):
+        loop = self._preparar_loop()
+        async with self._semaforo_global, self._semaforo_host(url):
+            return await loop.run_in_executor(
+                self._executor, _requisitar, url, params
+            )
+
+    # 🔹 Busca os itens de uma compra; no modo paginado, cai para o item a item se a coleção falhar
+    async def buscar_itens(self, cnpj, ano, sequencial):
+        if self.modo_itens == "paginado":
+            itens = await self.buscar_itens_paginado(cnpj, ano, sequencial)
+            if itens is not None:
+                return itens
+            self.registrar(
+                "aviso",
+                f"⚠ Listagem paginada falhou para CNPJ {cnpj} - Sequencial {sequencial}. Buscando item a item.",
+            )
+        return await self.buscar_itens_por_numero(cnpj, ano, sequencial)
+
+    # 🔹 Busca os itens pela coleção paginada; retorna None se alguma página falhar
+    # Uma página curta pode ser o limite de tamanho da API, não o fim da compra. Ela só
+    # encerra a compra se for menor que a maior página que a API já devolveu (então não
+    # foi cortada pelo limite); senão, o fim é confirmado pelo 404 do item seguinte. Se
+    # o item existe, a API limita o tamanho: ele passa a ser o da página curta.
+    async def buscar_itens_paginado(self, cnpj, ano, sequencial):
+        itens_coletados = []
+        pagina = 1
+        tamanho = self.tamanho_pagina
+
+        while True:
+            try:
+                status, itens = await self._get(
+                    url_itens(cnpj, ano, sequencial),
+                    {"pagina": pagina, "tamanhoPagina": tamanho},
+                )
+            except ErroRequisicaoPNCP as e:
+                self.registrar("erro", f"Erro na requisição da página {pagina}: {e}")
+                return None
+
+            if status == 204 or (status == 200 and not itens):
+                break
+            if status != 200 or not isinstance(itens, list):
+                self.registrar(
+                    "erro", f"Erro na requisição da página {pagina}: {status}"
+                )
+                return None
+
+            itens_coletados.extend(itens)
+            self.registrar(
+                "debug",
+                f"Página {pagina}: {len(itens)} itens coletados para CNPJ {cnpj} - Sequencial {sequencial}",
+            )
+            curta = len(itens) < tamanho
+            if curta and len(itens) < self._maior_pagina:
+                break
+            self._maior_pagina = max(self._maior_pagina, len(itens))
+            if not curta:
+                pagina += 1
+                continue
+
+            try:
+                status, _ = await self._get(
+                    url_item(cnpj, ano, sequencial, len(itens_coletados) + 1)
+                )
+            except ErroRequisicaoPNCP as e:
+                self.registrar("erro", f"Erro ao confirmar o fim da listagem: {e}")
+                return None
+            if status == 404:
+                break
+            if status != 200 or pagina > 1:
+                self.registrar(
+                    "erro", f"Não foi possível confirmar o fim da listagem: {status}"
+                )
+                return None
+            self.registrar(
+                "aviso",
+                f"⚠ A API limita tamanhoPagina a {len(itens)} (pedido: {tamanho}). "
+                "Usando esse tamanho.",
+            )
+            tamanho = len(itens)
+            self.tamanho_pagina = min(self.tamanho_pagina, tamanho)
+            pagina += 1
+
+        return itens_coletados
+
+    # 🔹 Busca os itens um número por vez, em janelas crescentes (2, 4, 8... até o limite por host)
+    # Um erro que persiste após as novas tentativas levanta ErroRequisicaoPNCP,
+    # para a compra não ser tratada como completa com a lista truncada.
+    async def buscar_itens_por_numero(self, cnpj, ano, sequencial):
+        itens_coletados = []
+        numero_item = 1
+        tamanho_janela = 2
+
+        while True:
+            janela = range(numero_item, numero_item + tamanho_janela)
+            respostas = await asyncio.gather(
+                *(self._get(url_item(cnpj, ano, sequencial, n)) for n in janela)
+            )
+
+            for n, (status, item) in zip(janela, respostas):
+                if status == 200:
+                    itens_coletados.append(item)
+                    self.registrar(
+                        "debug",
+                        f"Item {n} coletado para CNPJ {cnpj} - Sequencial {sequencial}",
+                    )
+                elif status == 404:
+                    self.registrar(
+                        "aviso",
+                        f"Item {n} não encontrado. Fim dos itens para este sequencial.",
+                    )
+                    return itens_coletados
+                else:
+                    raise ErroRequisicaoPNCP(f"Erro na requisição {n}: {status}")
+
+            numero_item += tamanho_janela
+            tamanho_janela = min(tamanho_janela * 2, self.limite_por_host)
+
+    # 🔹 Coleta várias compras em paralelo, devolvendo cada uma assim que termina
+    # compras: iterável de (numero_controle_pncp, cnpj, sequencial, ano)
+    # Devolve (compra, itens, erro); se a coleta falhou, itens = None e erro traz o motivo.
+    async def coletar_compras(self, compras):
+        compras = iter(compras)
+        pendentes = {}
+
+        try:
+            while True:
+                while len(pendentes) < self.limite_compras:
+                    compra = next(compras, None)
+                    if compra is None:
+                        break
+                    _, cnpj, sequencial, ano = compra
+                    self.registrar(
+                        "info",
+                        f"🔄 Buscando itens para CNPJ: {cnpj}, Ano: {ano}, Sequencial: {sequencial}",
+                    )
+                    tarefa = asyncio.ensure_future(
+                        self.buscar_itens(cnpj, ano, sequencial)
+                    )
+                    pendentes[tarefa] = compra
+
+                if not pendentes:
+                    return
+
+                concluidas, _ = await asyncio.wait(
+                    pendentes, return_when=asyncio.FIRST_COMPLETED
+                )
+                for tarefa in concluidas:
+                    compra = pendentes.pop(tarefa)
+                    itens, erro = None, None
+                    try:
+                        itens = tarefa.result()
+                    except Exception as e:
+                        erro = str(e)
+                        self.registrar(
+                            "erro",
+                            f"Erro ao buscar itens para CNPJ {compra[1]} - Sequencial {compra[2]}: {e}",
+                        )
+                    yield compra, itens, erro
+        finally:
+            for tarefa in pendentes:
+                tarefa.cancel()
+            if pendentes:
+                await asyncio.gather(*pendentes, return_exceptions=True)
+
+    # 🔹 Versão síncrona de coletar_compras, para quem consome num laço for comum
+    def iterar_compras(self, compras):
+        loop = asyncio.new_event_loop()
+        gerador = self.coletar_compras(compras)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(gerador.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            loop.run_until_complete(gerador.aclose())
+            loop.close()
+
+    # 🔹 Versão síncrona de buscar_itens
+    def buscar_itens_sync(self, cnpj, ano, sequencial):
+        return asyncio.run(self.buscar_itens(cnpj, ano, sequencial))
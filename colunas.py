@@ -0,0 +1,200 @@
+import json
+from datetime import date, datetime
+
+# 🔹 Especificação das colunas de contratacao_itens_pncp: (chave no JSON, coluna no banco, tipo)
+# Tipos: texto, inteiro, decimal, booleano, data. É a única lista de colunas do projeto.
+ESPECIFICACAO = [
+    ("numero_controle_pncp", "numero_controle_pncp", "texto"),
+    ("orgao_cnpj", "orgao_cnpj", "texto"),
+    ("sequencial_compra", "sequencial_compra", "texto"),
+    ("numeroItem", "numeroitem", "inteiro"),
+    ("descricao", "descricao", "texto"),
+    ("materialOuServico", "materialouservico", "texto"),
+    ("materialOuServicoNome", "materialouserviconome", "texto"),
+    ("valorUnitarioEstimado", "valorunitarioestimado", "decimal"),
+    ("valorTotal", "valortotal", "decimal"),
+    ("quantidade", "quantidade", "decimal"),
+    ("unidadeMedida", "unidademedida", "texto"),
+    ("orcamentoSigiloso", "orcamentosigiloso", "booleano"),
+    ("itemCategoriaId", "itemcategoriaid", "inteiro"),
+    ("itemCategoriaNome", "itemcategorianome", "texto"),
+    ("patrimonio", "patrimonio", "texto"),
+    ("codigoRegistroImobiliario", "codigoregistroimobiliario", "texto"),
+    ("criterioJulgamentoId", "criteriojulgamentoid", "inteiro"),
+    ("criterioJulgamentoNome", "criteriojulgamentonome", "texto"),
+    ("situacaoCompraItem", "situacaocompraitem", "inteiro"),
+    ("situacaoCompraItemNome", "situacaocompraitemnome", "texto"),
+    ("tipoBeneficio", "tipobeneficio", "inteiro"),
+    ("tipoBeneficioNome", "tipobeneficionome", "texto"),
+    ("incentivoProdutivoBasico", "incentivoprodutivobasico", "booleano"),
+    ("dataInclusao", "datainclusao", "data"),
+    ("dataAtualizacao", "dataatualizacao", "data"),
+    ("temResultado", "temresultado", "booleano"),
+    ("imagem", "imagem", "inteiro"),
+    (
+        "aplicabilidadeMargemPreferenciaNormal",
+        "aplicabilidademargempreferencianormal",
+        "booleano",
+    ),
+    (
+        "aplicabilidadeMargemPreferenciaAdicional",
+        "aplicabilidademargempreferenciaadicional",
+        "booleano",
+    ),
+    (
+        "percentualMargemPreferenciaNormal",
+        "percentualmargempreferencianormal",
+        "decimal",
+    ),
+    (
+        "percentualMargemPreferenciaAdicional",
+        "percentualmargempreferenciaadicional",
+        "decimal",
+    ),
+    ("ncmNbsCodigo", "ncmnbscodigo", "texto"),
+    ("ncmNbsDescricao", "ncmnbsdescricao", "texto"),
+    ("catalogo", "catalogo", "texto"),
+    ("categoriaItemCatalogo", "categoriaitemcatalogo", "texto"),
+    ("catalogoCodigoItem", "catalogocodigoitem", "texto"),
+    ("informacaoComplementar", "informacaocomplementar", "texto"),
+]
+
+CHAVES_JSON = [chave for chave, _, _ in ESPECIFICACAO]
+COLUNAS_DESTINO = [coluna for _, coluna, _ in ESPECIFICACAO]
+
+VALORES_VERDADEIROS = {"true", "t", "1", "s", "sim"}
+VALORES_FALSOS = {"false", "f", "0", "n", "nao", "não"}
+
+
+# 🔹 Conversores por tipo. Um valor que não converte segue como veio, para o banco
+# recusá-lo e a linha ir para a fila de falhas (ver carga_bulk e fila_falhas).
+def _texto(valor):
+    if valor is None or isinstance(valor, str):
+        return valor
+    if isinstance(valor, (dict, list)):
+        return json.dumps(valor, ensure_ascii=False)
+    return str(valor)
+
+
+def _inteiro(valor):
+    if isinstance(valor, bool):
+        return int(valor)
+    if valor is None or isinstance(valor, int):
+        return valor
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    if isinstance(valor, str):
+        valor = valor.strip()
+        if not valor:
+            return None
+        try:
+            return int(valor)
+        except ValueError:
+            return valor
+    return valor
+
+
+def _decimal(valor):
+    if isinstance(valor, str):
+        return valor.strip() or None
+    return valor
+
+
+def _booleano(valor):
+    if valor is None or isinstance(valor, bool):
+        return valor
+    if isinstance(valor, int):
+        return valor != 0
+    if isinstance(valor, str):
+        normalizado = valor.strip().lower()
+        if not normalizado:
+            return None
+        if normalizado in VALORES_VERDADEIROS:
+            return True
+        if normalizado in VALORES_FALSOS:
+            return False
+    return valor
+
+
+def _data(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, str):
+        return valor.strip() or None
+    return valor
+
+
+CONVERSORES = {
+    "texto": _texto,
+    "inteiro": _inteiro,
+    "decimal": _decimal,
+    "booleano": _booleano,
+    "data": _data,
+}
+
+
+# 🔹 Valor convertido no formato texto do COPY (\N para nulo, com escapes)
+def _copy(valor):
+    if valor is None:
+        return r"\N"
+    if isinstance(valor, bool):
+        return "t" if valor else "f"
+    if isinstance(valor, str):
+        return (
+            valor.replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r")
+        )
+    return str(valor)
+
+
+# 🔹 Extratores gerados para uma especificação: código desenrolado, uma expressão por
+# coluna, sem laço nem busca de conversor por linha
+class Extrator:
+    def __init__(self, especificacao):
+        self.especificacao = list(especificacao)
+        self.chaves = [chave for chave, _, _ in self.especificacao]
+        self.colunas = [coluna for _, coluna, _ in self.especificacao]
+
+        ambiente = {"_copy": _copy}
+        valores = []
+        for i, (chave, _, tipo) in enumerate(self.especificacao):
+            ambiente[f"_c{i}"] = CONVERSORES[tipo]
+            valores.append(f"_c{i}(get({chave!r}))")
+
+        listas = ", ".join(f"l{i}" for i in range(len(valores)))
+        codigo = "\n".join(
+            [
+                "def tupla(registro):",
+                "    get = registro.get",
+                f"    return ({', '.join(valores)},)",
+                "",
+                "def linha_copy(registro):",
+                "    get = registro.get",
+                "    return '\\t'.join((",
+                *[f"        _copy({valor})," for valor in valores],
+                "    )) + '\\n'",
+                "",
+                "def em_colunas(registros):",
+                *[f"    l{i} = []" for i in range(len(valores))],
+                "    for registro in registros:",
+                "        get = registro.get",
+                *[f"        l{i}.append({valor})" for i, valor in enumerate(valores)],
+                f"    return [{listas}]",
+            ]
+        )
+        exec(compile(codigo, "<extrator de colunas>", "exec"), ambiente)
+
+        # Tupla de valores convertidos, na ordem das colunas (parâmetros de INSERT)
+        self.tupla = ambiente["tupla"]
+        # Linha no formato texto do COPY, com o "\n" final
+        self.linha_copy = ambiente["linha_copy"]
+        self._em_colunas = ambiente["em_colunas"]
+
+    # Lote inteiro coluna a coluna: {coluna: [valores]} (para Arrow/Parquet)
+    def em_colunas(self, registros):
+        return dict(zip(self.colunas, self._em_colunas(registros)))
+
+
+EXTRATOR = Extrator(ESPECIFICACAO)
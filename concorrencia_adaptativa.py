@@ -0,0 +1,189 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+
+from metricas import REGISTRO
+
+# Configuração do controle adaptativo (variáveis de ambiente)
+# PNCP_CONCORRENCIA: "adaptativa" (padrão) ou "fixa" (usa só PNCP_LIMITE_GLOBAL)
+MODO_CONCORRENCIA = os.getenv("PNCP_CONCORRENCIA", "adaptativa")
+LIMITE_MINIMO = int(os.getenv("PNCP_LIMITE_MINIMO", "2"))
+LIMITE_INICIAL = int(os.getenv("PNCP_LIMITE_INICIAL", "8"))
+P95_ALVO = float(os.getenv("PNCP_AIMD_P95_ALVO", "2.0"))  # segundos
+TAXA_ERRO_MAXIMA = float(os.getenv("PNCP_AIMD_TAXA_ERRO", "0.05"))
+FATOR_REDUCAO = float(os.getenv("PNCP_AIMD_FATOR_REDUCAO", "0.5"))
+# Depois de uma redução, novas reduções esperam este intervalo (uma rajada de 429 conta uma vez)
+INTERVALO_REDUCAO = float(os.getenv("PNCP_AIMD_INTERVALO_REDUCAO", "2.0"))
+# Depois de uma redução, o limite não sobe durante este intervalo (segundos)
+ESPERA_AUMENTO = float(os.getenv("PNCP_AIMD_ESPERA_AUMENTO", "10.0"))
+
+# Respostas que indicam sobrecarga do servidor: reduzem o limite na hora
+STATUS_SOBRECARGA = {429, 503}
+STATUS_ERRO = {429, 500, 502, 503, 504}
+
+AJUSTES = REGISTRO.contador(
+    "pncp_concorrencia_ajustes", "Mudanças do limite de concorrência, por direção e causa"
+)
+
+
+def _p95(latencias):
+    ordenadas = sorted(latencias)
+    return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.95))]
+
+
+# 🔹 Controle AIMD do número de requisições em voo
+# Aumento aditivo (+1) a cada janela saudável (p95 e taxa de erros dentro do alvo);
+# redução multiplicativa em 429/503/timeout ou quando a janela sai do alvo.
+# Uma janela tem tantas respostas quanto o limite atual (~ uma "volta" de requisições);
+# sobrecarga e timeout também contam como erro na janela. Depois de uma redução, o
+# limite não sobe por espera_aumento segundos.
+# observar() é chamado pelas threads HTTP (ver cliente_http.adicionar_observador).
+class ControladorAIMD:
+    def __init__(
+        self,
+        minimo=LIMITE_MINIMO,
+        maximo=32,
+        inicial=LIMITE_INICIAL,
+        p95_alvo=P95_ALVO,
+        taxa_erro_maxima=TAXA_ERRO_MAXIMA,
+        fator_reducao=FATOR_REDUCAO,
+        intervalo_reducao=INTERVALO_REDUCAO,
+        espera_aumento=ESPERA_AUMENTO,
+        registrar=None,
+    ):
+        self.minimo = max(1, minimo)
+        self.maximo = max(self.minimo, maximo)
+        self.limite = min(self.maximo, max(self.minimo, inicial))
+        self.p95_alvo = p95_alvo
+        self.taxa_erro_maxima = taxa_erro_maxima
+        self.fator_reducao = fator_reducao
+        self.intervalo_reducao = intervalo_reducao
+        self.espera_aumento = espera_aumento
+        self.registrar = registrar
+
+        # Métricas: limite atual, motivo da última mudança e histórico das mudanças
+        self.motivo = "inicial"
+        self.aumentos = 0
+        self.reducoes = 0
+        self.ultimo_p95 = None
+        self.ultima_taxa_erro = None
+        self.historico = deque(maxlen=200)  # (timestamp, limite, motivo)
+        self.historico.append((time.time(), self.limite, self.motivo))
+
+        self._latencias = []
+        self._erros = 0
+        self._ultima_reducao = None
+        self._lock = threading.Lock()
+
+        REGISTRO.medidor(
+            "pncp_concorrencia_limite",
+            "Limite atual de requisições em voo (AIMD)",
+            funcao=lambda: self.limite,
+        )
+
+    # 🔹 Registra uma tentativa HTTP: latência em segundos e status (None = timeout/conexão)
+    def observar(self, latencia, status):
+        with self._lock:
+            self._latencias.append(latencia)
+            if status is None or status in STATUS_ERRO:
+                self._erros += 1
+            # Sobrecarga e timeout reduzem na hora (fora do intervalo entre reduções);
+            # dentro dele, ficam na janela como erro
+            if status is None and self._reduzir("timeout", "timeout/conexão"):
+                return
+            if status in STATUS_SOBRECARGA and self._reduzir(
+                "sobrecarga", f"HTTP {status}"
+            ):
+                return
+            if len(self._latencias) < self.limite:
+                return
+
+            p95 = _p95(self._latencias)
+            taxa_erro = self._erros / len(self._latencias)
+            self.ultimo_p95 = p95
+            self.ultima_taxa_erro = taxa_erro
+            self._latencias = []
+            self._erros = 0
+
+            if p95 > self.p95_alvo:
+                self._reduzir(
+                    "latencia", f"p95 {p95:.2f}s acima do alvo {self.p95_alvo:.2f}s"
+                )
+            elif taxa_erro > self.taxa_erro_maxima:
+                self._reduzir("erros", f"taxa de erros {taxa_erro:.1%}")
+            elif self.limite < self.maximo and not self._em_espera():
+                self._mudar(
+                    self.limite + 1,
+                    "saudavel",
+                    f"p95 {p95:.2f}s, erros {taxa_erro:.1%}",
+                )
+                self.aumentos += 1
+
+    def _em_espera(self):
+        return (
+            self._ultima_reducao is not None
+            and time.monotonic() - self._ultima_reducao < self.espera_aumento
+        )
+
+    # Retorna False se ainda está no intervalo desde a última redução (nada muda)
+    def _reduzir(self, causa, detalhe):
+        agora = time.monotonic()
+        if (
+            self._ultima_reducao is not None
+            and agora - self._ultima_reducao < self.intervalo_reducao
+        ):
+            return False
+        self._ultima_reducao = agora
+        self._latencias = []
+        self._erros = 0
+        novo = max(self.minimo, int(self.limite * self.fator_reducao))
+        if novo < self.limite:
+            self._mudar(novo, causa, detalhe)
+            self.reducoes += 1
+        return True
+
+    # causa: categoria curta (rótulo da métrica); detalhe: valores que motivaram a mudança
+    def _mudar(self, novo, causa, detalhe):
+        motivo = f"{causa}: {detalhe}"
+        anterior, self.limite, self.motivo = self.limite, novo, motivo
+        self.historico.append((time.time(), novo, motivo))
+        AJUSTES.inc(direcao="aumento" if novo > anterior else "reducao", causa=causa)
+        if self.registrar:
+            self.registrar(
+                "debug", f"🔧 Concorrência {anterior} → {novo} ({motivo})"
+            )
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "limite": self.limite,
+                "motivo": self.motivo,
+                "aumentos": self.aumentos,
+                "reducoes": self.reducoes,
+                "p95": self.ultimo_p95,
+                "taxa_erro": self.ultima_taxa_erro,
+            }
+
+
+# 🔹 Semáforo asyncio cuja capacidade é o limite atual do controlador
+# A capacidade é relida a cada aquisição; como o limite só muda quando chega uma
+# resposta (seguida de uma liberação), não é preciso acordar ninguém de outra thread.
+class SemaforoAdaptativo:
+    def __init__(self, controlador):
+        self.controlador = controlador
+        self.em_voo = 0
+        self._condicao = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condicao:
+            await self._condicao.wait_for(
+                lambda: self.em_voo < self.controlador.limite
+            )
+            self.em_voo += 1
+
+    async def __aexit__(self, *excecao):
+        async with self._condicao:
+            self.em_voo -= 1
+            self._condicao.notify_all()
@@ -0,0 +1,82 @@
+import importlib.util
+import os
+import threading
+
+# Origem da configuração do banco (variável de ambiente)
+# PNCP_CONFIG: "auto" (padrão: Variables do Airflow se o Airflow estiver instalado,
+# senão ambiente), "airflow" ou "ambiente" (DB_NAME, DB_USER, DB_HOST, DB_PASSWORD,
+# DB_PORT, DB_SCHEMA, também lidas de um .env)
+ORIGEM_CONFIG = os.getenv("PNCP_CONFIG", "auto")
+
+
+# 🔹 Configuração de conexão com o banco
+class Configuracao:
+    def __init__(self, database, user, host, password, port, schema=None, origem=None):
+        self.database = database
+        self.user = user
+        self.host = host
+        self.password = password
+        self.port = port
+        self.schema = schema
+        self.origem = origem
+
+    # Argumentos de psycopg2.connect
+    def parametros_conexao(self):
+        parametros = {
+            "database": self.database,
+            "user": self.user,
+            "host": self.host,
+            "password": self.password,
+            "port": self.port,
+        }
+        if self.schema:
+            parametros["options"] = f"-c search_path={self.schema}"
+        return parametros
+
+
+# Variables do Airflow: cada Variable.get é uma ida ao banco de metadados,
+# por isso só acontece na execução da tarefa, nunca no parse do DAG
+def _ler_airflow():
+    from airflow.models import Variable
+
+    return Configuracao(
+        database=Variable.get("database"),
+        user=Variable.get("user"),
+        host=Variable.get("host"),
+        password=Variable.get("password"),
+        port=Variable.get("port"),
+        origem="airflow",
+    )
+
+
+def _ler_ambiente():
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    return Configuracao(
+        database=os.getenv("DB_NAME"),
+        user=os.getenv("DB_USER"),
+        host=os.getenv("DB_HOST"),
+        password=os.getenv("DB_PASSWORD"),
+        port=os.getenv("DB_PORT"),
+        schema=os.getenv("DB_SCHEMA"),
+        origem="ambiente",
+    )
+
+
+_configuracao = None
+_lock_configuracao = threading.Lock()
+
+
+# 🔹 Configuração lida uma vez por processo, no primeiro uso
+def obter_configuracao():
+    global _configuracao
+    if _configuracao is None:
+        with _lock_configuracao:
+            if _configuracao is None:
+                origem = ORIGEM_CONFIG
+                if origem == "auto":
+                    instalado = importlib.util.find_spec("airflow") is not None
+                    origem = "airflow" if instalado else "ambiente"
+                _configuracao = _ler_airflow() if origem == "airflow" else _ler_ambiente()
+    return _configuracao
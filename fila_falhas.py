@@ -0,0 +1,227 @@
+import json
+import os
+
+from psycopg2.extras import execute_values
+
+from coletor_async import BASE_URL_CONTRATACAO_ITENS
+
+TABELA_FALHAS = "pncp.contratacao_itens_falhas"
+
+# Configuração da fila de falhas (variáveis de ambiente)
+# A primeira nova tentativa vale logo; depois a espera começa em PNCP_FALHAS_BACKOFF_MINUTOS
+# e dobra a cada falha, até PNCP_FALHAS_BACKOFF_MAX_MINUTOS. Com PNCP_FALHAS_MAX_TENTATIVAS
+# falhas, a entrada fica "desistida" e sai da fila.
+MAX_TENTATIVAS_FALHAS = int(os.getenv("PNCP_FALHAS_MAX_TENTATIVAS", "5"))
+BACKOFF_MINUTOS = float(os.getenv("PNCP_FALHAS_BACKOFF_MINUTOS", "5"))
+BACKOFF_MAX_MINUTOS = float(os.getenv("PNCP_FALHAS_BACKOFF_MAX_MINUTOS", "1440"))
+
+# tipo: compra (a coleta dos itens falhou; url é a da coleção de itens na API)
+#       linha  (o banco recusou o item; registro guarda o JSON para a nova tentativa)
+# status: pendente, resolvida, desistida
+# A chave começa por numero_controle_pncp: é por ela que uma coleta bem-sucedida resolve
+# as entradas da compra.
+SQL_CRIAR_FALHAS = f"""
+    CREATE TABLE IF NOT EXISTS {TABELA_FALHAS} (
+        numero_controle_pncp text NOT NULL,
+        tipo text NOT NULL CHECK (tipo IN ('compra', 'linha')),
+        numeroitem text NOT NULL DEFAULT '',
+        orgao_cnpj text,
+        sequencial_compra text,
+        ano_compra text,
+        url text,
+        motivo text,
+        registro jsonb,
+        status text NOT NULL DEFAULT 'pendente'
+            CHECK (status IN ('pendente', 'resolvida', 'desistida')),
+        tentativas integer NOT NULL DEFAULT 1,
+        primeira_falha timestamptz NOT NULL DEFAULT now(),
+        ultima_falha timestamptz NOT NULL DEFAULT now(),
+        proxima_tentativa timestamptz NOT NULL DEFAULT now(),
+        PRIMARY KEY (numero_controle_pncp, tipo, numeroitem)
+    )
+"""
+
+# Tentativas depois de mais uma falha: entrada resolvida volta à fila do zero
+_TENTATIVAS = f"""
+    CASE WHEN {TABELA_FALHAS}.status = 'resolvida' THEN 1
+         ELSE {TABELA_FALHAS}.tentativas + 1 END
+"""
+
+# Mais uma falha de algo que já está na fila: conta a tentativa e adia a próxima
+_SQL_NOVA_FALHA = f"""
+    ON CONFLICT (numero_controle_pncp, tipo, numeroitem) DO UPDATE
+       SET motivo = EXCLUDED.motivo,
+           registro = coalesce(EXCLUDED.registro, {TABELA_FALHAS}.registro),
+           tentativas = {_TENTATIVAS},
+           status = CASE WHEN {TABELA_FALHAS}.status <> 'resolvida'
+                          AND {_TENTATIVAS} >= %(max_tentativas)s
+                         THEN 'desistida' ELSE 'pendente' END,
+           ultima_falha = now(),
+           proxima_tentativa = CASE WHEN {TABELA_FALHAS}.status = 'resolvida' THEN now()
+               ELSE now() + make_interval(secs => 60 * least(
+                   %(backoff)s * power(2, {TABELA_FALHAS}.tentativas - 1), %(backoff_max)s
+               )) END
+"""
+
+# Compras que falharam: CNPJ, sequencial e ano vêm da lista de compras
+SQL_REGISTRAR_COMPRAS = f"""
+    INSERT INTO {TABELA_FALHAS} (
+        numero_controle_pncp, tipo, orgao_cnpj, sequencial_compra, ano_compra, url, motivo
+    )
+    SELECT f.controle, 'compra', cp.orgao_cnpj, cp.sequencial_compra::text,
+           cp.ano_compra::text,
+           %(url_base)s || '/' || cp.orgao_cnpj || '/compras/' || cp.ano_compra
+               || '/' || cp.sequencial_compra || '/itens',
+           f.motivo
+    FROM unnest(%(controles)s::text[], %(motivos)s::text[]) f (controle, motivo)
+    LEFT JOIN LATERAL (
+        SELECT orgao_cnpj, sequencial_compra, ano_compra
+        FROM pncp.contratacoes_publicas
+        WHERE numero_controle_pncp = f.controle
+        LIMIT 1
+    ) cp ON true
+    {_SQL_NOVA_FALHA}
+"""
+
+SQL_REGISTRAR_LINHA = f"""
+    INSERT INTO {TABELA_FALHAS} (numero_controle_pncp, tipo, numeroitem, motivo, registro)
+    VALUES (%(controle)s, 'linha', %(numeroitem)s, %(motivo)s, %(registro)s)
+    {_SQL_NOVA_FALHA}
+"""
+
+# Entradas com a espera vencida (ou todas as pendentes, com %(ignorar_espera)s)
+_FILTRO_DEVIDAS = """
+    status = 'pendente' AND (%(ignorar_espera)s OR proxima_tentativa <= now())
+"""
+
+
+def _parametros(**extras):
+    extras.update(
+        {
+            "max_tentativas": MAX_TENTATIVAS_FALHAS,
+            "backoff": BACKOFF_MINUTOS,
+            "backoff_max": BACKOFF_MAX_MINUTOS,
+        }
+    )
+    return extras
+
+
+def garantir_tabela_falhas(cursor):
+    cursor.execute(SQL_CRIAR_FALHAS)
+
+
+# 🔹 Registra as compras cuja coleta falhou ({numero_controle_pncp: erro})
+# Não faz commit: vai na transação do lote.
+def registrar_falhas_compras(cursor, falhas):
+    if not falhas:
+        return
+    cursor.execute(
+        SQL_REGISTRAR_COMPRAS,
+        _parametros(
+            url_base=BASE_URL_CONTRATACAO_ITENS,
+            controles=list(falhas),
+            motivos=[str(erro) for erro in falhas.values()],
+        ),
+    )
+
+
+# 🔹 Registra um item recusado pelo banco, com o JSON para a nova tentativa
+def registrar_linha_rejeitada(cursor, registro, motivo):
+    numero_item = registro.get("numeroItem")
+    cursor.execute(
+        SQL_REGISTRAR_LINHA,
+        _parametros(
+            controle=registro.get("numero_controle_pncp") or "",
+            numeroitem="" if numero_item is None else str(numero_item),
+            motivo=motivo,
+            registro=json.dumps(registro, ensure_ascii=False, default=str),
+        ),
+    )
+
+
+# 🔹 Compras coletadas de novo com sucesso: suas entradas (compra e linhas) saem da fila
+# Só as falhas anteriores a esta transação: um item recusado agora, no mesmo lote, fica.
+# Não faz commit: vai na transação do lote.
+def resolver_compras(cursor, controles):
+    if not controles:
+        return
+    cursor.execute(
+        f"""
+        UPDATE {TABELA_FALHAS}
+           SET status = 'resolvida'
+         WHERE numero_controle_pncp = ANY(%s::text[])
+           AND status <> 'resolvida'
+           AND ultima_falha < now()
+        """,
+        (list(controles),),
+    )
+
+
+# 🔹 Linhas regravadas: saem da fila as que não foram recusadas de novo nesta transação
+def resolver_linhas(cursor, chaves):
+    if not chaves:
+        return
+    execute_values(
+        cursor,
+        f"""
+        UPDATE {TABELA_FALHAS} f
+           SET status = 'resolvida'
+          FROM (VALUES %s) c (controle, numeroitem)
+         WHERE f.numero_controle_pncp = c.controle
+           AND f.tipo = 'linha'
+           AND f.numeroitem = c.numeroitem
+           AND f.ultima_falha < now()
+        """,
+        chaves,
+    )
+
+
+# 🔹 Compras da fila prontas para nova tentativa, no formato da lista de trabalho
+# (numero_controle_pncp, orgao_cnpj, sequencial_compra, ano_compra)
+def buscar_compras_devidas(cursor, ignorar_espera=False):
+    cursor.execute(
+        f"""
+        SELECT numero_controle_pncp, orgao_cnpj, sequencial_compra, ano_compra
+        FROM {TABELA_FALHAS}
+        WHERE tipo = 'compra' AND orgao_cnpj IS NOT NULL AND {_FILTRO_DEVIDAS}
+        ORDER BY proxima_tentativa, numero_controle_pncp
+        """,
+        {"ignorar_espera": ignorar_espera},
+    )
+    return cursor.fetchall()
+
+
+# 🔹 Próximo bloco de linhas da fila prontas para nova tentativa, depois da chave `apos`
+# (paginação pela chave: linhas recusadas de novo não voltam no mesmo passe)
+# Retorna [((numero_controle_pncp, numeroitem), registro)].
+def buscar_linhas_devidas(cursor, apos=None, limite=2000, ignorar_espera=False):
+    controle, numeroitem = apos or (None, None)
+    cursor.execute(
+        f"""
+        SELECT numero_controle_pncp, numeroitem, registro
+        FROM {TABELA_FALHAS}
+        WHERE tipo = 'linha' AND registro IS NOT NULL AND {_FILTRO_DEVIDAS}
+          AND (%(controle)s IS NULL
+               OR (numero_controle_pncp, numeroitem) > (%(controle)s, %(numeroitem)s))
+        ORDER BY numero_controle_pncp, numeroitem
+        LIMIT %(limite)s
+        """,
+        {
+            "ignorar_espera": ignorar_espera,
+            "controle": controle,
+            "numeroitem": numeroitem,
+            "limite": limite,
+        },
+    )
+    return [((controle, numeroitem), registro) for controle, numeroitem, registro in cursor]
+
+
+# 🔹 Quantas entradas há na fila, por tipo e status
+def resumo_falhas(cursor):
+    cursor.execute(
+        f"""
+        SELECT tipo, status, count(*) FROM {TABELA_FALHAS}
+        GROUP BY tipo, status ORDER BY tipo, status
+        """
+    )
+    return cursor.fetchall()
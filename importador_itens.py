@@ -0,0 +1,605 @@
+import argparse
+import itertools
+import psycopg2
+
+from agendador import ordenar_compras
+from carga_bulk import (
+    TAMANHO_LOTE,
+    carregar_itens_bulk,
+    garantir_tabelas_carga,
+    hash_conteudo,
+)
+from checkpoint import (
+    filtrar_retomada,
+    garantir_tabela_checkpoint,
+    nova_execucao,
+    registrar_resultado,
+    reservar_compras,
+    ultima_execucao,
+)
+from coletor_async import ColetorAsync, registrar_print
+from config import obter_configuracao
+from fila_falhas import (
+    buscar_compras_devidas,
+    buscar_linhas_devidas,
+    registrar_falhas_compras,
+    registrar_linha_rejeitada,
+    resolver_compras,
+    resolver_linhas,
+    resumo_falhas,
+)
+from indice_chaves import USAR_INDICE, carregar_indice
+from metricas import LINHAS_GRAVADAS, finalizar_execucao, iniciar_execucao, medir
+from pipeline import PipelineColeta, completar_itens
+from pool_banco import PoolConexoes
+from sink_parquet import (
+    SAIDA,
+    diretorio_exportacao,
+    exportar_tabela,
+    obter_sink_parquet,
+)
+from sincronizacao import (
+    ITERSIZE_COMPRAS,
+    filtrar_shard,
+    garantir_tabela,
+    query_compras,
+    registrar_sincronizacao,
+)
+from zona_pouso import DIRETORIO_ZONA, iterar_zona, obter_zona_pouso
+
+
+# Função para conectar ao banco de dados PostgreSQL
+# A configuração é resolvida na primeira conexão, não no import (ver config.py)
+def conectar_banco():
+
+    return psycopg2.connect(**obter_configuracao().parametros_conexao())
+
+
+# Pool de conexões compartilhado (tamanho em PNCP_DB_POOL_MIN / PNCP_DB_POOL_MAX)
+pool = PoolConexoes(conectar_banco)
+
+
+# Motor de coleta concorrente (limites em PNCP_LIMITE_GLOBAL / PNCP_LIMITE_POR_HOST)
+coletor = ColetorAsync()
+
+
+# 🔹 Função auxiliar para acessar objetos aninhados de forma segura
+def get_value_safe(obj, *keys):
+    for key in keys:
+        if obj is None or not isinstance(obj, dict):
+            return None
+        obj = obj.get(key)
+    return obj
+
+
+# 🔹 Função para buscar CNPJs do banco de dados
+# Gerador: as compras chegam aos poucos de um cursor de servidor (itersize linhas por vez).
+# O cursor é WITH HOLD: o commit logo depois do execute materializa o resultado e cada
+# leitura vai numa transação curta, então a conexão não segura uma transação aberta
+# (nem o snapshot) durante a coleta inteira.
+# completo=False traz só compras novas ou possivelmente alteradas (modo incremental);
+# com execucao, pula o que essa execução já concluiu (retomada);
+# com total_shards, traz só as compras do shard indicado.
+# A ordem é a do agendador (agendador.ordenar_compras): recentes, maiores e órgãos alternados.
+# Com o índice de chaves, o modo incremental é decidido por ele (indice.precisa_coletar)
+# em vez das subconsultas por compra na tabela de itens.
+# registrar(nivel, mensagem) recebe as mensagens (padrão: print; o app.py passa o log dele)
+# Erro no banco é registrado e propagado: a lista de trabalho não termina em silêncio.
+def buscar_cnpjs_banco(
+    completo=False,
+    execucao=None,
+    shard=None,
+    total_shards=None,
+    itersize=ITERSIZE_COMPRAS,
+    indice=None,
+    registrar=registrar_print,
+):
+    try:
+        with pool.conexao() as conn:
+            cursor = conn.cursor()
+            garantir_tabela(cursor)
+            garantir_tabela_checkpoint(cursor)
+            garantir_tabelas_carga(cursor)
+            conn.commit()
+            cursor.close()
+
+            filtrar_indice = indice is not None and not completo
+            query, parametros = query_compras(
+                completo or filtrar_indice, conferir_itens=SAIDA != "parquet"
+            )
+            if total_shards:
+                query, parametros = filtrar_shard(
+                    query, parametros, shard, total_shards
+                )
+            if execucao:
+                query, parametros = filtrar_retomada(query, parametros, execucao)
+            query, parametros = ordenar_compras(query, parametros)
+
+            cursor = conn.cursor(name="lista_compras_pncp", withhold=True)
+            cursor.execute(query, parametros)
+            conn.commit()
+            try:
+                while True:
+                    with medir("lista_compras"):
+                        compras = cursor.fetchmany(itersize)
+                        conn.commit()
+                    if not compras:
+                        break
+                    if filtrar_indice:
+                        compras = indice.filtrar_incremental(compras)
+                    yield from compras
+            finally:
+                # Fecha o cursor mesmo com o gerador interrompido (pausa, cancelamento);
+                # o rollback descarta uma leitura que falhou, o cursor WITH HOLD continua
+                if not conn.closed:
+                    conn.rollback()
+                    cursor.close()
+                    conn.commit()
+
+    except Exception as e:
+        registrar("erro", f"Erro ao buscar CNPJs do banco: {e}")
+        raise
+
+
+#  Buscar Itens de Contratação na API
+def buscar_itens_por_cnpj_ano_sequencial(cnpj, ano, sequencial):
+    return coletor.buscar_itens_sync(cnpj, ano, sequencial)
+
+
+# 🔹 Estado das compras do lote (sincronização, fila de falhas e checkpoint),
+# na mesma transação dos itens
+def registrar_estado_lote(cursor, sincronizadas, falhas, execucao):
+    registrar_sincronizacao(cursor, sincronizadas)
+    registrar_falhas_compras(cursor, falhas)
+    resolver_compras(cursor, sincronizadas)
+    if execucao:
+        registrar_resultado(cursor, execucao, sincronizadas or {}, falhas)
+
+
+# Função para inserir registros no banco de dados
+# sincronizadas: {numero_controle_pncp: quantidade de itens} das compras do lote;
+# falhas: {numero_controle_pncp: erro} das compras cuja coleta falhou
+# Retorna os registros que o banco inseriu ou atualizou ([] se o lote falhou).
+def inserir_dados_banco(
+    dados,
+    sincronizadas=None,
+    falhas=None,
+    execucao=None,
+    indice=None,
+    registrar=registrar_print,
+):
+    try:
+        conexao = pool.obter()
+    except Exception as e:
+        registrar("erro", f"Erro ao conectar ao banco de dados: {e}")
+        return []
+
+    cursor = conexao.cursor()
+    registros_para_inserir = []
+
+    # Validar e preparar registros
+    for registro in dados:
+        numero_controle_pncp = str(get_value_safe(registro, "numero_controle_pncp"))
+        numero_item = str(get_value_safe(registro, "numeroItem"))
+
+        if not numero_controle_pncp or not numero_item:
+            registrar(
+                "aviso",
+                "❗ Registro inválido: 'numero_controle_pncp' ou 'numeroItem' ausente.",
+            )
+            continue
+
+        registros_para_inserir.append((numero_controle_pncp, numero_item, registro))
+
+    if not registros_para_inserir:
+        registrar("aviso", "⚠ Nenhum registro válido para inserir.")
+        if sincronizadas or falhas:
+            registrar_estado_lote(cursor, sincronizadas, falhas, execucao)
+            conexao.commit()
+        cursor.close()
+        pool.devolver(conexao)
+        return []
+
+    # Só vão para o upsert os itens novos ou com conteúdo diferente do gravado,
+    # conforme o índice da execução (sem índice, o upsert descarta os iguais no banco)
+    novos_registros = []
+    inalterados = 0
+    with medir("verificacao_existentes"):
+        for numero_controle_pncp, numero_item, registro in registros_para_inserir:
+            registro["hash_conteudo"] = hash_conteudo(registro)
+            if indice is not None and indice.inalterado(
+                numero_controle_pncp, numero_item, registro["hash_conteudo"]
+            ):
+                inalterados += 1
+                continue
+            novos_registros.append(registro)
+
+    recusados = []
+    gravados = []
+    try:
+        with medir("carga_itens"):
+            inseridos, atualizados, inalterados_lote, rejeitados = carregar_itens_bulk(
+                conexao,
+                novos_registros,
+                registrar=registrar,
+                recusados=recusados,
+                gravados=gravados,
+            )
+            registrar_estado_lote(cursor, sincronizadas, falhas, execucao)
+        with medir("commit"):
+            conexao.commit()
+        # O índice só recebe o que foi gravado: um item recusado continua com o hash
+        # antigo (ou sem entrada) e volta a ser gravado na próxima coleta
+        if indice is not None:
+            chaves_recusadas = {
+                (registro.get("numero_controle_pncp"), registro.get("numeroItem"))
+                for registro in recusados
+            }
+            for registro in novos_registros:
+                if (
+                    registro.get("numero_controle_pncp"),
+                    registro.get("numeroItem"),
+                ) in chaves_recusadas:
+                    continue
+                indice.atualizar(
+                    registro["numero_controle_pncp"],
+                    registro.get("numeroItem"),
+                    registro["hash_conteudo"],
+                )
+        LINHAS_GRAVADAS.inc(inseridos, resultado="inserido")
+        LINHAS_GRAVADAS.inc(atualizados, resultado="atualizado")
+        LINHAS_GRAVADAS.inc(inalterados + inalterados_lote, resultado="inalterado")
+        LINHAS_GRAVADAS.inc(rejeitados, resultado="rejeitado")
+        registrar(
+            "sucesso",
+            f"✔ {inseridos} inseridos, {atualizados} atualizados, "
+            f"{inalterados + inalterados_lote} inalterados, {rejeitados} rejeitados.",
+        )
+    except Exception as e:
+        conexao.rollback()
+        gravados = []
+        registrar("erro", f"Erro ao inserir registros: {e}")
+        # O lote inteiro se perdeu: suas compras vão para a fila de falhas (e para o
+        # checkpoint como falhou), para a próxima passada de retentar
+        falhas_lote = dict.fromkeys(sincronizadas or {}, f"Erro ao gravar: {e}")
+        falhas_lote.update(falhas or {})
+        try:
+            registrar_estado_lote(cursor, None, falhas_lote, execucao)
+            conexao.commit()
+        except Exception as e:
+            conexao.rollback()
+            registrar("erro", f"Erro ao registrar as falhas do lote: {e}")
+
+    cursor.close()
+    pool.devolver(conexao)
+    return gravados
+
+
+# 🔹 Grava um lote na(s) saída(s) de PNCP_SAIDA: Postgres, Parquet ou ambos
+# Só com Parquet, o banco recebe apenas o estado das compras (sincronização e checkpoint)
+# e não há com o que comparar: --full e revisitas pelo TTL acrescentam os itens de novo.
+# Os arquivos Parquet ficam completos quando o sink é fechado, no fim da execução.
+# Com os dois, o Parquet recebe só os itens que o banco inseriu ou atualizou: item
+# inalterado (revisita pelo TTL, --full, retentar) não é acrescentado de novo.
+def gravar_lote(
+    lote,
+    sincronizadas,
+    falhas,
+    execucao,
+    sink=None,
+    indice=None,
+    registrar=registrar_print,
+):
+    if SAIDA != "parquet":
+        gravados = inserir_dados_banco(
+            lote, sincronizadas, falhas, execucao, indice, registrar
+        )
+        if sink is not None:
+            sink.gravar(gravados)
+        return
+    if sink is not None:
+        sink.gravar(lote)
+    try:
+        with pool.conexao() as conexao:
+            cursor = conexao.cursor()
+            registrar_estado_lote(cursor, sincronizadas, falhas, execucao)
+            conexao.commit()
+            cursor.close()
+    except Exception as e:
+        registrar("erro", f"Erro ao registrar o estado do lote: {e}")
+
+
+# 🔹 Identificador da execução mais recente registrada no checkpoint
+def buscar_ultima_execucao():
+    with pool.conexao() as conn:
+        cursor = conn.cursor()
+        garantir_tabela_checkpoint(cursor)
+        execucao = ultima_execucao(cursor)
+        conn.commit()
+        cursor.close()
+    return execucao
+
+
+# 🔹 Cria as tabelas auxiliares antes de os shards rodarem em paralelo
+def preparar_tabelas():
+    with pool.conexao() as conn:
+        cursor = conn.cursor()
+        garantir_tabela(cursor)
+        garantir_tabela_checkpoint(cursor)
+        garantir_tabelas_carga(cursor)
+        conn.commit()
+        cursor.close()
+
+
+# 🔹 Índice das chaves já gravadas, para esta execução; None se PNCP_INDICE_CHAVES=desligado
+def carregar_indice_chaves(shard=None, total_shards=None, registrar=registrar_print):
+    if not USAR_INDICE:
+        return None
+    with medir("indice_chaves"):
+        with pool.conexao() as conn:
+            indice = carregar_indice(
+                conn, shard, total_shards, conferir_itens=SAIDA != "parquet"
+            )
+    registrar(
+        "info",
+        f"🗂 Índice de chaves: {len(indice)} itens de {len(indice.compras)} compras "
+        f"({indice.tamanho_bytes() / 1024 / 1024:.1f} MB)",
+    )
+    return indice
+
+
+# Função que processa todos os CNPJs + Sequenciais + Anos
+# execucao: identificador da execução a retomar; None inicia uma nova
+def processar_todos_cnpjs(
+    completo=False, execucao=None, shard=None, total_shards=None
+):
+    if execucao is None:
+        execucao = nova_execucao()
+    iniciar_execucao()
+    print(f"🔖 Execução: {execucao}")
+    indice = carregar_indice_chaves(shard, total_shards)
+
+    resultados = reservar_compras(
+        pool,
+        buscar_cnpjs_banco(
+            completo, execucao, shard, total_shards, indice=indice
+        ),
+        execucao,
+    )
+
+    # A coleta começa assim que a primeira compra chega do banco
+    primeira = next(resultados, None)
+    if primeira is None:
+        print("Nenhum CNPJ, sequencial ou ano encontrado no banco.")
+        return
+    resultados = itertools.chain([primeira], resultados)
+
+    # Coleta e gravação em paralelo: itens de várias compras por transação
+    sink = obter_sink_parquet()
+    pipeline = PipelineColeta(
+        coletor,
+        lambda lote, compras_lote, falhas_lote: gravar_lote(
+            lote, compras_lote, falhas_lote, execucao, sink, indice
+        ),
+        registrar=registrar_print,
+        zona_pouso=obter_zona_pouso(),
+    )
+    try:
+        total_cnpjs = pipeline.executar(resultados)
+    finally:
+        if sink is not None:
+            sink.fechar()
+
+    print(f"🔢 Total de {total_cnpjs} CNPJs processados.")
+    for linha in finalizar_execucao():
+        print(linha)
+
+
+# 🔹 Regrava no banco os itens guardados na zona de pouso, sem acessar a API
+# Os arquivos são lidos do mais antigo para o mais novo, então prevalece a coleta mais
+# recente de cada item. O estado de sincronização não é tocado (os dados podem ser antigos).
+def reprocessar_zona_pouso(diretorio=DIRETORIO_ZONA, tamanho_lote=TAMANHO_LOTE):
+    preparar_tabelas()
+    print(f"📂 Reprocessando a zona de pouso em {diretorio}")
+    indice = carregar_indice_chaves()
+
+    lote = {}
+    total_compras = total_itens = 0
+    for compra, itens in iterar_zona(diretorio):
+        total_compras += 1
+        total_itens += len(itens)
+        for item in completar_itens(compra, itens):
+            lote[(item["numero_controle_pncp"], str(item.get("numeroItem")))] = item
+        if len(lote) >= tamanho_lote:
+            inserir_dados_banco(list(lote.values()), indice=indice)
+            lote = {}
+    if lote:
+        inserir_dados_banco(list(lote.values()), indice=indice)
+
+    print(f"🔢 {total_itens} itens de {total_compras} compras reprocessados.")
+
+
+# 🔹 Regrava os itens recusados da fila de falhas a partir do JSON guardado, em blocos
+# de tamanho_lote; os que o banco gravar vão também para o sink, se houver.
+# Retorna (itens lidos da fila, itens regravados).
+def _regravar_linhas_devidas(ignorar_espera, tamanho_lote, sink=None):
+    total_linhas = regravadas = 0
+    chave = None
+    while True:
+        with pool.conexao() as conn:
+            cursor = conn.cursor()
+            linhas = buscar_linhas_devidas(cursor, chave, tamanho_lote, ignorar_espera)
+            if not linhas:
+                conn.commit()
+                cursor.close()
+                break
+            chave = linhas[-1][0]
+            chaves = [chave_linha for chave_linha, _ in linhas]
+            registros = [registro for _, registro in linhas]
+            total_linhas += len(linhas)
+            gravados = []
+            try:
+                with medir("carga_itens"):
+                    inseridos, atualizados, inalterados, rejeitados = carregar_itens_bulk(
+                        conn, registros, registrar=registrar_print, gravados=gravados
+                    )
+                    resolver_linhas(cursor, chaves)
+                conn.commit()
+                regravadas += len(linhas) - rejeitados
+                LINHAS_GRAVADAS.inc(inseridos, resultado="inserido")
+                LINHAS_GRAVADAS.inc(atualizados, resultado="atualizado")
+                LINHAS_GRAVADAS.inc(inalterados, resultado="inalterado")
+                LINHAS_GRAVADAS.inc(rejeitados, resultado="rejeitado")
+            except Exception as e:
+                conn.rollback()
+                gravados = []
+                print(f"Erro ao regravar itens da fila de falhas: {e}")
+                for registro in registros:
+                    registrar_linha_rejeitada(cursor, registro, f"Erro ao gravar: {e}")
+                conn.commit()
+            cursor.close()
+        if sink is not None:
+            sink.gravar(gravados)
+    return total_linhas, regravadas
+
+
+# 🔹 Nova tentativa só do que está na fila de falhas (fila_falhas.py), sem percorrer a
+# lista de compras: as compras cuja coleta falhou são coletadas de novo e os itens
+# recusados pelo banco são regravados a partir do JSON guardado. Só entram as entradas
+# cuja espera (backoff) venceu; com ignorar_espera, todas as pendentes.
+def reprocessar_falhas(ignorar_espera=False, tamanho_lote=TAMANHO_LOTE):
+    preparar_tabelas()
+    iniciar_execucao()
+    with pool.conexao() as conn:
+        cursor = conn.cursor()
+        compras = buscar_compras_devidas(cursor, ignorar_espera)
+        conn.commit()
+        cursor.close()
+
+    print(f"🔁 {len(compras)} compras da fila de falhas para coletar de novo")
+    # Itens gravados nas duas passadas também vão para o Parquet (PNCP_SAIDA)
+    sink = obter_sink_parquet()
+    try:
+        if compras:
+            # Sem execução: o checkpoint não é tocado; a fila e a sincronização, sim
+            pipeline = PipelineColeta(
+                coletor,
+                lambda lote, compras_lote, falhas_lote: gravar_lote(
+                    lote, compras_lote, falhas_lote, None, sink
+                ),
+                registrar=registrar_print,
+                zona_pouso=obter_zona_pouso(),
+            )
+            pipeline.executar(compras)
+
+        total_linhas, regravadas = _regravar_linhas_devidas(
+            ignorar_espera, tamanho_lote, sink
+        )
+    finally:
+        if sink is not None:
+            sink.fechar()
+
+    print(f"🔢 {regravadas} de {total_linhas} itens da fila de falhas regravados.")
+    with pool.conexao() as conn:
+        cursor = conn.cursor()
+        for tipo, status, quantidade in resumo_falhas(cursor):
+            print(f"   fila de falhas: {tipo} {status}: {quantidade}")
+        conn.commit()
+        cursor.close()
+    for linha in finalizar_execucao():
+        print(linha)
+
+
+# 🔹 Exporta a tabela de itens para Parquet, no layout da saída PNCP_SAIDA=parquet
+# Sem destino, vai para um subdiretório novo de DIRETORIO_EXPORTACAO; o destino
+# precisa estar vazio (ou não existir): não se exporta por cima da coleta
+def exportar_parquet(diretorio=None):
+    diretorio = diretorio or diretorio_exportacao()
+    print(f"📦 Exportando itens para {diretorio}")
+    try:
+        with pool.conexao() as conn:
+            total = exportar_tabela(conn, diretorio)
+            conn.commit()
+    except FileExistsError as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+    print(f"🔢 {total} itens exportados.")
+
+
+# 🔹 Linha de comando: coletar (padrão), replay, exportar ou retentar
+def executar_linha_de_comando(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Importa itens de contratação do PNCP para o banco de dados local"
+    )
+    parser.add_argument(
+        "comando",
+        nargs="?",
+        choices=["coletar", "replay", "exportar", "retentar"],
+        default="coletar",
+        help="coletar da API (padrão), regravar a zona de pouso no banco (replay), "
+        "exportar a tabela de itens para Parquet (exportar) "
+        "ou refazer só o que está na fila de falhas (retentar)",
+    )
+    parser.add_argument(
+        "--zona",
+        default=DIRETORIO_ZONA,
+        metavar="DIRETORIO",
+        help="diretório da zona de pouso usado pelo replay",
+    )
+    parser.add_argument(
+        "--destino",
+        metavar="DIRETORIO",
+        help="diretório vazio (ou novo) para os arquivos Parquet do exportar "
+        "(padrão: um subdiretório novo de PNCP_PARQUET_EXPORTACAO)",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="recarga completa: reprocessa todas as compras, não só as novas/alteradas",
+    )
+    parser.add_argument(
+        "--resume",
+        nargs="?",
+        const="ultima",
+        metavar="EXECUCAO",
+        help="retoma uma execução interrompida (padrão: a mais recente)",
+    )
+    parser.add_argument(
+        "--shard",
+        metavar="I/N",
+        help="processa só o shard I de N (ex.: 0/4), por hash do orgao_cnpj",
+    )
+    parser.add_argument(
+        "--agora",
+        action="store_true",
+        help="no retentar, inclui as entradas ainda em espera (ignora o backoff)",
+    )
+    args = parser.parse_args(argv)
+
+    if args.comando == "replay":
+        reprocessar_zona_pouso(args.zona)
+    elif args.comando == "exportar":
+        exportar_parquet(args.destino)
+    elif args.comando == "retentar":
+        reprocessar_falhas(ignorar_espera=args.agora)
+    else:
+        shard = total_shards = None
+        if args.shard:
+            shard, total_shards = (int(parte) for parte in args.shard.split("/"))
+
+        execucao = args.resume
+        if execucao == "ultima":
+            execucao = buscar_ultima_execucao()
+
+        print("🔵 Iniciando o processamento completo...")
+        processar_todos_cnpjs(
+            completo=args.full,
+            execucao=execucao,
+            shard=shard,
+            total_shards=total_shards,
+        )
+        print("✅ Processamento concluído!")
+
+
+if __name__ == "__main__":
+    executar_linha_de_comando()
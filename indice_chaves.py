@@ -0,0 +1,221 @@
+import array
+import bisect
+import hashlib
+import os
+from datetime import date
+
+from carga_bulk import COLUNA_HASH, TABELA_DESTINO, garantir_tabelas_carga
+from sincronizacao import (
+    SYNC_ANOS_REVALIDAR,
+    SYNC_TTL_DIAS,
+    TABELA_SINCRONIZACAO,
+    filtrar_shard,
+    garantir_tabela,
+)
+
+# Configuração do índice (variáveis de ambiente)
+# PNCP_INDICE_CHAVES: "ligado" (padrão) ou "desligado" (sem índice: todos os itens vão
+# para o upsert, que descarta os inalterados no banco, e o modo incremental usa a query antiga)
+USAR_INDICE = os.getenv("PNCP_INDICE_CHAVES", "ligado") != "desligado"
+ITERSIZE_INDICE = int(os.getenv("PNCP_INDICE_ITERSIZE", "50000"))
+
+
+# Impressão de 64 bits de um texto: primeiros 8 bytes do md5, como bigint com sinal.
+# No banco: ('x' || substr(md5(texto), 1, 16))::bit(64)::bigint
+def impressao(texto):
+    return int.from_bytes(
+        hashlib.md5(texto.encode("utf-8")).digest()[:8], "big", signed=True
+    )
+
+
+def _impressao_hash(hash_hex):
+    return int.from_bytes(bytes.fromhex(hash_hex[:16]), "big", signed=True)
+
+
+def _sql_impressao(expressao_hex):
+    return f"('x' || substr({expressao_hex}, 1, 16))::bit(64)::bigint"
+
+
+# Itens gravados, agrupados por compra (na ordem da impressão) e por número do item.
+# orgao_cnpj vai junto para o filtro de shard.
+SQL_ITENS_INDICE = f"""
+    SELECT {_sql_impressao("md5(numero_controle_pncp)")} AS compra,
+           numeroitem,
+           coalesce({_sql_impressao(COLUNA_HASH)}, 0) AS hash,
+           orgao_cnpj
+    FROM {TABELA_DESTINO}
+    WHERE numeroitem IS NOT NULL
+"""
+
+# Última sincronização de cada compra; "vencida" segue o TTL do modo incremental
+SQL_SINCRONIZACAO_INDICE = f"""
+    SELECT {_sql_impressao("md5(numero_controle_pncp)")} AS compra,
+           quantidade_itens,
+           (%(ttl_dias)s > 0
+            AND ultima_sincronizacao < now() - make_interval(days => %(ttl_dias)s))
+    FROM {TABELA_SINCRONIZACAO}
+    ORDER BY 1
+"""
+
+
+# 🔹 Índice das chaves já gravadas, carregado uma vez por execução
+# Guarda, em arrays compactos e ordenados (~12 bytes por item, ~24 por compra):
+# - por compra: impressão de numero_controle_pncp e a faixa dos seus itens;
+# - por item: numeroItem e a impressão do hash_conteudo;
+# - por compra sincronizada: quantidade de itens da última coleta e se o TTL venceu.
+# Responde sem ida ao banco se um item está gravado com o mesmo conteúdo e se uma
+# compra precisa ser coletada no modo incremental. Buscas por bisseção.
+# conferir_itens=False: os itens não vão para o Postgres (ver query_compras).
+class IndiceChaves:
+    def __init__(self, conferir_itens=True):
+        self.conferir_itens = conferir_itens
+        self.compras = array.array("q")
+        self.inicios = array.array("Q")  # itens da compra i: [inicios[i], inicios[i + 1])
+        self.itens = array.array("i")
+        self.hashes = array.array("q")
+        self.sincronizadas = array.array("q")
+        self.quantidades = array.array("i")
+        self.vencidas = bytearray()
+
+    def __len__(self):
+        return len(self.itens)
+
+    def tamanho_bytes(self):
+        arrays = (self.compras, self.inicios, self.itens, self.hashes,
+                  self.sincronizadas, self.quantidades)
+        return sum(a.itemsize * len(a) for a in arrays) + len(self.vencidas)
+
+    # linhas: (compra, numeroitem, hash) ordenadas por compra e numeroitem
+    def _carregar_itens(self, linhas):
+        anterior = None
+        for compra, numero_item, hash_item, *_ in linhas:
+            if compra != anterior:
+                self.compras.append(compra)
+                self.inicios.append(len(self.itens))
+                anterior = compra
+            self.itens.append(numero_item)
+            self.hashes.append(hash_item)
+        self.inicios.append(len(self.itens))
+
+    # linhas: (compra, quantidade_itens, vencida) ordenadas por compra
+    def _carregar_sincronizacao(self, linhas):
+        for compra, quantidade, vencida in linhas:
+            self.sincronizadas.append(compra)
+            self.quantidades.append(quantidade)
+            self.vencidas.append(1 if vencida else 0)
+
+    def _faixa(self, numero_controle_pncp):
+        chave = impressao(numero_controle_pncp)
+        i = bisect.bisect_left(self.compras, chave)
+        if i == len(self.compras) or self.compras[i] != chave:
+            return 0, 0
+        return self.inicios[i], self.inicios[i + 1]
+
+    # Quantos itens da compra estão gravados
+    def quantidade_gravada(self, numero_controle_pncp):
+        inicio, fim = self._faixa(numero_controle_pncp)
+        return fim - inicio
+
+    # Verdadeiro se o item está gravado com este hash_conteudo
+    def inalterado(self, numero_controle_pncp, numero_item, hash_hex):
+        try:
+            numero_item = int(numero_item)
+        except (TypeError, ValueError):
+            return False
+        inicio, fim = self._faixa(numero_controle_pncp)
+        i = bisect.bisect_left(self.itens, numero_item, inicio, fim)
+        return (
+            i < fim
+            and self.itens[i] == numero_item
+            and self.hashes[i] == _impressao_hash(hash_hex)
+        )
+
+    # Depois de gravar: itens já conhecidos passam a ter o hash novo
+    # (itens novos não entram; continuam indo para o upsert, que os trata)
+    def atualizar(self, numero_controle_pncp, numero_item, hash_hex):
+        try:
+            numero_item = int(numero_item)
+        except (TypeError, ValueError):
+            return
+        inicio, fim = self._faixa(numero_controle_pncp)
+        i = bisect.bisect_left(self.itens, numero_item, inicio, fim)
+        if i < fim and self.itens[i] == numero_item:
+            self.hashes[i] = _impressao_hash(hash_hex)
+
+    # 🔹 Mesmo critério de SQL_COMPRAS_INCREMENTAL (sincronizacao.py), sem consultar
+    # a tabela de itens por compra: nova (sem estado e sem itens), vencida pelo TTL
+    # (só anos recentes) ou com menos itens gravados do que a última coleta encontrou
+    def precisa_coletar(self, compra, ano_atual=None):
+        numero_controle_pncp, _, _, ano = compra
+        gravados = self.quantidade_gravada(numero_controle_pncp)
+
+        chave = impressao(numero_controle_pncp)
+        i = bisect.bisect_left(self.sincronizadas, chave)
+        if i == len(self.sincronizadas) or self.sincronizadas[i] != chave:
+            return gravados == 0
+
+        ano_atual = ano_atual or date.today().year
+        try:
+            recente = int(ano) >= ano_atual - SYNC_ANOS_REVALIDAR
+        except (TypeError, ValueError):
+            recente = False
+        if self.vencidas[i] and recente:
+            return True
+        return self.conferir_itens and self.quantidades[i] > gravados
+
+    # Repassa só as compras que precisam ser coletadas (antes de qualquer requisição)
+    def filtrar_incremental(self, compras):
+        ano_atual = date.today().year
+        for compra in compras:
+            if self.precisa_coletar(compra, ano_atual):
+                yield compra
+
+
+def _linhas(conexao, nome, query, parametros, itersize):
+    cursor = conexao.cursor(name=nome)
+    cursor.itersize = itersize
+    try:
+        cursor.execute(query, parametros)
+        while True:
+            linhas = cursor.fetchmany(itersize)
+            if not linhas:
+                break
+            yield from linhas
+    finally:
+        cursor.close()
+
+
+# 🔹 Carrega o índice em streaming (cursor de servidor; o banco ordena)
+# Com total_shards, só os itens do shard. Faz commit (cria as tabelas se preciso).
+def carregar_indice(
+    conexao,
+    shard=None,
+    total_shards=None,
+    itersize=ITERSIZE_INDICE,
+    conferir_itens=True,
+):
+    cursor = conexao.cursor()
+    garantir_tabela(cursor)
+    garantir_tabelas_carga(cursor)
+    conexao.commit()
+    cursor.close()
+
+    query, parametros = SQL_ITENS_INDICE, None
+    if total_shards:
+        query, parametros = filtrar_shard(query, parametros, shard, total_shards)
+
+    indice = IndiceChaves(conferir_itens)
+    indice._carregar_itens(
+        _linhas(conexao, "indice_itens_pncp", query + " ORDER BY 1, 2", parametros, itersize)
+    )
+    indice._carregar_sincronizacao(
+        _linhas(
+            conexao,
+            "indice_sincronizacao_pncp",
+            SQL_SINCRONIZACAO_INDICE,
+            {"ttl_dias": SYNC_TTL_DIAS},
+            itersize,
+        )
+    )
+    conexao.commit()
+    return indice
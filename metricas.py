@@ -0,0 +1,444 @@
+import bisect
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Configuração das métricas (variáveis de ambiente)
+# Arquivo OpenMetrics gravado no fim de cada execução (vazio = não grava)
+ARQUIVO_METRICAS = os.getenv("PNCP_METRICAS_ARQUIVO", "")
+# Porta do endpoint local /metrics (0 = desligado)
+PORTA_METRICAS = int(os.getenv("PNCP_METRICAS_PORTA", "0"))
+# PNCP_PERFIL: "" (desligado), "cprofile" ou "amostragem"
+MODO_PERFIL = os.getenv("PNCP_PERFIL", "")
+DIRETORIO_PERFIL = os.getenv("PNCP_PERFIL_DIRETORIO", "perfis")
+INTERVALO_AMOSTRAGEM = float(os.getenv("PNCP_PERFIL_INTERVALO", "0.01"))  # segundos
+
+LIMITES_SEGUNDOS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+
+def _rotulos_texto(rotulos):
+    if not rotulos:
+        return ""
+    partes = []
+    for chave, valor in rotulos:
+        valor = (
+            str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        )
+        partes.append(f'{chave}="{valor}"')
+    return "{" + ",".join(partes) + "}"
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    tipo = "counter"
+
+    def __init__(self, nome, ajuda):
+        self.nome = nome
+        self.ajuda = ajuda
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, valor=1, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def valor(self, **rotulos):
+        return self._valores.get(tuple(sorted(rotulos.items())), 0)
+
+    def total(self):
+        return sum(self._valores.values())
+
+    def amostras(self):
+        with self._lock:
+            return [
+                (f"{self.nome}_total", rotulos, valor)
+                for rotulos, valor in sorted(self._valores.items())
+            ]
+
+    def zerar(self):
+        with self._lock:
+            self._valores = {}
+
+
+class Medidor:
+    tipo = "gauge"
+
+    def __init__(self, nome, ajuda, funcao=None):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.funcao = funcao  # opcional: valor lido na hora da exportação
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def definir(self, valor, **rotulos):
+        with self._lock:
+            self._valores[tuple(sorted(rotulos.items()))] = valor
+
+    def amostras(self):
+        if self.funcao is not None:
+            valor = self.funcao()
+            return [] if valor is None else [(self.nome, (), valor)]
+        with self._lock:
+            return [(self.nome, r, v) for r, v in sorted(self._valores.items())]
+
+    def zerar(self):
+        with self._lock:
+            self._valores = {}
+
+
+class Histograma:
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, limites=LIMITES_SEGUNDOS):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.limites = tuple(limites)
+        self._series = {}  # rotulos -> [contagens por faixa..., soma, quantidade]
+        self._lock = threading.Lock()
+
+    def observar(self, valor, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        faixa = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [0] * (len(self.limites) + 1) + [0.0, 0]
+            serie[faixa] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def series(self):
+        with self._lock:
+            return {rotulos: list(serie) for rotulos, serie in self._series.items()}
+
+    # Quantil aproximado pelo limite superior da faixa que o contém
+    def quantil(self, serie, q):
+        alvo = q * serie[-1]
+        acumulado = 0
+        for i, limite in enumerate(self.limites):
+            acumulado += serie[i]
+            if acumulado >= alvo:
+                return limite
+        return float("inf")
+
+    def amostras(self):
+        linhas = []
+        bucket = f"{self.nome}_bucket"
+        for rotulos, serie in sorted(self.series().items()):
+            acumulado = 0
+            for i, limite in enumerate(self.limites):
+                acumulado += serie[i]
+                linhas.append((bucket, rotulos + (("le", limite),), acumulado))
+            linhas.append((bucket, rotulos + (("le", "+Inf"),), serie[-1]))
+            linhas.append((f"{self.nome}_sum", rotulos, serie[-2]))
+            linhas.append((f"{self.nome}_count", rotulos, serie[-1]))
+        return linhas
+
+    def zerar(self):
+        with self._lock:
+            self._series = {}
+
+
+# 🔹 Registro das métricas do processo, exportado em OpenMetrics
+class RegistroMetricas:
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+        self.inicio = time.time()
+
+    def _obter(self, classe, nome, ajuda, **opcoes):
+        with self._lock:
+            if nome not in self._metricas:
+                self._metricas[nome] = classe(nome, ajuda, **opcoes)
+            return self._metricas[nome]
+
+    def contador(self, nome, ajuda=""):
+        return self._obter(Contador, nome, ajuda)
+
+    def medidor(self, nome, ajuda="", funcao=None):
+        medidor = self._obter(Medidor, nome, ajuda)
+        if funcao is not None:
+            medidor.funcao = funcao
+        return medidor
+
+    def histograma(self, nome, ajuda="", limites=LIMITES_SEGUNDOS):
+        return self._obter(Histograma, nome, ajuda, limites=limites)
+
+    # Zera os valores no início de uma execução (o resumo é por execução)
+    def reiniciar(self):
+        with self._lock:
+            for metrica in self._metricas.values():
+                metrica.zerar()
+            self.inicio = time.time()
+
+    def texto_openmetrics(self):
+        linhas = []
+        with self._lock:
+            metricas = list(self._metricas.values())
+        for metrica in metricas:
+            linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            if metrica.ajuda:
+                linhas.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+            for nome, rotulos, valor in metrica.amostras():
+                linhas.append(f"{nome}{_rotulos_texto(rotulos)} {_numero(valor)}")
+        linhas.append("# EOF")
+        return "\n".join(linhas) + "\n"
+
+    def gravar_arquivo(self, caminho):
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        temporario = caminho + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            arquivo.write(self.texto_openmetrics())
+        os.replace(temporario, caminho)
+
+
+REGISTRO = RegistroMetricas()
+
+# Métricas da coleta
+LATENCIA_ETAPA = REGISTRO.histograma(
+    "pncp_etapa_segundos",
+    "Duração de cada etapa (lista de compras, verificação, carga, commit)",
+)
+LATENCIA_HTTP = REGISTRO.histograma(
+    "pncp_http_segundos", "Latência de cada tentativa HTTP à API do PNCP"
+)
+REQUISICOES_HTTP = REGISTRO.contador(
+    "pncp_http_requisicoes", "Tentativas HTTP por status (erro = timeout/conexão)"
+)
+RESPOSTAS_CACHE = REGISTRO.contador(
+    "pncp_cache_respostas", "Respostas servidas pelo cache local, por resultado"
+)
+COMPRAS = REGISTRO.contador("pncp_compras", "Compras processadas, por resultado")
+ITENS_COLETADOS = REGISTRO.contador("pncp_itens_coletados", "Itens recebidos da API")
+LINHAS_GRAVADAS = REGISTRO.contador(
+    "pncp_linhas",
+    "Itens gravados, por resultado (inserido, atualizado, inalterado, rejeitado)",
+)
+VAZAO_ITENS = REGISTRO.medidor(
+    "pncp_itens_por_segundo",
+    "Itens coletados por segundo desde o início da execução",
+    funcao=lambda: ITENS_COLETADOS.total() / max(time.time() - REGISTRO.inicio, 1e-9),
+)
+
+
+# 🔹 Observador para cliente_http.adicionar_observador
+def observar_http(latencia, status):
+    LATENCIA_HTTP.observar(latencia)
+    REQUISICOES_HTTP.inc(status="erro" if status is None else status)
+
+
+# 🔹 Perfil por etapa (opt-in por PNCP_PERFIL)
+# cprofile: um cProfile por etapa, somado entre chamadas. O cProfile só pode estar
+# ativo num lugar por vez, então etapas simultâneas em outras threads ficam de fora.
+# amostragem: uma thread lê as pilhas de todas as threads a cada INTERVALO_AMOSTRAGEM
+# e atribui cada amostra à etapa em que a thread está (pilhas no formato "collapsed").
+class Perfilador:
+    def __init__(self, modo=MODO_PERFIL, diretorio=DIRETORIO_PERFIL):
+        self.modo = modo
+        self.diretorio = diretorio
+        self._etapas_thread = {}  # ident da thread -> pilha de etapas
+        self._estatisticas = {}  # etapa -> pstats.Stats
+        self._amostras = {}  # etapa -> Counter de pilhas
+        self._lock = threading.Lock()
+        self._lock_cprofile = threading.Lock()
+        self._parar = threading.Event()
+        self._amostrador = None
+
+    @property
+    def ativo(self):
+        return self.modo in ("cprofile", "amostragem")
+
+    def iniciar(self):
+        if self.modo == "amostragem" and self._amostrador is None:
+            self._parar.clear()
+            self._amostrador = threading.Thread(
+                target=self._amostrar, name="pncp-perfil", daemon=True
+            )
+            self._amostrador.start()
+
+    @contextmanager
+    def etapa(self, nome):
+        ident = threading.get_ident()
+        pilha = self._etapas_thread.setdefault(ident, [])
+        pilha.append(nome)
+        perfil = None
+        if self.modo == "cprofile" and len(pilha) == 1:
+            if self._lock_cprofile.acquire(blocking=False):
+                perfil = cProfile.Profile()
+                try:
+                    perfil.enable()
+                except ValueError:  # outro perfilador ativo
+                    perfil = None
+                    self._lock_cprofile.release()
+        try:
+            yield
+        finally:
+            if perfil is not None:
+                perfil.disable()
+                self._lock_cprofile.release()
+                with self._lock:
+                    if nome in self._estatisticas:
+                        self._estatisticas[nome].add(perfil)
+                    else:
+                        self._estatisticas[nome] = pstats.Stats(perfil)
+            pilha.pop()
+
+    def _amostrar(self):
+        while not self._parar.wait(INTERVALO_AMOSTRAGEM):
+            quadros = sys._current_frames()
+            for ident, pilha in list(self._etapas_thread.items()):
+                # A thread pode sair da etapa enquanto a amostra é montada
+                etapa = pilha[-1] if pilha else None
+                if etapa is None or ident not in quadros:
+                    continue
+                chamadas = ";".join(
+                    f"{q.name} ({os.path.basename(q.filename)}:{q.lineno})"
+                    for q in traceback.extract_stack(quadros[ident])
+                )
+                with self._lock:
+                    self._amostras.setdefault(etapa, Counter())[chamadas] += 1
+
+    # Grava um arquivo por etapa em DIRETORIO_PERFIL e retorna os caminhos
+    def gravar(self):
+        if not self.ativo:
+            return []
+        self._parar.set()
+        if self._amostrador is not None:
+            self._amostrador.join()
+            self._amostrador = None
+        os.makedirs(self.diretorio, exist_ok=True)
+        caminhos = []
+        with self._lock:
+            for etapa, estatisticas in self._estatisticas.items():
+                caminho = os.path.join(self.diretorio, f"perfil-{etapa}.prof")
+                estatisticas.dump_stats(caminho)
+                caminhos.append(caminho)
+            for etapa, pilhas in self._amostras.items():
+                caminho = os.path.join(self.diretorio, f"perfil-{etapa}.collapsed")
+                with open(caminho, "w", encoding="utf-8") as arquivo:
+                    for chamadas, quantidade in pilhas.most_common():
+                        arquivo.write(f"{chamadas} {quantidade}\n")
+                caminhos.append(caminho)
+            self._estatisticas = {}
+            self._amostras = {}
+        return caminhos
+
+
+PERFILADOR = Perfilador()
+
+
+# 🔹 Mede um bloco como etapa: histograma de duração e, se ligado, perfil da etapa
+@contextmanager
+def medir(etapa):
+    inicio = time.perf_counter()
+    try:
+        if PERFILADOR.ativo:
+            with PERFILADOR.etapa(etapa):
+                yield
+        else:
+            yield
+    finally:
+        LATENCIA_ETAPA.observar(time.perf_counter() - inicio, etapa=etapa)
+
+
+_servidor = None
+_lock_servidor = threading.Lock()
+
+
+class _HandlerMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        corpo = REGISTRO.texto_openmetrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header(
+            "Content-Type", "application/openmetrics-text; version=1.0.0; charset=utf-8"
+        )
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+# 🔹 Sobe o endpoint /metrics em PNCP_METRICAS_PORTA (uma vez por processo)
+def servir_metricas(porta=PORTA_METRICAS):
+    global _servidor
+    if not porta:
+        return None
+    with _lock_servidor:
+        if _servidor is None:
+            _servidor = ThreadingHTTPServer(("127.0.0.1", porta), _HandlerMetricas)
+            threading.Thread(
+                target=_servidor.serve_forever, name="pncp-metricas", daemon=True
+            ).start()
+    return _servidor
+
+
+# 🔹 Começo de uma execução: zera as métricas, liga o endpoint e o perfilador
+def iniciar_execucao():
+    REGISTRO.reiniciar()
+    servir_metricas()
+    PERFILADOR.iniciar()
+
+
+def _por_rotulo(contador):
+    return ", ".join(
+        f"{rotulos[0][1]}={valor}" for _, rotulos, valor in contador.amostras()
+    )
+
+
+# 🔹 Resumo da execução (linhas de texto), a partir das métricas acumuladas
+def resumo_execucao():
+    duracao = max(time.time() - REGISTRO.inicio, 1e-9)
+    itens = ITENS_COLETADOS.total()
+    linhas = [
+        f"⏱ Duração: {duracao:.1f}s | {itens} itens ({itens / duracao:.1f} itens/s)"
+        f" | {REQUISICOES_HTTP.total()} requisições HTTP",
+        f"📦 Compras: {_por_rotulo(COMPRAS)}",
+        f"🗄 Linhas: {_por_rotulo(LINHAS_GRAVADAS)}",
+        f"🌐 Status HTTP: {_por_rotulo(REQUISICOES_HTTP)}",
+    ]
+    for rotulos, serie in sorted(LATENCIA_ETAPA.series().items()):
+        quantidade, soma = serie[-1], serie[-2]
+        linhas.append(
+            f"   • {rotulos[0][1]}: {quantidade}x, total {soma:.2f}s, "
+            f"média {soma / quantidade * 1000:.1f}ms, "
+            f"p95 ≤ {LATENCIA_ETAPA.quantil(serie, 0.95)}s"
+        )
+    serie_http = LATENCIA_HTTP.series().get(())
+    if serie_http:
+        linhas.append(
+            f"   • http: {serie_http[-1]}x, média "
+            f"{serie_http[-2] / serie_http[-1] * 1000:.1f}ms, "
+            f"p95 ≤ {LATENCIA_HTTP.quantil(serie_http, 0.95)}s"
+        )
+    return linhas
+
+
+# 🔹 Fim de uma execução: grava o arquivo OpenMetrics e os perfis, retorna o resumo
+def finalizar_execucao(arquivo=ARQUIVO_METRICAS):
+    if arquivo:
+        REGISTRO.gravar_arquivo(arquivo)
+    linhas = resumo_execucao()
+    for caminho in PERFILADOR.gravar():
+        linhas.append(f"🔬 Perfil gravado em {caminho}")
+    return linhas
@@ -0,0 +1,187 @@
+import os
+import queue
+import threading
+import time
+
+from carga_bulk import TAMANHO_LOTE
+from coletor_async import registrar_print
+from metricas import COMPRAS, ITENS_COLETADOS
+
+# Configuração do pipeline (variáveis de ambiente)
+TAMANHO_FILA = int(os.getenv("PNCP_TAMANHO_FILA", "64"))  # compras aguardando gravação
+ESCRITORES = int(os.getenv("PNCP_ESCRITORES", "2"))
+INTERVALO_LOTE = float(os.getenv("PNCP_INTERVALO_LOTE", "5"))  # segundos
+
+_FIM = object()
+
+
+# 🔹 Adiciona numero_controle_pncp, orgao_cnpj, sequencial_compra e ano_compra a cada item
+# (ano_compra não é coluna da tabela de itens; serve à partição da saída Parquet)
+def completar_itens(compra, itens):
+    numero_controle_pncp, cnpj, sequencial, ano = compra
+    for item in itens:
+        item["numero_controle_pncp"] = numero_controle_pncp
+        item["orgao_cnpj"] = cnpj
+        item["sequencial_compra"] = str(sequencial)
+        item["ano_compra"] = ano
+    return itens
+
+
+# 🔹 Pipeline produtor/consumidor: a coleta HTTP alimenta uma fila limitada e os
+# escritores gravam itens de várias compras por transação (por tamanho ou por tempo).
+# A fila cheia segura o produtor, então a memória fica limitada a ~tamanho_fila compras.
+# gravar_lote(lote, compras_lote, falhas_lote) é chamado pelas threads escritoras.
+# Com zona_pouso (ver zona_pouso.py), a resposta bruta de cada compra também vai para disco.
+class PipelineColeta:
+    def __init__(
+        self,
+        coletor,
+        gravar_lote,
+        tamanho_lote=TAMANHO_LOTE,
+        intervalo_lote=INTERVALO_LOTE,
+        escritores=ESCRITORES,
+        tamanho_fila=TAMANHO_FILA,
+        registrar=registrar_print,
+        zona_pouso=None,
+    ):
+        self.coletor = coletor
+        self.gravar_lote = gravar_lote
+        self.tamanho_lote = tamanho_lote
+        self.intervalo_lote = intervalo_lote
+        self.escritores = escritores
+        self.registrar = registrar
+        self.zona_pouso = zona_pouso
+        self.total_compras = 0
+        self._fila = queue.Queue(maxsize=tamanho_fila)
+        self._lock = threading.Lock()
+        self._erro = None
+        self._parar = threading.Event()
+
+    def _falhar(self, erro):
+        with self._lock:
+            if self._erro is None:
+                self._erro = erro
+        self._parar.set()
+
+    def _produzir(self, compras):
+        try:
+            for resultado in self.coletor.iterar_compras(compras):
+                if self._parar.is_set():
+                    break
+                self._fila.put(resultado)
+        except BaseException as e:
+            self._falhar(e)
+        finally:
+            for _ in range(self.escritores):
+                self._fila.put(_FIM)
+
+    def _gravar(self, lote, compras_lote, falhas_lote):
+        try:
+            self.gravar_lote(lote, compras_lote, falhas_lote)
+        except Exception as e:
+            # As compras do lote não ficam concluídas no checkpoint; o resume as refaz
+            self.registrar("erro", f"❗ Erro ao gravar lote de {len(lote)} itens: {e}")
+
+    # Um erro inesperado num escritor para o produtor e esvazia a fila até o _FIM
+    # deste escritor (senão o produtor fica preso no put); executar() o relança.
+    # Compras descartadas assim ficam em_andamento no checkpoint, para o resume.
+    def _escrever(self):
+        try:
+            restante = self._escrever_lotes()
+        except BaseException as e:
+            self._falhar(e)
+            while self._fila.get() is not _FIM:
+                pass
+            return
+        if any(restante):
+            self._gravar(*restante)
+
+    def _escrever_lotes(self):
+        lote, compras_lote, falhas_lote = [], {}, {}
+        inicio_lote = None
+
+        while True:
+            espera = None
+            if inicio_lote is not None:
+                espera = max(0.0, inicio_lote + self.intervalo_lote - time.monotonic())
+            try:
+                resultado = self._fila.get(timeout=espera)
+            except queue.Empty:
+                resultado = None
+            if resultado is _FIM:
+                break
+
+            if resultado is not None:
+                compra, itens, erro = resultado
+                numero_controle_pncp, cnpj, sequencial, _ = compra
+                with self._lock:
+                    self.total_compras += 1
+                if inicio_lote is None:
+                    inicio_lote = time.monotonic()
+
+                if itens is not None and self.zona_pouso is not None:
+                    # A zona de pouso é uma cópia: se falhar (disco cheio, permissão),
+                    # a compra segue para a gravação no banco
+                    try:
+                        self.zona_pouso.gravar(compra, itens)
+                    except Exception as e:
+                        self.registrar(
+                            "erro",
+                            f"❗ Erro ao gravar na zona de pouso a compra {numero_controle_pncp}: {e}",
+                        )
+
+                if itens is None:
+                    # Falha já exibida pelo coletor; fica no checkpoint (resume) e na fila de falhas
+                    COMPRAS.inc(resultado="falha")
+                    falhas_lote[numero_controle_pncp] = erro
+                elif itens:
+                    COMPRAS.inc(resultado="coletada")
+                    ITENS_COLETADOS.inc(len(itens))
+                    self.registrar(
+                        "sucesso",
+                        f"✅ {len(itens)} itens coletados para CNPJ {cnpj} - Sequencial {sequencial}",
+                    )
+                    compras_lote[numero_controle_pncp] = len(itens)
+                    lote.extend(completar_itens(compra, itens))
+                else:
+                    COMPRAS.inc(resultado="vazia")
+                    self.registrar(
+                        "aviso",
+                        f"⚠️ Nenhum item encontrado para CNPJ {cnpj} - Sequencial {sequencial}",
+                    )
+                    compras_lote[numero_controle_pncp] = 0
+
+            if inicio_lote is not None and (
+                len(lote) >= self.tamanho_lote
+                or time.monotonic() - inicio_lote >= self.intervalo_lote
+            ):
+                self._gravar(lote, compras_lote, falhas_lote)
+                lote, compras_lote, falhas_lote = [], {}, {}
+                inicio_lote = None
+
+        # O que sobrou é gravado por _escrever, depois do _FIM
+        return lote, compras_lote, falhas_lote
+
+    # 🔹 Roda o pipeline até esgotar as compras; retorna quantas compras passaram por ele
+    def executar(self, compras):
+        threads = [
+            threading.Thread(
+                target=self._produzir, args=(compras,), name="pncp-produtor"
+            )
+        ]
+        threads += [
+            threading.Thread(target=self._escrever, name=f"pncp-escritor-{i}")
+            for i in range(self.escritores)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        finally:
+            if self.zona_pouso is not None:
+                self.zona_pouso.fechar()
+
+        if self._erro is not None:
+            raise self._erro
+        return self.total_compras
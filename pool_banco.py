@@ -0,0 +1,190 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from psycopg2 import extensions
+
+# Configuração do pool (variáveis de ambiente)
+POOL_MIN = int(os.getenv("PNCP_DB_POOL_MIN", "1"))
+POOL_MAX = int(os.getenv("PNCP_DB_POOL_MAX", "8"))
+POOL_MAX_USOS = int(os.getenv("PNCP_DB_POOL_MAX_USOS", "500"))
+# Conexões paradas há mais que isso passam por um SELECT 1 antes de serem entregues
+POOL_VERIFICAR_APOS = float(os.getenv("PNCP_DB_POOL_VERIFICAR_APOS", "30"))
+POOL_TIMEOUT = float(os.getenv("PNCP_DB_POOL_TIMEOUT", "60"))
+
+
+class ErroPoolConexoes(Exception):
+    pass
+
+
+class _ConexaoPool:
+    def __init__(self, conexao):
+        self.conexao = conexao
+        self.usos = 0
+        self.ultimo_uso = time.monotonic()
+
+
+# 🔹 Pool de conexões PostgreSQL compartilhado entre threads
+# fabrica: função sem argumentos que abre uma conexão nova (ex.: conectar_banco)
+class PoolConexoes:
+    def __init__(
+        self,
+        fabrica,
+        tamanho_min=POOL_MIN,
+        tamanho_max=POOL_MAX,
+        max_usos=POOL_MAX_USOS,
+        verificar_apos=POOL_VERIFICAR_APOS,
+        timeout=POOL_TIMEOUT,
+    ):
+        self.fabrica = fabrica
+        self.tamanho_min = tamanho_min
+        self.tamanho_max = tamanho_max
+        self.max_usos = max_usos
+        self.verificar_apos = verificar_apos
+        self.timeout = timeout
+        self._livres = []
+        self._em_uso = {}
+        self._total = 0
+        self._preenchido = False
+        self._condicao = threading.Condition()
+
+    def _criar(self):
+        conexao = self.fabrica()
+        if conexao is None:
+            raise ErroPoolConexoes("Não foi possível abrir conexão com o banco.")
+        return _ConexaoPool(conexao)
+
+    def _fechar(self, item):
+        try:
+            item.conexao.close()
+        except Exception:
+            pass
+
+    # Conexão fechada ou que não responde a SELECT 1 é descartada
+    def _saudavel(self, item):
+        if item.conexao.closed:
+            return False
+        if time.monotonic() - item.ultimo_uso < self.verificar_apos:
+            return True
+        try:
+            cursor = item.conexao.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            item.conexao.rollback()
+            return True
+        except Exception:
+            return False
+
+    # Abre as conexões mínimas só no primeiro uso (importar o módulo não conecta)
+    def _preencher(self):
+        with self._condicao:
+            if self._preenchido:
+                return
+            self._preenchido = True
+            faltam = self.tamanho_min - self._total
+            self._total += max(faltam, 0)
+        novos = []
+        try:
+            for _ in range(max(faltam, 0)):
+                novos.append(self._criar())
+        finally:
+            with self._condicao:
+                self._total -= max(faltam, 0) - len(novos)
+                self._livres.extend(novos)
+                self._condicao.notify_all()
+
+    # 🔹 Empresta uma conexão; espera até `timeout` segundos se o pool estiver cheio
+    def obter(self):
+        self._preencher()
+        limite = time.monotonic() + self.timeout
+
+        while True:
+            with self._condicao:
+                while not self._livres and self._total >= self.tamanho_max:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        raise ErroPoolConexoes(
+                            f"Nenhuma conexão livre após {self.timeout}s."
+                        )
+                    self._condicao.wait(restante)
+
+                if self._livres:
+                    item = self._livres.pop()
+                else:
+                    item = None
+                    self._total += 1
+
+            if item is None:
+                try:
+                    item = self._criar()
+                except Exception:
+                    with self._condicao:
+                        self._total -= 1
+                        self._condicao.notify()
+                    raise
+            elif not self._saudavel(item):
+                self._fechar(item)
+                with self._condicao:
+                    self._total -= 1
+                    self._condicao.notify()
+                continue
+
+            item.usos += 1
+            with self._condicao:
+                self._em_uso[id(item.conexao)] = item
+            return item.conexao
+
+    # 🔹 Devolve a conexão ao pool; recicla após `max_usos` empréstimos
+    def devolver(self, conexao, descartar=False):
+        with self._condicao:
+            item = self._em_uso.pop(id(conexao), None)
+        if item is None:
+            return
+
+        if not descartar and not conexao.closed:
+            try:
+                if (
+                    conexao.get_transaction_status()
+                    != extensions.TRANSACTION_STATUS_IDLE
+                ):
+                    conexao.rollback()
+            except Exception:
+                descartar = True
+
+        if descartar or conexao.closed or item.usos >= self.max_usos:
+            self._fechar(item)
+            with self._condicao:
+                self._total -= 1
+                self._condicao.notify()
+            return
+
+        item.ultimo_uso = time.monotonic()
+        with self._condicao:
+            self._livres.append(item)
+            self._condicao.notify()
+
+    # 🔹 Uso com `with pool.conexao() as conexao:`; desfaz a transação se houver erro
+    @contextmanager
+    def conexao(self):
+        conexao = self.obter()
+        try:
+            yield conexao
+        except Exception:
+            try:
+                conexao.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            self.devolver(conexao)
+
+    # 🔹 Fecha as conexões livres do pool
+    def fechar_todas(self):
+        with self._condicao:
+            livres, self._livres = self._livres, []
+            self._total -= len(livres)
+            self._preenchido = False
+        for item in livres:
+            self._fechar(item)
@@ -0,0 +1,103 @@
+import os
+
+from psycopg2.extras import execute_values
+
+TABELA_SINCRONIZACAO = "pncp.contratacao_itens_sincronizacao"
+
+# Compras sincronizadas há mais de SYNC_TTL_DIAS são revisitadas, mas só as dos
+# últimos SYNC_ANOS_REVALIDAR anos (itens de compras antigas praticamente não mudam)
+SYNC_TTL_DIAS = int(os.getenv("PNCP_SYNC_TTL_DIAS", "7"))
+SYNC_ANOS_REVALIDAR = int(os.getenv("PNCP_SYNC_ANOS_REVALIDAR", "1"))
+
+# Linhas trazidas por ida ao banco pelo cursor de servidor da lista de trabalho
+ITERSIZE_COMPRAS = int(os.getenv("PNCP_ITERSIZE_COMPRAS", "2000"))
+
+SQL_CRIAR_SINCRONIZACAO = f"""
+    CREATE TABLE IF NOT EXISTS {TABELA_SINCRONIZACAO} (
+        numero_controle_pncp text PRIMARY KEY,
+        ultima_sincronizacao timestamptz NOT NULL DEFAULT now(),
+        quantidade_itens integer NOT NULL
+    )
+"""
+
+# Modo --full: todas as compras não federais
+SQL_COMPRAS_TODAS = """
+    SELECT DISTINCT numero_controle_pncp, orgao_cnpj, sequencial_compra, ano_compra
+    FROM pncp.contratacoes_publicas
+    WHERE orgao_esfera_id <> 'F'
+"""
+
+# Modo incremental: compras novas (sem itens e sem estado), vencidas pelo TTL,
+# ou com menos itens gravados do que a última coleta encontrou. A última conferência
+# só vale quando a tabela de itens é onde os itens ficam (%(conferir_itens)s): com a
+# saída só em Parquet ela fica vazia, e toda compra com itens pareceria incompleta.
+SQL_COMPRAS_INCREMENTAL = f"""
+    SELECT DISTINCT cp.numero_controle_pncp, cp.orgao_cnpj, cp.sequencial_compra, cp.ano_compra
+    FROM pncp.contratacoes_publicas cp
+    LEFT JOIN {TABELA_SINCRONIZACAO} s
+           ON s.numero_controle_pncp = cp.numero_controle_pncp
+    WHERE cp.orgao_esfera_id <> 'F'
+      AND (
+            (s.numero_controle_pncp IS NULL
+             AND NOT EXISTS (
+                 SELECT 1 FROM pncp.contratacao_itens_pncp i
+                 WHERE i.numero_controle_pncp = cp.numero_controle_pncp
+             ))
+         OR (%(ttl_dias)s > 0
+             AND s.ultima_sincronizacao < now() - make_interval(days => %(ttl_dias)s)
+             AND cp.ano_compra::int >= extract(year FROM now())::int - %(anos_revalidar)s)
+         OR (%(conferir_itens)s
+             AND s.quantidade_itens > (
+                 SELECT count(*) FROM pncp.contratacao_itens_pncp i
+                 WHERE i.numero_controle_pncp = cp.numero_controle_pncp
+             ))
+      )
+"""
+
+
+def garantir_tabela(cursor):
+    cursor.execute(SQL_CRIAR_SINCRONIZACAO)
+
+
+# 🔹 Query e parâmetros da lista de trabalho, conforme o modo
+# conferir_itens=False quando os itens não vão para o Postgres (PNCP_SAIDA=parquet)
+def query_compras(completo=False, conferir_itens=True):
+    if completo:
+        return SQL_COMPRAS_TODAS, None
+    return SQL_COMPRAS_INCREMENTAL, {
+        "ttl_dias": SYNC_TTL_DIAS,
+        "anos_revalidar": SYNC_ANOS_REVALIDAR,
+        "conferir_itens": conferir_itens,
+    }
+
+
+# 🔹 Restringe a lista de trabalho a um shard: hash estável (md5) do orgao_cnpj módulo total_shards
+# Todas as compras de um mesmo órgão caem sempre no mesmo shard.
+def filtrar_shard(query, parametros, shard, total_shards):
+    parametros = dict(parametros or {})
+    parametros.update({"shard": shard, "total_shards": total_shards})
+    query = f"""
+        SELECT s.*
+        FROM ({query}) s
+        WHERE mod(('x' || substr(md5(s.orgao_cnpj::text), 1, 7))::bit(28)::int,
+                  %(total_shards)s) = %(shard)s
+    """
+    return query, parametros
+
+
+# 🔹 Grava a última sincronização de cada compra (numero_controle_pncp -> quantidade de itens)
+# Não faz commit: deve ir na mesma transação dos itens.
+def registrar_sincronizacao(cursor, compras):
+    if not compras:
+        return
+    execute_values(
+        cursor,
+        f"""
+        INSERT INTO {TABELA_SINCRONIZACAO} (numero_controle_pncp, quantidade_itens)
+        VALUES %s
+        ON CONFLICT (numero_controle_pncp) DO UPDATE
+           SET quantidade_itens = EXCLUDED.quantidade_itens,
+               ultima_sincronizacao = now()
+        """,
+        list(compras.items()),
+    )
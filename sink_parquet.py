@@ -0,0 +1,279 @@
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from carga_bulk import TABELA_DESTINO
+from colunas import COLUNAS_DESTINO, ESPECIFICACAO, Extrator
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow é opcional: só é necessário para a saída em Parquet
+    pa = None
+    pq = None
+
+# Configuração da saída (variáveis de ambiente)
+# PNCP_SAIDA: "postgres" (padrão), "parquet" ou "ambos"
+SAIDA = os.getenv("PNCP_SAIDA", "postgres")
+DIRETORIO_PARQUET = os.getenv(
+    "PNCP_PARQUET_DIRETORIO",
+    os.path.join(os.path.expanduser("~"), "pncp_itens", "parquet"),
+)
+# Exportações da tabela: cada uma num subdiretório novo (um retrato por data e hora),
+# separado da saída da coleta
+DIRETORIO_EXPORTACAO = os.getenv(
+    "PNCP_PARQUET_EXPORTACAO",
+    os.path.join(os.path.expanduser("~"), "pncp_itens", "exportacao"),
+)
+# Linhas por row group (cada partição acumula até isso antes de gravar)
+LINHAS_POR_GRUPO = int(os.getenv("PNCP_PARQUET_GRUPO_LINHAS", "50000"))
+# Teto de linhas em memória somando todas as partições
+MAX_LINHAS_MEMORIA = int(os.getenv("PNCP_PARQUET_MAX_LINHAS", "500000"))
+# Arquivos abertos ao mesmo tempo; o menos usado é fechado ao passar disso
+MAX_ARQUIVOS_ABERTOS = int(os.getenv("PNCP_PARQUET_MAX_ABERTOS", "64"))
+COMPRESSAO = os.getenv("PNCP_PARQUET_COMPRESSAO", "zstd")
+# Valores (decimal no banco) gravados como decimal128(38, escala): sem arredondamento
+# binário; casas além da escala são arredondadas (meio para o par)
+PRECISAO_DECIMAL = 38
+ESCALA_DECIMAL = int(os.getenv("PNCP_PARQUET_ESCALA_DECIMAL", "4"))
+QUANTUM_DECIMAL = Decimal(1).scaleb(-ESCALA_DECIMAL)
+
+# Colunas de nomes/descrições muito repetidas: gravadas com dicionário
+COLUNAS_DICIONARIO = [
+    "materialouservico",
+    "materialouserviconome",
+    "unidademedida",
+    "itemcategorianome",
+    "criteriojulgamentonome",
+    "situacaocompraitemnome",
+    "tipobeneficionome",
+    "ncmnbscodigo",
+    "ncmnbsdescricao",
+    "catalogo",
+    "categoriaitemcatalogo",
+]
+
+SUFIXO_PARCIAL = ".parcial"
+
+# Exportação da tabela existente: itens com o ano da compra (um ano por compra)
+SQL_EXPORTAR = f"""
+    SELECT {", ".join("i." + coluna for coluna in COLUNAS_DESTINO)}, cp.ano_compra
+    FROM {TABELA_DESTINO} i
+    LEFT JOIN (
+        SELECT DISTINCT ON (numero_controle_pncp) numero_controle_pncp, ano_compra
+        FROM pncp.contratacoes_publicas
+        ORDER BY numero_controle_pncp
+    ) cp ON cp.numero_controle_pncp = i.numero_controle_pncp
+"""
+
+# O ano da compra não faz parte do item; vem da compra (ver completar_itens)
+EXTRATOR_PARQUET = Extrator(ESPECIFICACAO + [("ano_compra", "ano_compra", "inteiro")])
+
+# Colunas de partição: ficam só no caminho dos arquivos, como no write_dataset do Arrow
+COLUNAS_PARTICAO = ["ano_compra", "orgao_cnpj"]
+ESPECIFICACAO_ARQUIVO = [
+    (chave, coluna, tipo)
+    for chave, coluna, tipo in EXTRATOR_PARQUET.especificacao
+    if coluna not in COLUNAS_PARTICAO
+]
+
+
+def _tipo_arrow(tipo):
+    return {
+        "texto": pa.string(),
+        "inteiro": pa.int64(),
+        "decimal": pa.decimal128(PRECISAO_DECIMAL, ESCALA_DECIMAL),
+        "booleano": pa.bool_(),
+        "data": pa.timestamp("s"),
+    }[tipo]
+
+
+def _converter(valor, tipo):
+    try:
+        if tipo == "texto":
+            return str(valor)
+        if tipo == "inteiro":
+            return int(valor)
+        if tipo == "decimal":
+            # str() de float dá o número curto (0.1, não 0.1000000000000000055...)
+            numero = Decimal(str(valor))
+            return numero.quantize(QUANTUM_DECIMAL) if numero.is_finite() else None
+        if tipo == "booleano":
+            return valor if isinstance(valor, bool) else None
+        if tipo == "data":
+            if isinstance(valor, datetime):
+                return valor
+            return datetime.fromisoformat(str(valor))
+    except (TypeError, ValueError, InvalidOperation):
+        return None
+    return None
+
+
+# 🔹 Coluna Arrow do tipo da especificação; valores que não convertem viram nulo
+def _array(valores, tipo):
+    tipo_arrow = _tipo_arrow(tipo)
+    try:
+        return pa.array(valores, type=tipo_arrow)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError):
+        return pa.array(
+            [None if v is None else _converter(v, tipo) for v in valores],
+            type=tipo_arrow,
+        )
+
+
+def _valor_particao(valor):
+    return "sem_valor" if valor in (None, "") else str(valor).replace("/", "_")
+
+
+# 🔹 Grava itens em Parquet particionado (ano_compra=.../orgao_cnpj=...), estilo Hive
+# Cada partição acumula linhas até LINHAS_POR_GRUPO e grava um row group no arquivo
+# aberto dela. Os arquivos só recebem o nome final (.parquet) quando fechados.
+# Seguro entre threads.
+class SinkParquet:
+    def __init__(
+        self,
+        diretorio=DIRETORIO_PARQUET,
+        linhas_por_grupo=LINHAS_POR_GRUPO,
+        max_linhas_memoria=MAX_LINHAS_MEMORIA,
+        max_arquivos_abertos=MAX_ARQUIVOS_ABERTOS,
+        compressao=COMPRESSAO,
+    ):
+        if pa is None:
+            raise ImportError(
+                "pyarrow é necessário para a saída em Parquet "
+                "(pip install -r requirements-opcionais.txt)"
+            )
+        self.diretorio = diretorio
+        self.linhas_por_grupo = linhas_por_grupo
+        self.max_linhas_memoria = max_linhas_memoria
+        self.max_arquivos_abertos = max_arquivos_abertos
+        self.compressao = compressao
+        self.esquema = pa.schema(
+            [(coluna, _tipo_arrow(tipo)) for _, coluna, tipo in ESPECIFICACAO_ARQUIVO]
+        )
+        self._buffers = {}
+        self._linhas_em_memoria = 0
+        self._abertos = OrderedDict()  # particao -> (writer, caminho)
+        self._lock = threading.Lock()
+
+    def gravar(self, registros):
+        with self._lock:
+            for registro in registros:
+                particao = (
+                    _valor_particao(registro.get("ano_compra")),
+                    _valor_particao(registro.get("orgao_cnpj")),
+                )
+                buffer = self._buffers.setdefault(particao, [])
+                buffer.append(registro)
+                self._linhas_em_memoria += 1
+                if len(buffer) >= self.linhas_por_grupo:
+                    self._descarregar(particao)
+
+            while self._linhas_em_memoria > self.max_linhas_memoria:
+                maior = max(self._buffers, key=lambda p: len(self._buffers[p]))
+                self._descarregar(maior)
+
+    def _descarregar(self, particao):
+        registros = self._buffers.pop(particao, None)
+        if not registros:
+            return
+        self._linhas_em_memoria -= len(registros)
+
+        colunas = EXTRATOR_PARQUET.em_colunas(registros)
+        tabela = pa.Table.from_arrays(
+            [_array(colunas[coluna], tipo) for _, coluna, tipo in ESPECIFICACAO_ARQUIVO],
+            schema=self.esquema,
+        )
+        self._writer(particao).write_table(tabela, row_group_size=len(registros))
+
+    def _writer(self, particao):
+        if particao in self._abertos:
+            self._abertos.move_to_end(particao)
+            return self._abertos[particao][0]
+
+        while len(self._abertos) >= self.max_arquivos_abertos:
+            self._fechar_arquivo(next(iter(self._abertos)))
+
+        ano, cnpj = particao
+        pasta = os.path.join(self.diretorio, f"ano_compra={ano}", f"orgao_cnpj={cnpj}")
+        os.makedirs(pasta, exist_ok=True)
+        caminho = os.path.join(
+            pasta,
+            "part-{}-{}.parquet".format(
+                datetime.now().strftime("%Y%m%dT%H%M%S%f"), uuid.uuid4().hex[:8]
+            ),
+        )
+        writer = pq.ParquetWriter(
+            caminho + SUFIXO_PARCIAL,
+            self.esquema,
+            compression=self.compressao,
+            use_dictionary=COLUNAS_DICIONARIO,
+        )
+        self._abertos[particao] = (writer, caminho)
+        return writer
+
+    def _fechar_arquivo(self, particao):
+        writer, caminho = self._abertos.pop(particao)
+        writer.close()
+        os.replace(caminho + SUFIXO_PARCIAL, caminho)
+
+    # Grava o que está em memória e fecha todos os arquivos
+    def fechar(self):
+        with self._lock:
+            for particao in list(self._buffers):
+                self._descarregar(particao)
+            for particao in list(self._abertos):
+                self._fechar_arquivo(particao)
+
+
+# 🔹 Exporta a tabela de itens para o mesmo layout, em streaming (cursor de servidor)
+# Retorna quantas linhas foram exportadas. Não faz commit.
+def exportar_tabela(conexao, diretorio=DIRETORIO_PARQUET, itersize=10000):
+    # A exportação é um retrato da tabela inteira: num diretório com arquivos (de
+    # outra exportação ou da coleta), os itens ficariam duplicados
+    if os.path.isdir(diretorio) and os.listdir(diretorio):
+        raise FileExistsError(
+            f"{diretorio} não está vazio; exporte para um diretório novo"
+        )
+    sink = SinkParquet(diretorio)
+    total = 0
+    cursor = conexao.cursor(name="exportar_itens_pncp")
+    try:
+        cursor.execute(SQL_EXPORTAR)
+        while True:
+            linhas = cursor.fetchmany(itersize)
+            if not linhas:
+                break
+            sink.gravar([dict(zip(EXTRATOR_PARQUET.chaves, linha)) for linha in linhas])
+            total += len(linhas)
+    finally:
+        cursor.close()
+        sink.fechar()
+    return total
+
+
+# 🔹 Diretório novo para uma exportação: DIRETORIO_EXPORTACAO/AAAAMMDDTHHMMSS
+def diretorio_exportacao(base=DIRETORIO_EXPORTACAO):
+    return os.path.join(base, datetime.now().strftime("%Y%m%dT%H%M%S"))
+
+
+# 🔹 Abre o diretório como dataset Arrow, com os tipos certos das partições
+# (sem isso o Arrow infere orgao_cnpj como número e perde os zeros à esquerda)
+def abrir_dataset(diretorio=DIRETORIO_PARQUET):
+    import pyarrow.dataset as ds
+
+    particionamento = ds.partitioning(
+        pa.schema([("ano_compra", pa.int64()), ("orgao_cnpj", pa.string())]),
+        flavor="hive",
+    )
+    return ds.dataset(diretorio, format="parquet", partitioning=particionamento)
+
+
+# 🔹 Sink conforme PNCP_SAIDA; None quando a saída é só o Postgres
+def obter_sink_parquet():
+    if SAIDA not in ("parquet", "ambos"):
+        return None
+    return SinkParquet()
@@ -0,0 +1,153 @@
+import os
+
+import pytest
+import requests
+
+import cliente_http
+from cache_http import CacheRespostas
+from cliente_http import ErroRequisicaoPNCP
+
+URL = "https://pncp.gov.br/api/pncp/v1/orgaos/123/compras/2024/1/itens"
+
+
+def _resposta(status=200, corpo=b"[]", cabecalhos=None):
+    response = requests.Response()
+    response.status_code = status
+    response._content = corpo
+    response.headers.update(cabecalhos or {})
+    return response
+
+
+# Rede falsa: devolve as respostas da lista, na ordem, e guarda os cabeçalhos enviados
+class RedeFalsa:
+    def __init__(self, *respostas):
+        self.respostas = list(respostas)
+        self.chamadas = []
+
+    def __call__(self, url, params=None, headers=None):
+        self.chamadas.append(dict(headers or {}))
+        return self.respostas.pop(0)
+
+
+@pytest.fixture
+def usar_cache(tmp_path, monkeypatch):
+    def configurar(rede, **opcoes):
+        cache = CacheRespostas(caminho=str(tmp_path / "respostas.sqlite"), **opcoes)
+        monkeypatch.setattr(cliente_http, "obter_cache", lambda: cache)
+        monkeypatch.setattr(cliente_http, "requisitar_rede", rede)
+        return cache
+
+    return configurar
+
+
+def test_entrada_fresca_nao_vai_a_rede(usar_cache):
+    rede = RedeFalsa(_resposta(corpo=b'[{"numeroItem": 1}]'))
+    usar_cache(rede, ttl_horas=1)
+
+    primeira = cliente_http.requisitar(URL, {"pagina": 1})
+    segunda = cliente_http.requisitar(URL, {"pagina": 1})
+
+    assert len(rede.chamadas) == 1
+    assert segunda.status_code == 200
+    assert segunda.json() == primeira.json() == [{"numeroItem": 1}]
+    assert segunda.headers["X-Cache"] == "HIT"
+
+
+def test_status_nao_cacheavel_nao_e_guardado(usar_cache):
+    rede = RedeFalsa(_resposta(status=500), _resposta())
+    usar_cache(rede, ttl_horas=1)
+
+    assert cliente_http.requisitar(URL).status_code == 500
+    assert cliente_http.requisitar(URL).status_code == 200
+    assert len(rede.chamadas) == 2
+
+
+def test_entrada_vencida_e_revalidada_e_renovada_com_304(usar_cache):
+    cabecalhos = {"ETag": '"v1"', "Last-Modified": "Tue, 02 Jan 2024 10:00:00 GMT"}
+    rede = RedeFalsa(
+        _resposta(corpo=b'[{"numeroItem": 1}]', cabecalhos=cabecalhos),
+        _resposta(status=304, corpo=b""),
+    )
+    cache = usar_cache(rede, ttl_horas=0)
+
+    cliente_http.requisitar(URL)
+    revalidada = cliente_http.requisitar(URL)
+
+    assert rede.chamadas[1] == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": "Tue, 02 Jan 2024 10:00:00 GMT",
+    }
+    assert revalidada.status_code == 200
+    assert revalidada.json() == [{"numeroItem": 1}]
+
+    # O 304 renova a entrada: com TTL, ela volta a ser fresca
+    cache.ttl = 3600
+    assert cache.buscar(cache.chave(URL)).fresca
+
+
+def test_entrada_vencida_com_conteudo_novo_e_substituida(usar_cache):
+    rede = RedeFalsa(
+        _resposta(corpo=b"[1]", cabecalhos={"ETag": '"v1"'}),
+        _resposta(corpo=b"[1, 2]", cabecalhos={"ETag": '"v2"'}),
+    )
+    cache = usar_cache(rede, ttl_horas=0)
+
+    cliente_http.requisitar(URL)
+    assert cliente_http.requisitar(URL).json() == [1, 2]
+
+    entrada = cache.buscar(cache.chave(URL))
+    assert entrada.corpo == b"[1, 2]"
+    assert entrada.etag == '"v2"'
+
+
+def test_somente_cache_sem_entrada_levanta_erro(usar_cache):
+    rede = RedeFalsa()
+    usar_cache(rede, somente_cache=True)
+
+    with pytest.raises(ErroRequisicaoPNCP):
+        cliente_http.requisitar(URL)
+    assert rede.chamadas == []
+
+
+def test_somente_cache_usa_entrada_vencida(usar_cache):
+    rede = RedeFalsa(_resposta(corpo=b"[7]"))
+    cache = usar_cache(rede, ttl_horas=0)
+    cliente_http.requisitar(URL)
+
+    cache.somente_cache = True
+    assert cliente_http.requisitar(URL).json() == [7]
+    assert len(rede.chamadas) == 1
+
+
+def test_limpar_remove_as_menos_acessadas_acima_do_tamanho(tmp_path):
+    # Corpos aleatórios não comprimem: ~1 KB por entrada, teto de 3 KB
+    cache = CacheRespostas(
+        caminho=str(tmp_path / "respostas.sqlite"), ttl_horas=1, max_mb=3 / 1024
+    )
+    for i in range(5):
+        cache.guardar(f"{URL}/{i}", _resposta(corpo=os.urandom(1000)))
+    # Ordem de acesso: 3, 1, 4, 0, 2 (do mais antigo ao mais recente)
+    for ordem, i in enumerate([3, 1, 4, 0, 2]):
+        cache._conexao.execute(
+            "UPDATE respostas SET acessado_em = ? WHERE url = ?", (ordem, f"{URL}/{i}")
+        )
+
+    cache._limpar()
+
+    restantes = {
+        url for (url,) in cache._conexao.execute("SELECT url FROM respostas")
+    }
+    assert restantes == {f"{URL}/0", f"{URL}/2"}
+    tamanho = cache._conexao.execute("SELECT sum(tamanho) FROM respostas").fetchone()[0]
+    assert tamanho <= cache.max_bytes * 0.9
+
+
+def test_limpar_remove_vencidas_sem_validadores(tmp_path):
+    cache = CacheRespostas(caminho=str(tmp_path / "respostas.sqlite"), ttl_horas=0)
+    cache.guardar(f"{URL}/sem", _resposta())
+    cache.guardar(f"{URL}/com", _resposta(cabecalhos={"ETag": '"v1"'}))
+
+    cache._limpar()
+
+    assert cache.buscar(f"{URL}/sem") is None
+    assert cache.buscar(f"{URL}/com") is not None
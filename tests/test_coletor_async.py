@@ -0,0 +1,100 @@
+import asyncio
+import re
+
+import cliente_http
+from coletor_async import ColetorAsync, url_item
+
+
+# API falsa: `total` itens, páginas de no máximo `limite` itens (o tamanhoPagina
+# pedido acima disso é ignorado, como numa API que limita o tamanho)
+def _api(total, limite):
+    requisicoes = []
+
+    async def get(url, params=None):
+        requisicoes.append((url, params))
+        if params is None:
+            numero = int(re.search(r"/itens/(\d+)$", url).group(1))
+            return (200, {"numeroItem": numero}) if numero <= total else (404, None)
+        tamanho = min(params["tamanhoPagina"], limite)
+        inicio = (params["pagina"] - 1) * tamanho
+        itens = [{"numeroItem": n} for n in range(inicio + 1, min(inicio + tamanho, total) + 1)]
+        return (200, itens) if itens else (204, None)
+
+    return get, requisicoes
+
+
+def _paginado(coletor, sequencial=1):
+    return asyncio.run(coletor.buscar_itens_paginado("123", 2024, sequencial))
+
+
+def test_fechar_remove_o_observador_do_controlador():
+    antes = list(cliente_http._observadores)
+    coletores = [ColetorAsync(concorrencia="adaptativa") for _ in range(3)]
+    assert len(cliente_http._observadores) == len(antes) + 3
+
+    for coletor in coletores:
+        coletor.fechar()
+
+    assert cliente_http._observadores == antes
+    assert all(coletor._executor._shutdown for coletor in coletores)
+
+
+def test_fechar_sem_controlador():
+    antes = list(cliente_http._observadores)
+    coletor = ColetorAsync(concorrencia="fixa")
+    coletor.fechar()
+
+    assert cliente_http._observadores == antes
+
+
+def test_teto_do_controlador_e_o_limite_por_host():
+    coletor = ColetorAsync(
+        limite_global=32, limite_por_host=16, concorrencia="adaptativa"
+    )
+    try:
+        controlador = coletor.controlador
+        assert controlador.maximo == 16
+        controlador.espera_aumento = 0
+        for _ in range(5000):
+            controlador.observar(0.01, 200)
+        assert controlador.limite == 16
+    finally:
+        coletor.fechar()
+
+
+def test_teto_do_controlador_e_o_limite_global_quando_menor():
+    coletor = ColetorAsync(
+        limite_global=8, limite_por_host=16, concorrencia="adaptativa"
+    )
+    try:
+        assert coletor.controlador.maximo == 8
+    finally:
+        coletor.fechar()
+
+
+def test_paginado_nao_trunca_quando_a_api_limita_o_tamanho_da_pagina():
+    coletor = ColetorAsync(tamanho_pagina=500, concorrencia="fixa")
+    try:
+        coletor._get, requisicoes = _api(total=120, limite=50)
+        itens = _paginado(coletor)
+
+        assert [item["numeroItem"] for item in itens] == list(range(1, 121))
+        assert coletor.tamanho_pagina == 50
+
+        # Tamanho já confirmado: a próxima compra não precisa da requisição extra
+        coletor._get, requisicoes = _api(total=30, limite=50)
+        assert len(_paginado(coletor, 2)) == 30
+        assert len(requisicoes) == 1
+    finally:
+        coletor.fechar()
+
+
+def test_paginado_confirma_o_fim_de_pagina_curta_pelo_item_seguinte():
+    coletor = ColetorAsync(tamanho_pagina=500, concorrencia="fixa")
+    try:
+        coletor._get, requisicoes = _api(total=7, limite=500)
+        assert len(_paginado(coletor)) == 7
+        assert requisicoes[-1] == (url_item("123", 2024, 1, 8), None)
+        assert coletor.tamanho_pagina == 500
+    finally:
+        coletor.fechar()
@@ -0,0 +1,146 @@
+import json
+import re
+from datetime import date, datetime
+from decimal import Decimal
+
+from colunas import EXTRATOR, Extrator, _copy
+
+ESPECIFICACAO = [
+    ("nome", "nome", "texto"),
+    ("numero", "numero", "inteiro"),
+    ("valor", "valor", "decimal"),
+    ("ativo", "ativo", "booleano"),
+    ("quando", "quando", "data"),
+]
+EXTRATOR_TESTE = Extrator(ESPECIFICACAO)
+
+_ESCAPES = {"\\\\": "\\", "\\t": "\t", "\\n": "\n", "\\r": "\r"}
+
+
+# Lê uma linha no formato texto do COPY como o Postgres: campos separados por tab,
+# \N é nulo e as sequências com barra voltam ao caractere original
+def _ler_copy(linha):
+    assert linha.endswith("\n")
+    campos = linha[:-1].split("\t")
+    return [
+        None
+        if campo == r"\N"
+        else re.sub(r"\\[\\tnr]", lambda m: _ESCAPES[m.group(0)], campo)
+        for campo in campos
+    ]
+
+
+def test_copy_escapa_tab_quebra_de_linha_cr_e_barra():
+    texto = "a\tb\nc\rd\\e"
+    escapado = _copy(texto)
+
+    assert escapado == "a\\tb\\nc\\rd\\\\e"
+    assert "\t" not in escapado and "\n" not in escapado and "\r" not in escapado
+
+
+def test_copy_de_nulo_booleano_e_numeros():
+    assert _copy(None) == r"\N"
+    assert _copy(True) == "t"
+    assert _copy(False) == "f"
+    assert _copy(7) == "7"
+    assert _copy(Decimal("10.50")) == "10.50"
+
+
+def test_texto_literal_com_barra_n_nao_vira_nulo():
+    linha = EXTRATOR_TESTE.linha_copy({"nome": r"\N"})
+
+    assert _ler_copy(linha)[0] == r"\N"
+
+
+def test_linha_copy_volta_aos_valores_originais():
+    registro = {
+        "nome": "linha 1\nlinha 2\tcom tab\r e barra \\ no fim\\",
+        "numero": "42",
+        "valor": " 10.5 ",
+        "ativo": "sim",
+        "quando": datetime(2024, 1, 2, 10, 0),
+    }
+    linha = EXTRATOR_TESTE.linha_copy(registro)
+
+    assert linha.count("\t") == len(ESPECIFICACAO) - 1
+    assert linha.count("\n") == 1
+    assert _ler_copy(linha) == [
+        registro["nome"],
+        "42",
+        "10.5",
+        "t",
+        "2024-01-02T10:00:00",
+    ]
+
+
+def test_linha_copy_de_registro_vazio_e_so_nulos():
+    linha = EXTRATOR_TESTE.linha_copy({})
+
+    assert linha == "\t".join([r"\N"] * len(ESPECIFICACAO)) + "\n"
+
+
+def test_tupla_converte_por_tipo():
+    registro = {
+        "nome": {"codigo": 1, "descrição": "ação"},
+        "numero": 3.0,
+        "valor": "",
+        "ativo": 0,
+        "quando": date(2024, 5, 6),
+    }
+
+    assert EXTRATOR_TESTE.tupla(registro) == (
+        json.dumps({"codigo": 1, "descrição": "ação"}, ensure_ascii=False),
+        3,
+        None,
+        False,
+        "2024-05-06",
+    )
+
+
+def test_dict_e_lista_viram_json_no_copy():
+    linha = EXTRATOR_TESTE.linha_copy({"nome": {"a": [1, "x\ty"]}})
+
+    assert json.loads(_ler_copy(linha)[0]) == {"a": [1, "x\ty"]}
+
+
+def test_valores_que_nao_convertem_seguem_como_vieram():
+    # O banco recusa a linha e ela vai para a fila de falhas
+    registro = {"numero": "12a", "valor": "abc", "ativo": "talvez", "quando": "ontem"}
+
+    assert EXTRATOR_TESTE.tupla(registro) == (None, "12a", "abc", "talvez", "ontem")
+    assert _ler_copy(EXTRATOR_TESTE.linha_copy(registro)) == [
+        None,
+        "12a",
+        "abc",
+        "talvez",
+        "ontem",
+    ]
+
+
+def test_booleanos_por_texto_e_inteiro():
+    valores = ["true", "T", "1", "S", "Sim", "false", "f", "0", "n", "Não", " ", 2, 0, None]
+    convertidos = [EXTRATOR_TESTE.tupla({"ativo": valor})[3] for valor in valores]
+
+    assert convertidos == [True] * 5 + [False] * 5 + [None, True, False, None]
+
+
+def test_em_colunas_igual_a_tupla_por_registro():
+    registros = [
+        {"nome": "a", "numero": "1", "ativo": "s"},
+        {"nome": None, "numero": 2, "valor": "3.5", "quando": "2024-01-01"},
+    ]
+    colunas = EXTRATOR_TESTE.em_colunas(registros)
+
+    assert list(colunas) == [coluna for _, coluna, _ in ESPECIFICACAO]
+    assert list(zip(*colunas.values())) == [
+        EXTRATOR_TESTE.tupla(registro) for registro in registros
+    ]
+
+
+def test_extrator_do_destino_cobre_todas_as_colunas():
+    registro = {"numero_controle_pncp": "c1", "numeroItem": "7", "descricao": "x\ty"}
+    campos = _ler_copy(EXTRATOR.linha_copy(registro))
+
+    assert len(campos) == len(EXTRATOR.colunas)
+    assert campos[EXTRATOR.colunas.index("numeroitem")] == "7"
+    assert campos[EXTRATOR.colunas.index("descricao")] == "x\ty"
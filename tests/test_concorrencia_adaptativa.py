@@ -0,0 +1,58 @@
+from concorrencia_adaptativa import ControladorAIMD
+
+
+def _limites(controlador, respostas):
+    limites = [controlador.limite]
+    for latencia, status in respostas:
+        controlador.observar(latencia, status)
+        limites.append(controlador.limite)
+    return limites
+
+
+def _nunca_sobe(limites):
+    return all(depois <= antes for antes, depois in zip(limites, limites[1:]))
+
+
+def test_rajada_de_429_nunca_aumenta_o_limite():
+    controlador = ControladorAIMD(minimo=2, maximo=32, inicial=16)
+    limites = _limites(controlador, [(0.05, 429)] * 500)
+
+    assert _nunca_sobe(limites)
+    assert controlador.limite < 16
+    assert controlador.aumentos == 0
+
+
+def test_429_misturados_com_sucessos_nunca_aumentam_o_limite():
+    # Um 429 a cada quatro respostas: as reduções seguintes caem no intervalo
+    # entre reduções, mas a janela registra os erros e o limite não volta a subir
+    controlador = ControladorAIMD(minimo=2, maximo=32, inicial=16)
+    respostas = [(0.05, 429 if i % 4 == 0 else 200) for i in range(2000)]
+    limites = _limites(controlador, respostas)
+
+    assert _nunca_sobe(limites)
+    assert controlador.ultima_taxa_erro > 0
+
+
+def test_timeouts_contam_como_erro_na_janela():
+    controlador = ControladorAIMD(minimo=2, maximo=32, inicial=8)
+    respostas = [(0.05, None if i % 3 == 0 else 200) for i in range(300)]
+    limites = _limites(controlador, respostas)
+
+    assert _nunca_sobe(limites)
+    assert controlador.ultima_taxa_erro > 0
+
+
+def test_sem_reducao_recente_janelas_saudaveis_aumentam():
+    controlador = ControladorAIMD(minimo=2, maximo=32, inicial=4)
+    _limites(controlador, [(0.05, 200)] * 100)
+
+    assert controlador.limite > 4
+
+
+def test_depois_de_uma_reducao_o_limite_espera_para_subir():
+    controlador = ControladorAIMD(minimo=2, maximo=32, inicial=16, espera_aumento=60)
+    controlador.observar(0.05, 429)
+    reduzido = controlador.limite
+    _limites(controlador, [(0.05, 200)] * 200)
+
+    assert controlador.limite == reduzido
@@ -0,0 +1,139 @@
+import hashlib
+
+from carga_bulk import hash_conteudo
+from indice_chaves import IndiceChaves, _impressao_hash, impressao
+from sincronizacao import SYNC_ANOS_REVALIDAR
+
+ANO = 2026
+RECENTE = ANO
+ANTIGO = ANO - SYNC_ANOS_REVALIDAR - 1
+
+
+def _hash(texto):
+    return hashlib.md5(texto.encode("utf-8")).hexdigest()
+
+
+# Monta o índice como carregar_indice: linhas na ordem do ORDER BY do banco
+# (impressão da compra como bigint, depois numeroitem)
+# itens: {numero_controle_pncp: {numero_item: hash_hex}}
+# sincronizadas: {numero_controle_pncp: (quantidade_itens, ttl_vencido)}
+def _indice(itens=None, sincronizadas=None, conferir_itens=True):
+    indice = IndiceChaves(conferir_itens)
+    indice._carregar_itens(
+        sorted(
+            (impressao(controle), numero, _impressao_hash(hash_hex))
+            for controle, por_numero in (itens or {}).items()
+            for numero, hash_hex in por_numero.items()
+        )
+    )
+    indice._carregar_sincronizacao(
+        sorted(
+            (impressao(controle), quantidade, vencida)
+            for controle, (quantidade, vencida) in (sincronizadas or {}).items()
+        )
+    )
+    return indice
+
+
+def _precisa(indice, controle, ano=RECENTE):
+    return indice.precisa_coletar((controle, "123", 1, ano), ANO)
+
+
+def test_compra_nova_sem_estado_e_sem_itens_e_coletada():
+    assert _precisa(_indice(), "nova")
+
+
+def test_compra_antiga_com_itens_e_sem_estado_nao_e_coletada():
+    # Itens gravados antes da tabela de sincronização existir
+    indice = _indice(itens={"legada": {1: _hash("a"), 2: _hash("b")}})
+
+    assert not _precisa(indice, "legada")
+
+
+def test_ttl_vencido_so_revisita_compras_recentes():
+    indice = _indice(
+        itens={"vencida": {1: _hash("a")}},
+        sincronizadas={"vencida": (1, True)},
+    )
+
+    assert _precisa(indice, "vencida", RECENTE)
+    assert not _precisa(indice, "vencida", ANTIGO)
+
+
+def test_compra_em_dia_e_completa_nao_e_coletada():
+    indice = _indice(
+        itens={"completa": {1: _hash("a"), 2: _hash("b")}},
+        sincronizadas={"completa": (2, False)},
+    )
+
+    assert not _precisa(indice, "completa")
+
+
+def test_compra_com_menos_itens_que_a_ultima_coleta_e_coletada():
+    itens = {"curta": {1: _hash("a")}}
+    sincronizadas = {"curta": (3, False)}
+
+    assert _precisa(_indice(itens, sincronizadas), "curta", ANTIGO)
+    # Sem os itens no Postgres (PNCP_SAIDA=parquet) a contagem não vale
+    assert not _precisa(_indice(itens, sincronizadas, conferir_itens=False), "curta")
+
+
+def test_filtrar_incremental_mantem_a_ordem_da_lista():
+    indice = _indice(
+        itens={"completa": {1: _hash("a")}},
+        sincronizadas={"completa": (1, False), "curta": (2, False)},
+    )
+    compras = [(controle, "123", 1, RECENTE) for controle in ("nova", "completa", "curta")]
+
+    assert [compra[0] for compra in indice.filtrar_incremental(compras)] == [
+        "nova",
+        "curta",
+    ]
+
+
+def test_inalterado_compara_o_hash_do_item():
+    registro = {"numero_controle_pncp": "c1", "numeroItem": 2, "descricao": "x"}
+    hash_hex = hash_conteudo(registro)
+    indice = _indice(itens={"c1": {1: _hash("outro"), 2: hash_hex}})
+
+    assert indice.inalterado("c1", 2, hash_hex)
+    assert indice.inalterado("c1", "2", hash_hex)
+    assert not indice.inalterado("c1", 1, hash_hex)
+    assert not indice.inalterado("c1", 3, hash_hex)
+    assert not indice.inalterado("c2", 2, hash_hex)
+    assert not indice.inalterado("c1", None, hash_hex)
+
+
+def test_atualizar_troca_o_hash_so_de_itens_conhecidos():
+    indice = _indice(itens={"c1": {1: _hash("antigo")}})
+
+    indice.atualizar("c1", 1, _hash("novo"))
+    indice.atualizar("c1", 9, _hash("novo"))
+    indice.atualizar("c2", 1, _hash("novo"))
+
+    assert indice.inalterado("c1", 1, _hash("novo"))
+    assert not indice.inalterado("c1", 1, _hash("antigo"))
+    assert indice.quantidade_gravada("c1") == 1
+    assert indice.quantidade_gravada("c2") == 0
+
+
+def test_impressao_e_o_bigint_com_sinal_do_banco():
+    # ('x' || substr(md5(texto), 1, 16))::bit(64)::bigint: complemento de dois
+    controles = [f"00000000000000-1-{i:06d}/2024" for i in range(2000)]
+    impressoes = [impressao(controle) for controle in controles]
+
+    for controle, valor in zip(controles, impressoes):
+        sem_sinal = int(_hash(controle)[:16], 16)
+        assert valor == (sem_sinal - 2**64 if sem_sinal >= 2**63 else sem_sinal)
+        assert -(2**63) <= valor < 2**63
+    assert min(impressoes) < 0 < max(impressoes)
+
+
+def test_bissecao_encontra_todas_as_compras_na_ordem_do_bigint():
+    # O banco ordena a impressão como bigint com sinal; a bisseção depende disso
+    controles = [f"compra-{i}" for i in range(500)]
+    indice = _indice(itens={controle: {1: _hash(controle)} for controle in controles})
+
+    assert list(indice.compras) == sorted(indice.compras)
+    assert all(indice.quantidade_gravada(controle) == 1 for controle in controles)
+    assert all(indice.inalterado(controle, 1, _hash(controle)) for controle in controles)
@@ -0,0 +1,73 @@
+import threading
+
+from pipeline import PipelineColeta
+
+
+class ColetorFalso:
+    def iterar_compras(self, compras):
+        for compra in compras:
+            yield compra, [{"numeroItem": 1}], None
+
+
+class ZonaQuebrada:
+    def gravar(self, compra, itens):
+        raise OSError("No space left on device")
+
+    def fechar(self):
+        pass
+
+
+def _compras(quantidade):
+    return [(f"c{i}", "123", i, 2024) for i in range(quantidade)]
+
+
+# Roda executar() numa thread: se o pipeline travar, o teste falha em vez de pendurar
+def _executar(pipeline, compras, timeout=10):
+    resultado = {}
+
+    def alvo():
+        try:
+            resultado["total"] = pipeline.executar(compras)
+        except BaseException as e:
+            resultado["erro"] = e
+
+    thread = threading.Thread(target=alvo, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "pipeline travou"
+    return resultado
+
+
+def test_erro_na_zona_de_pouso_nao_para_a_gravacao():
+    gravados = []
+    mensagens = []
+    pipeline = PipelineColeta(
+        ColetorFalso(),
+        lambda lote, compras_lote, falhas_lote: gravados.extend(compras_lote),
+        tamanho_fila=2,
+        escritores=2,
+        registrar=lambda nivel, mensagem: mensagens.append((nivel, mensagem)),
+        zona_pouso=ZonaQuebrada(),
+    )
+    resultado = _executar(pipeline, _compras(50))
+
+    assert resultado == {"total": 50}
+    assert sorted(gravados) == sorted(f"c{i}" for i in range(50))
+    assert sum(nivel == "erro" for nivel, _ in mensagens) == 50
+
+
+def test_erro_inesperado_no_escritor_termina_e_relanca():
+    def registrar(nivel, mensagem):
+        if nivel == "sucesso":
+            raise RuntimeError("registrar quebrou")
+
+    pipeline = PipelineColeta(
+        ColetorFalso(),
+        lambda lote, compras_lote, falhas_lote: None,
+        tamanho_fila=2,
+        escritores=2,
+        registrar=registrar,
+    )
+    resultado = _executar(pipeline, _compras(200))
+
+    assert isinstance(resultado["erro"], RuntimeError)
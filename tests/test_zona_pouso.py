@@ -0,0 +1,45 @@
+import os
+
+from zona_pouso import SUFIXO_PARCIAL, ZonaPouso, iterar_zona, listar_arquivos
+
+
+def _compra(i):
+    return (f"c{i}", "123", i, 2024)
+
+
+# Itens aleatórios não comprimem: cada compra fecha um arquivo de ~2 KB
+def _itens():
+    return [{"descricao": os.urandom(1500).hex()}]
+
+
+def test_retencao_apaga_os_arquivos_mais_antigos(tmp_path):
+    zona = ZonaPouso(str(tmp_path), max_mb=1 / 1024, reter_mb=5 / 1024)
+    for i in range(6):
+        zona.gravar(_compra(i), _itens())
+
+    arquivos = listar_arquivos(str(tmp_path))
+    assert sum(os.path.getsize(caminho) for caminho in arquivos) <= zona.reter_bytes
+    assert 0 < len(arquivos) < 6
+    # Sobram as compras mais recentes, em ordem
+    compras = [compra[0] for compra, _ in iterar_zona(str(tmp_path))]
+    assert compras == [f"c{i}" for i in range(6 - len(arquivos), 6)]
+
+
+def test_retencao_nao_apaga_o_arquivo_em_escrita(tmp_path):
+    zona = ZonaPouso(str(tmp_path), max_mb=1 / 1024, reter_mb=1 / 1024 / 1024)
+    zona.gravar(_compra(0), _itens())
+    zona.gravar(_compra(1), [])
+
+    assert listar_arquivos(str(tmp_path)) == []
+    assert os.listdir(tmp_path)[0].endswith(SUFIXO_PARCIAL)
+
+    zona.fechar()
+    assert listar_arquivos(str(tmp_path)) == []
+
+
+def test_retencao_zero_guarda_tudo(tmp_path):
+    zona = ZonaPouso(str(tmp_path), max_mb=1 / 1024, reter_mb=0)
+    for i in range(4):
+        zona.gravar(_compra(i), _itens())
+
+    assert len(listar_arquivos(str(tmp_path))) == 4
@@ -0,0 +1,154 @@
+import glob
+import gzip
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+
+# Configuração da zona de pouso (variáveis de ambiente)
+# PNCP_ZONA_POUSO: diretório dos arquivos, ou "desligado"
+DIRETORIO_ZONA = os.getenv(
+    "PNCP_ZONA_POUSO",
+    os.path.join(os.path.expanduser("~"), "pncp_itens", "zona_pouso"),
+)
+# Rotaciona o arquivo ao passar deste volume de JSON (antes da compressão)
+MAX_MB_ARQUIVO = float(os.getenv("PNCP_ZONA_POUSO_MAX_MB", "256"))
+NIVEL_COMPRESSAO = int(os.getenv("PNCP_ZONA_POUSO_COMPRESSAO", "6"))
+# Retenção: acima deste total (comprimido) os arquivos mais antigos são apagados; 0 desliga
+RETER_MB = float(os.getenv("PNCP_ZONA_POUSO_RETER_MB", "10240"))
+
+# O arquivo em escrita tem este sufixo; só recebe o nome final quando é fechado
+SUFIXO_PARCIAL = ".parcial"
+
+
+# 🔹 Grava as respostas da API em JSONL comprimido (gzip), uma linha por compra:
+# {"compra": {...chaves...}, "coletado_em": ..., "itens": [...]}
+# Seguro entre threads; os arquivos rotacionam por tamanho e, a cada arquivo fechado,
+# os mais antigos são apagados se o total passar de reter_mb.
+class ZonaPouso:
+    def __init__(
+        self,
+        diretorio=DIRETORIO_ZONA,
+        max_mb=MAX_MB_ARQUIVO,
+        nivel_compressao=NIVEL_COMPRESSAO,
+        reter_mb=RETER_MB,
+    ):
+        self.diretorio = diretorio
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.reter_bytes = int(reter_mb * 1024 * 1024)
+        self.nivel_compressao = nivel_compressao
+        self._arquivo = None
+        self._caminho = None
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _abrir(self):
+        os.makedirs(self.diretorio, exist_ok=True)
+        nome = "itens-{}-{}.jsonl.gz".format(
+            datetime.now().strftime("%Y%m%dT%H%M%S%f"), uuid.uuid4().hex[:8]
+        )
+        self._caminho = os.path.join(self.diretorio, nome)
+        self._arquivo = gzip.open(
+            self._caminho + SUFIXO_PARCIAL, "wb", compresslevel=self.nivel_compressao
+        )
+        self._bytes = 0
+
+    def _fechar_arquivo(self):
+        if self._arquivo is None:
+            return
+        self._arquivo.close()
+        os.replace(self._caminho + SUFIXO_PARCIAL, self._caminho)
+        self._arquivo = None
+        self._caminho = None
+        self._aplicar_retencao()
+
+    # Apaga os arquivos fechados mais antigos até o total caber em reter_bytes
+    def _aplicar_retencao(self):
+        if self.reter_bytes <= 0:
+            return
+        arquivos = []
+        for caminho in listar_arquivos(self.diretorio):
+            try:
+                arquivos.append((caminho, os.path.getsize(caminho)))
+            except FileNotFoundError:
+                continue
+        total = sum(tamanho for _, tamanho in arquivos)
+        for caminho, tamanho in arquivos:
+            if total <= self.reter_bytes:
+                break
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+            total -= tamanho
+
+    def gravar(self, compra, itens):
+        numero_controle_pncp, cnpj, sequencial, ano = compra
+        linha = json.dumps(
+            {
+                "compra": {
+                    "numero_controle_pncp": numero_controle_pncp,
+                    "orgao_cnpj": cnpj,
+                    "sequencial_compra": sequencial,
+                    "ano_compra": ano,
+                },
+                "coletado_em": datetime.now().isoformat(timespec="seconds"),
+                "itens": itens,
+            },
+            ensure_ascii=False,
+            default=str,
+        ).encode("utf-8") + b"\n"
+
+        with self._lock:
+            if self._arquivo is None:
+                self._abrir()
+            self._arquivo.write(linha)
+            self._bytes += len(linha)
+            if self._bytes >= self.max_bytes:
+                self._fechar_arquivo()
+
+    # Fecha o arquivo atual (a próxima gravação abre outro)
+    def fechar(self):
+        with self._lock:
+            self._fechar_arquivo()
+
+
+_zona = None
+_lock_zona = threading.Lock()
+
+
+# 🔹 Zona de pouso compartilhada conforme PNCP_ZONA_POUSO; None quando desligada
+def obter_zona_pouso():
+    global _zona
+    if DIRETORIO_ZONA == "desligado":
+        return None
+    if _zona is None:
+        with _lock_zona:
+            if _zona is None:
+                _zona = ZonaPouso()
+    return _zona
+
+
+# 🔹 Arquivos fechados da zona de pouso, do mais antigo para o mais novo
+# (o nome começa pelo horário de abertura; os .parcial ficam de fora)
+def listar_arquivos(diretorio=DIRETORIO_ZONA):
+    return sorted(glob.glob(os.path.join(diretorio, "itens-*.jsonl.gz")))
+
+
+# 🔹 Lê a zona de pouso, dos arquivos mais antigos para os mais novos
+# Gera (compra, itens) com compra no formato da lista de trabalho.
+# Arquivos ainda em escrita (.parcial) são ignorados.
+def iterar_zona(diretorio=DIRETORIO_ZONA):
+    for caminho in listar_arquivos(diretorio):
+        with gzip.open(caminho, "rb") as arquivo:
+            for linha in arquivo:
+                registro = json.loads(linha)
+                chaves = registro["compra"]
+                compra = (
+                    chaves["numero_controle_pncp"],
+                    chaves["orgao_cnpj"],
+                    chaves["sequencial_compra"],
+                    chaves["ano_compra"],
+                )
+                yield compra, registro["itens"]